@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark of command line startup, the wall time of 'cgpSeqInputVal --help'
+and of man-valid on a small manifest (tests/data/with_uuid.tsv), where
+imports dominate.  The modules imported by each are listed with
+'-X importtime'.
+
+    python3 benchmarks/cli_startup.py [repeats]
+
+Each command is run repeats times (default 20, interleaved), the best time
+is reported.
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+import time
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'data')
+# slow imports only some sub-commands need
+HEAVY = ('pkg_resources', 'importlib.metadata', 'progressbar', 'xlrd', 'asyncio',
+         'concurrent.futures', 'cgp_seq_input_val.compression', 'cgp_seq_input_val.seq_validator')
+# the console script, run through this interpreter
+MAIN = 'from cgp_seq_input_val.command_line import main; sys.argv[0] = "cgpSeqInputVal"; main()'
+
+
+def commands(outdir):
+    return [('--help', ['--help']),
+            ('seq-valid --version', ['seq-valid', '--version']),
+            ('man-valid (small)', ['man-valid', '-i', os.path.join(TEST_DATA, 'with_uuid.tsv'),
+                                   '-o', outdir])]
+
+
+def run(args):
+    """Wall time of the command line with args, of the bare interpreter for None"""
+    cmd = [sys.executable, '-c', 'pass'] if args is None else [sys.executable, '-c',
+                                                              'import sys; ' + MAIN] + args
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def imported(args):
+    """Slow to import modules loaded by the command line with args"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import sys; ' + MAIN] + args,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    names = [line.rsplit('|', 1)[1].strip() for line in proc.stderr.splitlines()
+             if line.startswith('import time:') and '|' in line]
+    heavy = [name for name in names if name in HEAVY]
+    return ' '.join(sorted(heavy)) or '-'
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as tmpd:
+        cmds = commands(tmpd)
+        times = {}
+        for _ in range(repeats):  # interleaved so machine noise hits all
+            for (name, args) in cmds:
+                times.setdefault(name, []).append(run(args))
+            times.setdefault('python', []).append(run(None))
+        print('python -c pass: %.0f ms' % (min(times['python']) * 1000))
+        for (name, args) in cmds:
+            print('%s: %.0f ms, imports %s' % (name, min(times[name]) * 1000,
+                                              imported(args)))
+
+
+if __name__ == '__main__':
+    main()
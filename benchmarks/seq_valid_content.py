@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the sequence alphabet and quality range checks
+(FastqRead.check_content), compares seq-valid throughput with and without them.
+
+    python3 benchmarks/seq_valid_content.py [pairs] [read_length]
+
+Each variant is run 25 times (interleaved), the best CPU time is reported.
+"""
+
+import os
+import sys
+import random
+import tempfile
+import time
+
+from cgp_seq_input_val import fastq_read
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+
+def write_pair(directory, pairs, read_len):
+    rng = random.Random(42)
+    files = []
+    for end in ('1', '2'):
+        path = os.path.join(directory, 'bench_%s.fq' % (end))
+        with open(path, 'w') as ofh:
+            for i in range(pairs):
+                seq = ''.join(rng.choice('ACGTN') for _ in range(read_len))
+                qual = ''.join(chr(rng.randint(35, 74)) for _ in range(read_len))
+                ofh.write('@HS27_17643:2:2110:%d:%d#6/%s\n%s\n+\n%s\n' % (i, i, end, seq, qual))
+        files.append(path)
+    return files
+
+
+def run(files):
+    start = time.process_time()
+    SeqValidator(files[0], files[1], progress_pairs=0).validate()
+    return time.process_time() - start
+
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    read_len = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    repeats = 25
+    with tempfile.TemporaryDirectory() as tmpd:
+        files = write_pair(tmpd, pairs, read_len)
+        original = fastq_read.FastqRead.check_content
+        checked = []
+        unchecked = []
+        for _ in range(repeats):  # interleaved so machine noise hits both
+            checked.append(run(files))
+            fastq_read.FastqRead.check_content = lambda self, filename, q_floor=None: None
+            try:
+                unchecked.append(run(files))
+            finally:
+                fastq_read.FastqRead.check_content = original
+        checked = min(checked)
+        unchecked = min(unchecked)
+    print('pairs: %d, read length: %d' % (pairs, read_len))
+    print('without content checks: %.0f pairs/s' % (pairs / unchecked))
+    print('with content checks:    %.0f pairs/s' % (pairs / checked))
+    print('overhead: %.1f%%' % ((checked - unchecked) / unchecked * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark of counting pairs (cgp_seq_input_val.record_count), compares the
+throughput of counting with full validation and with decompression alone
+(reading every block and discarding it), for plain, gzip and BGZF input.
+
+    python3 benchmarks/seq_valid_count.py [pairs] [read_length] [threads]
+
+Each variant is run 3 times (interleaved), the best time is reported.
+Threads only apply to BGZF.
+"""
+
+import os
+import sys
+import gzip
+import shutil
+import random
+import tempfile
+import time
+
+from cgp_seq_input_val.bgzf import BgzfWriter
+from cgp_seq_input_val.record_count import RecordCounter
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+
+def write_pair(directory, pairs, read_len):
+    rng = random.Random(42)
+    files = []
+    for end in ('1', '2'):
+        path = os.path.join(directory, 'bench_%s.fq' % (end))
+        with open(path, 'w') as ofh:
+            for i in range(pairs):
+                seq = ''.join(rng.choice('ACGTN') for _ in range(read_len))
+                qual = ''.join(chr(rng.randint(35, 74)) for _ in range(read_len))
+                ofh.write('@HS27_17643:2:2110:%d:%d#6/%s\n%s\n+\n%s\n' % (i, i, end, seq, qual))
+        files.append(path)
+    return files
+
+
+def compress_pair(files, kind):
+    """gzip or BGZF copies of files, named .gz in a directory per kind"""
+    out = []
+    for path in files:
+        os.makedirs(os.path.join(os.path.dirname(path), kind), exist_ok=True)
+        target = os.path.join(os.path.dirname(path), kind, os.path.basename(path) + '.gz')
+        with open(path, 'rb') as ifh:
+            if kind == 'gzip':
+                with gzip.open(target, 'wb', compresslevel=1) as ofh:
+                    shutil.copyfileobj(ifh, ofh)
+            else:
+                with BgzfWriter(target, level=1) as ofh:
+                    ofh.write(ifh.read())
+        out.append(target)
+    return out
+
+
+def decompress_only(files, threads):
+    counter = RecordCounter(files[0], files[1], threads=threads)
+    for filename in files:
+        for _ in counter._blocks(filename):
+            pass
+
+
+def run(action):
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    read_len = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    repeats = 3
+    with tempfile.TemporaryDirectory() as tmpd:
+        plain = write_pair(tmpd, pairs, read_len)
+        bgzf = compress_pair(plain, 'bgzf')
+        inputs = [('plain', plain, 1), ('gzip', compress_pair(plain, 'gzip'), 1),
+                  ('bgzf', bgzf, 1), ('bgzf, %d threads' % (threads), bgzf, threads)]
+        variants = [('validate', lambda files, thr: SeqValidator(files[0], files[1],
+                                                                 progress_pairs=0).validate()),
+                    ('count', lambda files, thr: RecordCounter(files[0], files[1],
+                                                               threads=thr).validate()),
+                    ('decompress only', decompress_only)]
+        times = {}
+        for _ in range(repeats):  # interleaved so machine noise hits all
+            for (kind, files, thr) in inputs:
+                for (name, action) in variants:
+                    if name == 'validate' and thr > 1:
+                        continue  # threads don't apply
+                    times.setdefault((kind, name), []).append(
+                        run(lambda: action(files, thr)))
+    print('pairs: %d, read length: %d' % (pairs, read_len))
+    for (kind, _, _) in inputs:
+        for (name, _) in variants:
+            if (kind, name) in times:
+                print('%s, %s: %.0f pairs/s' % (kind, name, pairs / min(times[(kind, name)])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the tuned input reader (cgp_seq_input_val.reader), compares
+seq-valid throughput with default buffering against large reads, prefetch
+and dropping the page cache behind the cursor, for plain and gzip input.
+
+    python3 benchmarks/seq_valid_reader.py [pairs] [read_length]
+
+Each variant is run 5 times (interleaved), the best time is reported.  On a
+local disk with the input cached this measures the overhead of the layer,
+the gains are on network filesystems and contended nodes.
+"""
+
+import os
+import sys
+import gzip
+import shutil
+import random
+import tempfile
+import time
+
+from cgp_seq_input_val.reader import InputReader
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+VARIANTS = [('default buffering', None),
+            ('4MB reads', InputReader()),
+            ('4MB reads, prefetch 2', InputReader(prefetch=2)),
+            ('4MB reads, drop cache', InputReader(drop_cache=True))]
+
+
+def write_pair(directory, pairs, read_len):
+    rng = random.Random(42)
+    files = []
+    for end in ('1', '2'):
+        path = os.path.join(directory, 'bench_%s.fq' % (end))
+        with open(path, 'w') as ofh:
+            for i in range(pairs):
+                seq = ''.join(rng.choice('ACGTN') for _ in range(read_len))
+                qual = ''.join(chr(rng.randint(35, 74)) for _ in range(read_len))
+                ofh.write('@HS27_17643:2:2110:%d:%d#6/%s\n%s\n+\n%s\n' % (i, i, end, seq, qual))
+        files.append(path)
+    return files
+
+
+def gzip_pair(files):
+    gz_files = []
+    for path in files:
+        with open(path, 'rb') as ifh, gzip.open(path + '.gz', 'wb', compresslevel=1) as ofh:
+            shutil.copyfileobj(ifh, ofh)
+        gz_files.append(path + '.gz')
+    return gz_files
+
+
+def run(files, reader):
+    start = time.perf_counter()
+    SeqValidator(files[0], files[1], progress_pairs=0, reader=reader).validate()
+    return time.perf_counter() - start
+
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    read_len = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    repeats = 5
+    with tempfile.TemporaryDirectory() as tmpd:
+        plain = write_pair(tmpd, pairs, read_len)
+        inputs = [('plain', plain), ('gzip', gzip_pair(plain))]
+        times = {}
+        for _ in range(repeats):  # interleaved so machine noise hits all
+            for (kind, files) in inputs:
+                for (name, reader) in VARIANTS:
+                    times.setdefault((kind, name), []).append(run(files, reader))
+    print('pairs: %d, read length: %d' % (pairs, read_len))
+    for (kind, _) in inputs:
+        for (name, _) in VARIANTS:
+            print('%s, %s: %.0f pairs/s' % (kind, name, pairs / min(times[(kind, name)])))
+
+
+if __name__ == '__main__':
+    main()
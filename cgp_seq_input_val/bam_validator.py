@@ -0,0 +1,241 @@
+"""
+BamValidator object to validate BAM files without external tools
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import struct
+from importlib import import_module
+
+# this package:
+from cgp_seq_input_val import bgzf, compression
+from cgp_seq_input_val.error_classes import SeqValidationError, JobCancelledError
+
+prog_records = 100000
+# how often (records) to look for a cancellation request
+cancel_check_records = 20000
+# refID, pos, l_read_name, mapq, bin, n_cigar_op, flag, l_seq, next_refID, next_pos, tlen
+CORE = struct.Struct('<iiBBHHHiiii')
+INT32 = struct.Struct('<i')
+# highest phred value which can be represented in fastq
+MAX_PHRED = 93
+MISSING_QUAL = 0xff
+HEADER_LINE = re.compile(r'@[A-Za-z][A-Za-z0-9](\t|$)')
+
+FLAG_PAIRED = 0x1
+FLAG_READ1 = 0x40
+FLAG_READ2 = 0x80
+FLAG_SECONDARY = 0x100
+FLAG_SUPPLEMENTARY = 0x800
+
+
+class BamValidator(object):
+    """
+    Validate a BAM file by walking the binary records.  Checks header
+    integrity, presence of the EOF block, read pairing flags and quality
+    encoding.  Secondary and supplementary records are skipped.
+
+    Pairing is checked from the flags only: each primary record must be
+    first or second in pair and the two counts must match.  Read names are
+    not paired up, mates of a coordinate sorted BAM can be any distance
+    apart so doing so would need memory for every unmatched name.
+
+    Args:
+        bam_file - File to be validated (bam)
+        progress_pairs - optional, how often to update progress bar [100,000]
+                       - set to 0 to disable
+        threads - optional, threads used to inflate BGZF blocks [1]
+        cancel - optional, object with is_set() (e.g. threading.Event), when
+                 set validation stops with JobCancelledError
+    """
+    def __init__(self, bam_file, progress_pairs=prog_records, threads=1, cancel=None):
+        self.progress_pairs = progress_pairs
+        self.file_a = bam_file
+        self.threads = threads
+        self.cancel = cancel
+        self.pairs = 0
+        self.references = 0
+        self.q_min = 1000
+        self.seconds = None  # duration of validate()
+        if os.path.splitext(bam_file)[1] != '.bam':
+            raise SeqValidationError("Input file must be bam")
+        self.codecs = {bam_file: compression.sniff(bam_file)}
+
+    def __str__(self):
+        ret = []
+        ret.append('file_a: '+self.file_a)
+        ret.append('threads: '+str(self.threads))
+        ret.append('q_min: '+str(self.q_min))
+        return '\n'.join(ret)
+
+    def summary(self):
+        """
+        Returns the content of the report as a dict, both ends are in one
+        file so this is equivalent to interleaved fastq.  As for fastq,
+        valid_q is True once a phred 0 quality ('!' at offset 33) is seen.
+        Read names aren't parsed so header_format is None.
+        """
+        return {'pairs': self.pairs,
+                'valid_q': self.q_min == 0,
+                'interleaved': True,
+                'header_format': None,
+                'compression': compression.summary([self.file_a], self.codecs, None,
+                                                   self.seconds)}
+
+    def report(self, fp):
+        """
+        Prints json report to the provided file-pointer
+
+        Args:
+            fp - file pointer
+        """
+        json.dump(self.summary(), fp, sort_keys=True, indent=4)
+
+    def validate(self):
+        """
+        Trigger the validation of the BAM file
+
+        Raises:
+            SeqValidationError
+        """
+        started = time.perf_counter()
+        with open(self.file_a, 'rb') as fh:
+            if not bgzf.has_eof_block(fh):
+                raise SeqValidationError("BAM file %s is truncated, BGZF EOF marker absent"
+                                         % (self.file_a))
+        with bgzf.BgzfReader(self.file_a, threads=self.threads) as reader:
+            self.read_header(reader)
+            self.read_records(reader)
+        self.seconds = time.perf_counter() - started
+
+    def _read_exact(self, reader, size, what):
+        data = reader.read(size)
+        if len(data) != size:
+            raise SeqValidationError("BAM file %s is truncated within %s"
+                                     % (self.file_a, what))
+        return data
+
+    def read_header(self, reader):
+        """
+        Reads and checks the BAM header (magic, text and reference list)
+
+        Raises:
+            SeqValidationError
+        """
+        if self._read_exact(reader, 4, 'header') != b'BAM\x01':
+            raise SeqValidationError("BAM file %s lacks magic string" % (self.file_a))
+        l_text = INT32.unpack(self._read_exact(reader, 4, 'header'))[0]
+        if l_text < 0:
+            raise SeqValidationError("BAM file %s has negative header length" % (self.file_a))
+        text = self._read_exact(reader, l_text, 'header').rstrip(b'\x00')
+        try:
+            text = text.decode('ascii')
+        except UnicodeDecodeError:
+            raise SeqValidationError("BAM file %s has non-ASCII header text" % (self.file_a))
+        for (line_no, line) in enumerate(text.splitlines(), 1):
+            if not HEADER_LINE.match(line):
+                raise SeqValidationError("BAM header line %d of %s is malformed"
+                                         % (line_no, self.file_a))
+        n_ref = INT32.unpack(self._read_exact(reader, 4, 'header'))[0]
+        if n_ref < 0:
+            raise SeqValidationError("BAM file %s has negative reference count" % (self.file_a))
+        for _ in range(n_ref):
+            l_name = INT32.unpack(self._read_exact(reader, 4, 'header'))[0]
+            if l_name < 1:
+                raise SeqValidationError("BAM file %s has an invalid reference name length"
+                                         % (self.file_a))
+            name = self._read_exact(reader, l_name + 4, 'header')
+            if name[l_name - 1] != 0:
+                raise SeqValidationError("BAM file %s has a reference name which is not NUL "
+                                         "terminated" % (self.file_a))
+        self.references = n_ref
+
+    def read_records(self, reader):
+        """
+        Walks the alignment records
+
+        Raises:
+            SeqValidationError
+        """
+        prog_indic = self.progress_pairs
+        bar = self.setup_progress()
+        n_ref = self.references
+        cancel = self.cancel
+        read_1 = 0
+        read_2 = 0
+        q_min = self.q_min
+        record = 0
+        try:
+            while True:
+                size = reader.read(4)
+                if not size:
+                    break
+                record += 1
+                if cancel is not None and record % cancel_check_records == 0 and cancel.is_set():
+                    raise JobCancelledError("Validation cancelled after %d records" % (record))
+                if len(size) != 4:
+                    raise SeqValidationError("BAM file %s is truncated at record %d"
+                                             % (self.file_a, record))
+                block_size = INT32.unpack(size)[0]
+                if block_size < CORE.size:
+                    raise SeqValidationError("BAM record %d of %s has invalid block_size"
+                                             % (record, self.file_a))
+                data = self._read_exact(reader, block_size, 'record %d' % (record))
+                (ref_id, _, l_read_name, _, _, n_cigar_op, flag, l_seq,
+                 next_ref_id, _, _) = CORE.unpack_from(data)
+                qual_start = CORE.size + l_read_name + 4 * n_cigar_op + (l_seq + 1) // 2
+                if (l_read_name < 2 or l_seq < 0 or qual_start + l_seq > block_size or
+                        data[CORE.size + l_read_name - 1] != 0):
+                    raise SeqValidationError("BAM record %d of %s appears to be corrupt"
+                                             % (record, self.file_a))
+                if not -1 <= ref_id < n_ref or not -1 <= next_ref_id < n_ref:
+                    raise SeqValidationError("BAM record %d of %s references an unknown sequence"
+                                             % (record, self.file_a))
+
+                if flag & (FLAG_SECONDARY | FLAG_SUPPLEMENTARY):
+                    continue
+                end = flag & (FLAG_READ1 | FLAG_READ2)
+                if not flag & FLAG_PAIRED or end not in (FLAG_READ1, FLAG_READ2):
+                    raise SeqValidationError("BAM record %d of %s should be flagged as paired "
+                                             "and one of first/second in pair (flag %d)"
+                                             % (record, self.file_a, flag))
+                if end == FLAG_READ1:
+                    read_1 += 1
+                else:
+                    read_2 += 1
+
+                if l_seq:
+                    qual = data[qual_start:qual_start + l_seq]
+                    if qual[0] != MISSING_QUAL:
+                        if max(qual) > MAX_PHRED:
+                            raise SeqValidationError("BAM record %d of %s has quality values "
+                                                     "outside the phred range 0-%d"
+                                                     % (record, self.file_a, MAX_PHRED))
+                        if q_min > 0:
+                            q_min = min(q_min, min(qual))
+
+                if bar and end == FLAG_READ1 and read_1 % prog_indic == 0:
+                    bar.update(read_1/prog_indic)
+        finally:
+            if bar:
+                print(file=sys.stderr)  # make sure we move to next line when progress finishes
+        if read_1 != read_2:
+            raise SeqValidationError("BAM file %s has %d first in pair and %d second in pair "
+                                     "records" % (self.file_a, read_1, read_2))
+        self.q_min = q_min
+        self.pairs = read_1
+
+    def setup_progress(self):
+        """
+        Sets up the progress indicator and indicate units
+        """
+        if self.progress_pairs == 0:
+            return None
+        progressbar = import_module('progressbar')  # progressbar2, only needed here
+        bar = progressbar.ProgressBar(max_value=progressbar.UnknownLength)
+        print("Progress is %d's of record pairs" % (self.progress_pairs), file=sys.stderr)
+        bar.update(0)
+        return bar
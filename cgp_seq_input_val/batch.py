@@ -0,0 +1,286 @@
+"""
+Library API for validating many sequence files and manifests from python.
+
+Nothing here calls sys.exit, failures are raised (single validations) or
+returned on the result objects (batches).
+"""
+
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cgp_seq_input_val import manifest, pair_check, read_headers, record_index, sampler
+from cgp_seq_input_val.error_classes import (ConfigError,
+                                             ParsingError,
+                                             SeqValidationError,
+                                             ValidationError)
+from cgp_seq_input_val.fastq_writer import FastqWriter, output_interleaved
+from cgp_seq_input_val.file_meta import FileValidationError
+from cgp_seq_input_val.seq_validator import get_validator, record_mem_cap
+
+# errors captured on a ValidationResult rather than raised from the batch,
+# sqlite3.Error from a locked, corrupt or read-only file registry
+RESULT_ERRORS = (ConfigError, ParsingError, SeqValidationError, ValidationError,
+                 FileValidationError, ValueError, KeyError, OSError, IOError, sqlite3.Error)
+
+
+def validate_seq(file_a, file_b=None, max_record_bytes=record_mem_cap, threads=1,
+                 cancel=None, max_errors=0, dup_mem=None, index_file=None,
+                 index_every=record_index.default_every, output=None, shard_pairs=0,
+                 compress=True, output_layout='same', decompressor=None, reader=None,
+                 header_top_k=None, header_format=read_headers.AUTO, sample=0,
+                 sample_output=None, sample_seed=sampler.default_seed, count=False):
+    """
+    Validates an interleaved fastq, a pair of fastq files or a bam file.
+
+    Args:
+        file_a - fastq[.gz|.bz2|.xz] or bam file
+        file_b - optional, second end of pair
+        max_record_bytes - see SeqValidator
+        threads - see BamValidator
+        cancel - see SeqValidator
+        max_errors - see SeqValidator, when >0 the result holds 'valid' and
+                     'errors' rather than raising on the first problem
+        dup_mem - see SeqValidator, None skips the duplicate read name check
+        index_file - optional, write a RecordIndex here (fastq only)
+        index_every - pairs between index entries
+        output - optional, prefix for writing the validated records (fastq only)
+        shard_pairs, compress - see FastqWriter
+        output_layout - one of fastq_writer.LAYOUTS
+        decompressor, reader - see SeqValidator
+        header_top_k - see SeqValidator, None skips collecting header_stats
+        header_format - see SeqValidator
+        sample - optional, pairs sampled to sample_output (fastq only), see
+                 sampler.ReservoirSampler, 0 for no sample
+        sample_output, sample_seed - prefix (named as output) and seed of the
+                                     sample, written with compress and
+                                     output_layout
+        count - optional, only count pairs, see RecordCounter (fastq only)
+
+    Returns:
+        dict, content of the seq-valid report (includes 'outputs' and
+        'sample' when written), plus 'index' when written
+
+    Raises:
+        SeqValidationError, OSError
+    """
+    interleaved = output_interleaved(output_layout, file_b is None)
+    writer = None
+    if output is not None:
+        writer = FastqWriter(output, interleaved, shard_pairs=shard_pairs, compress=compress,
+                             threads=threads)
+    reservoir = None
+    if sample:
+        if sample_output is None:
+            raise SeqValidationError("A sample requires sample_output")
+        reservoir = sampler.ReservoirSampler(sample, FastqWriter(sample_output, interleaved,
+                                                                 compress=compress,
+                                                                 threads=threads),
+                                             sample_seed)
+    validator = get_validator(file_a, file_b,
+                              count=count,
+                              progress_pairs=0,
+                              max_record_bytes=max_record_bytes,
+                              threads=threads,
+                              cancel=cancel,
+                              max_errors=max_errors,
+                              dup_mem=dup_mem,
+                              index_every=index_every if index_file else None,
+                              writer=writer,
+                              decompressor=decompressor,
+                              reader=reader,
+                              header_top_k=header_top_k,
+                              header_format=header_format,
+                              sampler=reservoir)
+    validator.validate()
+    summary = validator.summary()
+    if getattr(validator, 'index', None) is not None and summary.get('valid', True):
+        validator.index.write(index_file)
+        summary['index'] = index_file
+    return summary
+
+
+def validate_manifest(infile, outdir=None, checkfiles=False, check_pairs=0,
+                      workers=pair_check.default_workers, store=None, ndjson=False,
+                      registry=None):
+    """
+    Validates a tsv manifest, writing the tsv/json outputs when outdir is given.
+    When check_pairs is set the first check_pairs pairs of the fastq on every row are
+    validated too.  store is a RowStore file for incremental validation (see
+    Manifest.validate).  ndjson selects the json output format (see
+    Manifest.write).  registry is a file_registry database checked for files
+    submitted before (see Manifest.validate).
+
+    Returns:
+        dict of 'uuid' and when written 'tsv' and 'json' file paths
+
+    Raises:
+        ValidationError, ConfigError, ParsingError, FileValidationError
+    """
+    man = manifest.Manifest(infile)
+    man.validate(checkfiles, check_pairs, workers, store, registry)
+    result = {'uuid': man.get_uuid()}
+    if outdir is not None:
+        (result['tsv'], result['json']) = man.write(outdir, ndjson)
+    return result
+
+
+class ValidationResult(object):
+    """
+    Outcome of a single validation within a batch.
+
+    Attributes:
+        kind - 'seq-valid' or 'man-valid'
+        inputs - tuple of the input file(s)
+        result - dict as returned by validate_seq/validate_manifest, None on error
+        error - the exception raised by the validation, None on success
+    """
+    def __init__(self, kind, inputs, result=None, error=None):
+        self.kind = kind
+        self.inputs = inputs
+        self.result = result
+        self.error = error
+
+    def __str__(self):
+        state = 'ok' if self.ok else 'ERROR: ' + str(self.error)
+        return '%s %s: %s' % (self.kind, ', '.join(self.inputs), state)
+
+    @property
+    def ok(self):
+        """True when validation passed"""
+        if self.error is not None:
+            return False
+        return self.result.get('valid', True)
+
+    def raise_for_error(self):
+        """
+        Re-raises the validation error, if any
+        """
+        if self.error is not None:
+            raise self.error
+
+
+def _run(kind, inputs, options):
+    """
+    Runs a single validation, executed in the worker processes.
+    """
+    try:
+        if kind == 'seq-valid':
+            result = validate_seq(*inputs, **options)
+        else:
+            result = validate_manifest(inputs[0], **options)
+    except RESULT_ERRORS as err:
+        return ValidationResult(kind, inputs, error=err)
+    return ValidationResult(kind, inputs, result=result)
+
+
+def iter_validate(seq_files=(), manifests=(), outdir=None, checkfiles=False,
+                  max_record_bytes=record_mem_cap, workers=None, executor=None, check_pairs=0,
+                  registry=None):
+    """
+    Validates many sequence files and manifests on a shared worker pool,
+    yielding a ValidationResult as each completes (not in input order).
+
+    Args:
+        seq_files - iterable of interleaved files or (file_a, file_b) tuples
+        manifests - iterable of tsv manifests
+        outdir - optional, manifest outputs are written here when given
+        checkfiles - check files referenced by manifests exist and are non-zero
+        max_record_bytes - see SeqValidator
+        workers - optional, size of the pool created when executor not given
+        executor - optional, concurrent.futures executor to reuse between calls
+        check_pairs - pairs of each manifest row to pre-check, see
+                      validate_manifest()
+        registry - optional, file_registry database shared by the manifests,
+                   see validate_manifest()
+
+    Yields:
+        ValidationResult
+    """
+    own_pool = executor is None
+    if own_pool:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    futures = []
+    try:
+        for item in seq_files:
+            inputs = (item,) if isinstance(item, str) else tuple(item)
+            futures.append(executor.submit(_run, 'seq-valid', inputs,
+                                           {'max_record_bytes': max_record_bytes}))
+        for item in manifests:
+            futures.append(executor.submit(_run, 'man-valid', (item,),
+                                           {'outdir': outdir, 'checkfiles': checkfiles,
+                                            'check_pairs': check_pairs,
+                                            'registry': registry}))
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # consumer may stop early, don't leave queued work behind
+        for future in futures:
+            future.cancel()
+        if own_pool:
+            executor.shutdown(wait=True)
+
+
+def validate_all(seq_files=(), manifests=(), **kwargs):
+    """
+    As iter_validate() but returns the list of results once all are complete.
+    """
+    return list(iter_validate(seq_files, manifests, **kwargs))
+
+
+def find_manifests(paths):
+    """
+    Expands paths to a list of manifests:
+     - directories are searched recursively for *.tsv
+     - *.tsv files are manifests
+     - anything else is a list of manifests, one per line, relative paths
+       are relative to the list
+
+    Order follows paths (directory content sorted), repeats are dropped.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for (root, dirs, files) in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.tsv'))
+        elif path.endswith('.tsv'):
+            found.append(path)
+        else:
+            with open(path, 'r') as ifh:
+                base = os.path.dirname(path)
+                found.extend(os.path.join(base, line.strip()) for line in ifh if line.strip())
+    manifests = []
+    seen = set()
+    for path in found:
+        if path not in seen:
+            seen.add(path)
+            manifests.append(path)
+    return manifests
+
+
+def summarise(results, manifests):
+    """
+    Report of a batch of manifests.
+
+    Args:
+        results - ValidationResult for each manifest
+        manifests - manifests in the order to report them
+
+    Returns:
+        dict of counts ('manifests', 'ok', 'failed') and 'results', a list
+        of {'manifest', 'ok', and 'uuid', 'tsv', 'json' or 'error'}
+    """
+    by_input = dict((res.inputs[0], res) for res in results)
+    report = {'manifests': len(manifests), 'ok': 0, 'failed': 0, 'results': []}
+    for path in manifests:
+        res = by_input[path]
+        entry = {'manifest': path, 'ok': res.ok}
+        if res.ok:
+            report['ok'] += 1
+            entry.update(res.result)
+        else:
+            report['failed'] += 1
+            entry['error'] = ' '.join(str(res.error).split())
+        report['results'].append(entry)
+    return report
@@ -0,0 +1,312 @@
+"""
+Minimal BGZF (blocked gzip) support, as used by BAM and bgzip'd fastq.
+
+See section 4.1 of the SAM specification: https://samtools.github.io/hts-specs/SAMv1.pdf
+"""
+
+import bisect
+import hashlib
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+# empty block which must terminate every BGZF file
+EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+# magic+method+flags (FEXTRA), mtime, xfl, os, xlen, 'B', 'C', slen, bsize
+HEADER = struct.Struct('<4sIBBHBBHH')
+HEADER_MAGIC = b'\x1f\x8b\x08\x04'
+# uncompressed data per block, leaves room for incompressible data in 64KB
+MAX_BLOCK_DATA = 0xff00
+
+
+def is_bgzf(header_bytes):
+    """
+    Checks the first bytes of a file (at least 16) look like a BGZF block
+    """
+    if len(header_bytes) < 16 or not header_bytes.startswith(HEADER_MAGIC):
+        return False
+    return header_bytes[12:14] == b'BC'
+
+
+def has_eof_block(fh):
+    """
+    Checks the file ends with the BGZF EOF marker block, fh must be seekable
+    and opened in binary mode.
+    """
+    fh.seek(0, 2)
+    if fh.tell() < len(EOF_BLOCK):
+        return False
+    fh.seek(-len(EOF_BLOCK), 2)
+    found = fh.read(len(EOF_BLOCK)) == EOF_BLOCK
+    fh.seek(0)
+    return found
+
+
+def read_block(fh, coffset, filename):
+    """
+    Reads the next raw (compressed) block from a binary file handle.
+
+    Returns:
+        tuple of (cdata, crc32, isize, block_size) or None at EOF
+
+    Raises:
+        SeqValidationError - malformed or truncated block
+    """
+    head = fh.read(18)
+    if not head:
+        return None
+    if len(head) < 18:
+        raise SeqValidationError("BGZF block at offset %d of %s is truncated"
+                                 % (coffset, filename))
+    (magic, _, _, _, xlen, _, _, _, _) = HEADER.unpack_from(head)
+    if magic != HEADER_MAGIC or xlen < 6:
+        raise SeqValidationError("BGZF block at offset %d of %s has invalid header"
+                                 % (coffset, filename))
+    extra = head[12:] + fh.read(xlen - 6)
+    bsize = None
+    pos = 0
+    while pos + 4 <= len(extra):
+        (si1, si2, slen) = struct.unpack_from('<BBH', extra, pos)
+        if si1 == 66 and si2 == 67 and slen == 2:
+            bsize = struct.unpack_from('<H', extra, pos + 4)[0]
+        pos += 4 + slen
+    if bsize is None:
+        raise SeqValidationError("BGZF block at offset %d of %s lacks 'BC' field"
+                                 % (coffset, filename))
+    block_size = bsize + 1
+    rest = fh.read(block_size - 12 - xlen)
+    if len(rest) != block_size - 12 - xlen:
+        raise SeqValidationError("BGZF block at offset %d of %s is truncated"
+                                 % (coffset, filename))
+    (crc, isize) = struct.unpack_from('<II', rest, len(rest) - 8)
+    return (rest[:-8], crc, isize, block_size)
+
+
+def block_offsets(filename):
+    """
+    Walks the block headers (no inflation) to find where each block starts.
+
+    Returns:
+        tuple of lists (compressed offsets, uncompressed offsets)
+
+    Raises:
+        SeqValidationError - malformed or truncated block
+    """
+    coffsets = []
+    uoffsets = []
+    coffset = 0
+    uoffset = 0
+    with open(filename, 'rb') as fh:
+        while True:
+            head = fh.read(18)
+            if not head:
+                break
+            if len(head) == 18:
+                (magic, _, _, _, xlen, si1, si2, slen, bsize) = HEADER.unpack_from(head)
+            if len(head) < 18 or magic != HEADER_MAGIC or (si1, si2, slen) != (66, 67, 2):
+                raise SeqValidationError("BGZF block at offset %d of %s has invalid header"
+                                         % (coffset, filename))
+            fh.seek(coffset + bsize + 1 - 4)
+            isize = fh.read(4)
+            if len(isize) != 4:
+                raise SeqValidationError("BGZF block at offset %d of %s is truncated"
+                                         % (coffset, filename))
+            coffsets.append(coffset)
+            uoffsets.append(uoffset)
+            coffset += bsize + 1
+            uoffset += struct.unpack('<I', isize)[0]
+    return (coffsets, uoffsets)
+
+
+def virtual_offset(coffsets, uoffsets, uoffset):
+    """
+    Converts an offset in the uncompressed stream to a BGZF virtual offset
+    using the lists from block_offsets()
+    """
+    i = bisect.bisect_right(uoffsets, uoffset) - 1
+    return (coffsets[i] << 16) | (uoffset - uoffsets[i])
+
+
+def inflate_block(block):
+    """
+    Inflates a block returned by read_block, checking size and CRC.
+
+    Args:
+        block - tuple of (cdata, crc32, isize, coffset, filename)
+
+    Raises:
+        SeqValidationError
+    """
+    (cdata, crc, isize, coffset, filename) = block
+    try:
+        data = zlib.decompress(cdata, -15)
+    except zlib.error as err:
+        raise SeqValidationError("BGZF block at offset %d of %s failed to inflate: %s"
+                                 % (coffset, filename, err))
+    if len(data) != isize or zlib.crc32(data) & 0xffffffff != crc:
+        raise SeqValidationError("BGZF block at offset %d of %s fails size/CRC check"
+                                 % (coffset, filename))
+    return data
+
+
+def compress_block(data, level=6):
+    """
+    Deflates up to MAX_BLOCK_DATA bytes into a complete BGZF block.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    block_size = len(cdata) + 26
+    return b''.join((HEADER.pack(HEADER_MAGIC, 0, 0, 255, 6, 66, 67, 2, block_size - 1),
+                     cdata,
+                     struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))))
+
+
+class BgzfReader(object):
+    """
+    Sequential reader of BGZF files, blocks are inflated on a thread pool
+    (zlib releases the GIL) while keeping them in file order.
+
+    Args:
+        filename - BGZF file
+        threads - optional, inflate threads, 1 inflates in the reading thread
+    """
+    def __init__(self, filename, threads=1):
+        self.filename = filename
+        self.threads = threads
+        self.fh = open(filename, 'rb')
+        self.blocks = self._inflated()
+        self.buf = b''
+        self.pos = 0
+        self.coffset = 0  # compressed offset of the next raw block
+
+    def close(self):
+        """Close the underlying file"""
+        self.blocks.close()
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _raw_blocks(self):
+        while True:
+            coffset = self.coffset
+            block = read_block(self.fh, coffset, self.filename)
+            if block is None:
+                return
+            self.coffset += block[3]
+            yield (block[0], block[1], block[2], coffset, self.filename)
+
+    def _inflated(self):
+        if self.threads < 2:
+            for block in self._raw_blocks():
+                yield inflate_block(block)
+            return
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            pending = deque()
+            for block in self._raw_blocks():
+                pending.append(pool.submit(inflate_block, block))
+                if len(pending) >= self.threads * 4:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def __iter__(self):
+        """
+        Yields the inflated blocks in order, instead of read()
+        """
+        return self.blocks
+
+    def read(self, size):
+        """
+        Returns up to size bytes, fewer only at end of file
+        """
+        while len(self.buf) - self.pos < size:
+            data = next(self.blocks, None)
+            if data is None:
+                break
+            self.buf = self.buf[self.pos:] + data
+            self.pos = 0
+        chunk = self.buf[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+
+class BgzfWriter(object):
+    """
+    Writes a BGZF file, blocks are deflated on a thread pool while keeping
+    them in order.  An md5 of the compressed output is kept as it's written.
+
+    Args:
+        filename - output file
+        threads - optional, deflate threads, 1 deflates in the writing thread
+        level - optional, zlib compression level [6]
+    """
+    def __init__(self, filename, threads=1, level=6):
+        self.filename = filename
+        self.threads = threads
+        self.level = level
+        self.fh = open(filename, 'wb')
+        self.md5 = hashlib.md5()
+        self.buf = bytearray()
+        self.pending = deque()
+        self.pool = None
+        if threads > 1:
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        """
+        Buffers bytes, full blocks are queued for compression
+        """
+        buf = self.buf
+        buf += data
+        if len(buf) >= MAX_BLOCK_DATA:
+            end = len(buf) - len(buf) % MAX_BLOCK_DATA
+            for start in range(0, end, MAX_BLOCK_DATA):
+                self._deflate(bytes(buf[start:start + MAX_BLOCK_DATA]))
+            del buf[:end]
+
+    def _deflate(self, data):
+        if self.pool is None:
+            self._emit(compress_block(data, self.level))
+            return
+        self.pending.append(self.pool.submit(compress_block, data, self.level))
+        while len(self.pending) > self.threads * 4:
+            self._emit(self.pending.popleft().result())
+
+    def _emit(self, block):
+        self.fh.write(block)
+        self.md5.update(block)
+
+    def hexdigest(self):
+        """md5 of the compressed output, complete once closed"""
+        return self.md5.hexdigest()
+
+    def close(self):
+        """
+        Flushes remaining data and writes the EOF marker block
+        """
+        if self.fh.closed:
+            return
+        try:
+            if self.buf:
+                self._deflate(bytes(self.buf))
+                self.buf = bytearray()
+            while self.pending:
+                self._emit(self.pending.popleft().result())
+            self._emit(EOF_BLOCK)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True)
+            self.fh.close()
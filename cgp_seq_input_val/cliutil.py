@@ -1,5 +1,9 @@
 """General command line utility functions"""
 import os
+import argparse
+from importlib import import_module
+
+from cgp_seq_input_val import resources
 
 
 def extn_check(parser, choices, fname, readable=False):
@@ -20,3 +24,39 @@ def extn_check(parser, choices, fname, readable=False):
         # can't cover these easily
         parser.error("File doesn't end with {}".format(choices))
     return fname
+
+
+def int_at_least(minimum):
+    """
+    Returns an argparse type converting to int and rejecting values below
+    minimum
+    """
+    def convert(text):
+        value = int(text)
+        if value < minimum:
+            raise argparse.ArgumentTypeError("must be at least %d, got %d" % (minimum, value))
+        return value
+    convert.__name__ = 'int'  # named in argparse's message for a non-integer
+    return convert
+
+
+class VersionAction(argparse.Action):
+    """-v/--version, the version is only looked up (slow) when asked for"""
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS,
+                 help="show program's version number and exit"):
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0,
+                         help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print('%s %s' % (parser.prog, resources.version()))
+        parser.exit()
+
+
+def command(module, function):
+    """
+    Returns a sub-command handler which imports module (of this package) when
+    run, so only the modules of the command being run are loaded.
+    """
+    def run(args):
+        return getattr(import_module('cgp_seq_input_val.' + module), function)(args)
+    return run
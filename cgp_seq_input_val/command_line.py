@@ -4,13 +4,9 @@ Handle the command line parsing and select the correct sub process.
 
 import argparse
 import sys
-import pkg_resources  # part of setuptools
 
-from cgp_seq_input_val import constants, cliutil
-from cgp_seq_input_val.manifest import normalise
-from cgp_seq_input_val.manifest import wrapped_validate
-from cgp_seq_input_val.seq_validator import validate_seq_files
-version = pkg_resources.require("cgp_seq_input_val")[0].version
+# only modules cheap to import, sub-commands import their own when run
+from cgp_seq_input_val import constants, cliutil, dup_names, header_stats, read_headers, reader
 
 
 def main():
@@ -27,8 +23,7 @@ def main():
                    epilog='Input can be [xls|xlsx|csv|tsv].  \
                    "tsv" is just copied to maintain tool-chain')
     parser_a.add_argument('-v', '--version',
-                          action='version',
-                          version='%(prog)s ' + version)
+                          action=cliutil.VersionAction)
     parser_a.add_argument('-i', '--input',
                           dest='input',
                           metavar='FILE',
@@ -44,14 +39,13 @@ def main():
                           help='Output file *.tsv [default: sub. extension]',
                           required=False,
                           type=lambda s: cliutil.extn_check(parser, ('tsv'), s))
-    parser_a.set_defaults(func=normalise)
+    parser_a.set_defaults(func=cliutil.command('manifest', 'normalise'))
 
     # create the parser for the "man-valid" command
     parser_b = subparsers.add_parser('man-valid',
                                      description='Validate a tsv import manifest file')
     parser_b.add_argument('-v', '--version',
-                          action='version',
-                          version='%(prog)s ' + version)
+                          action=cliutil.VersionAction)
     parser_b.add_argument('-i', '--input',
                           dest='input',
                           metavar='FILE',
@@ -70,14 +64,96 @@ def main():
                           dest='checkfiles',
                           action='store_true',
                           help='When present check file exist and are non-zero size')
-    parser_b.set_defaults(func=wrapped_validate)
+    parser_b.add_argument('-p', '--pair-check',
+                          dest='pair_check',
+                          metavar='INT',
+                          type=int,
+                          default=0,
+                          help='Validate the first INT pairs of the fastq on every row, finds '
+                               'swapped/mismatched File and File_2 without a full seq-valid '
+                               '(e.g. %d), 0 to skip [0]' % (constants.PAIR_CHECK_PAIRS))
+    parser_b.add_argument('-w', '--workers',
+                          dest='workers',
+                          metavar='INT',
+                          type=cliutil.int_at_least(1),
+                          default=constants.PAIR_CHECK_WORKERS,
+                          help='Rows pair checked at the same time [%d]'
+                               % (constants.PAIR_CHECK_WORKERS))
+    parser_b.add_argument('-r', '--row-store',
+                          dest='row_store',
+                          action='store_true',
+                          help='Keep per-row results in the output area, when the manifest is '
+                               'resubmitted only changed rows are re-checked')
+    parser_b.add_argument('--ndjson',
+                          dest='ndjson',
+                          action='store_true',
+                          help='Write the json output as newline delimited json (*.ndjson), a '
+                               'line with the header then a line per row')
+    parser_b.add_argument('--registry',
+                          dest='registry',
+                          metavar='FILE',
+                          default=None,
+                          help='SQLite registry of the files of earlier manifests (created when '
+                               'missing), fails if a file has the same content as a registered '
+                               'one, otherwise registers the files')
+    parser_b.set_defaults(func=cliutil.command('manifest', 'wrapped_validate'))
+
+    # create the parser for the "man-valid-batch" command
+    parser_e = subparsers.add_parser('man-valid-batch',
+                                     description='Validate many tsv import manifests on a pool '
+                                                 'of worker processes')
+    parser_e.add_argument('-v', '--version',
+                          action=cliutil.VersionAction)
+    parser_e.add_argument('-i', '--input',
+                          dest='input',
+                          metavar='PATH',
+                          nargs='+',
+                          help='Manifests (*.tsv), directories to search for *.tsv or files '
+                               'listing manifests one per line',
+                          required=True)
+    parser_e.add_argument('-o', '--output',
+                          dest='output',
+                          metavar='DIR',
+                          help='Output manifests to this area, two files (tsv, json) each',
+                          required=True)
+    parser_e.add_argument('-r', '--report',
+                          dest='report',
+                          type=argparse.FileType('w'),
+                          default='-',
+                          help='Output json summary report',
+                          required=False)
+    parser_e.add_argument('-j', '--jobs',
+                          dest='jobs',
+                          metavar='INT',
+                          type=cliutil.int_at_least(1),
+                          default=None,
+                          help='Manifests validated at the same time [CPU count]')
+    parser_e.add_argument('-c', '--checkfiles',
+                          dest='checkfiles',
+                          action='store_true',
+                          help='When present check file exist and are non-zero size')
+    parser_e.add_argument('-p', '--pair-check',
+                          dest='pair_check',
+                          metavar='INT',
+                          type=int,
+                          default=0,
+                          help='Validate the first INT pairs of the fastq on every row, see '
+                               'man-valid [0]')
+    parser_e.add_argument('--registry',
+                          dest='registry',
+                          metavar='FILE',
+                          default=None,
+                          help='SQLite registry of the files of earlier manifests, see man-valid')
+    parser_e.set_defaults(func=cliutil.command('manifest', 'wrapped_batch_validate'))
 
     # create the parser for the "seq-valid" command
     parser_c = subparsers.add_parser('seq-valid',
-                                     description='Validates up to 2 sequencing data files.')
+                                     description='Validates up to 2 fastq[.gz] files or a '
+                                                 'single bam.  Truncated BGZF, bzip2 and xz '
+                                                 'input is rejected before it is read, large '
+                                                 'plain gzip only once its data ends early.')
     parser_c.add_argument('-v', '--version',
-                          action='version',
-                          version='%(prog)s ' + version)
+                          action=cliutil.VersionAction)
     parser_c.add_argument('-r', '--report',
                           dest='report',
                           type=argparse.FileType('w'),
@@ -90,7 +166,218 @@ def main():
                           nargs='+',
                           help='Input manifest in tsv formats',
                           required=True)
-    parser_c.set_defaults(func=validate_seq_files)
+    parser_c.add_argument('-m', '--max-record-mem',
+                          dest='max_record_mem',
+                          metavar='BYTES',
+                          type=cliutil.int_at_least(1),
+                          default=constants.RECORD_MEM_CAP,
+                          help='Records with longer sequence are validated by streaming, '
+                               'holding only counters [%(default)s]',
+                          required=False)
+    parser_c.add_argument('-t', '--threads',
+                          dest='threads',
+                          type=cliutil.int_at_least(1),
+                          default=1,
+                          help='Threads used to inflate (bam) or compress (--output) BGZF blocks '
+                               '[%(default)s]',
+                          required=False)
+    parser_c.add_argument('-n', '--count',
+                          dest='count',
+                          action='store_true',
+                          help='Only count pairs and check both ends agree by counting lines '
+                               '(fastq only), near decompression speed.  Records must be 4 '
+                               'lines, only the first %d are checked'
+                               % (constants.COUNT_SAMPLE_RECORDS),
+                          required=False)
+    parser_c.add_argument('-e', '--max-errors',
+                          dest='max_errors',
+                          metavar='INT',
+                          type=int,
+                          default=0,
+                          help='Keep validating after errors, reporting up to this many examples '
+                               'of each error category (fastq only), 0 stops at the first '
+                               '[%(default)s]',
+                          required=False)
+    parser_c.add_argument('-d', '--check-duplicates',
+                          dest='check_duplicates',
+                          action='store_true',
+                          help='Check read names are unique (fastq only), the first file is read '
+                               'a second time if candidates are found',
+                          required=False)
+    parser_c.add_argument('--dup-mem',
+                          dest='dup_mem',
+                          metavar='BYTES',
+                          type=cliutil.int_at_least(1),
+                          default=dup_names.default_mem,
+                          help='Memory budget for --check-duplicates, above this read name hashes '
+                               'are held in a Bloom filter [%(default)s]',
+                          required=False)
+    parser_c.add_argument('--header-format',
+                          dest='header_format',
+                          choices=[read_headers.AUTO] + read_headers.names(),
+                          default=read_headers.AUTO,
+                          help='Format of read headers (fastq only), detected from the first '
+                               'record by default [%(default)s]',
+                          required=False)
+    parser_c.add_argument('--header-stats',
+                          dest='header_stats',
+                          action='store_true',
+                          help='Report reads per flowcell/lane/tile and the most frequent index '
+                               'sequences from Illumina read names (fastq only)',
+                          required=False)
+    parser_c.add_argument('--top-barcodes',
+                          dest='top_barcodes',
+                          metavar='INT',
+                          type=cliutil.int_at_least(1),
+                          default=header_stats.default_top_k,
+                          help='Index sequences tracked by --header-stats [%(default)s]',
+                          required=False)
+    parser_c.add_argument('-x', '--index',
+                          dest='index',
+                          action='store_true',
+                          help='Write a record index for random access (fastq only), see '
+                               '--index-file',
+                          required=False)
+    parser_c.add_argument('--index-file',
+                          dest='index_file',
+                          metavar='FILE',
+                          default=None,
+                          help='Where to write the index [first input + %s]'
+                               % (constants.INDEX_EXT),
+                          required=False)
+    parser_c.add_argument('--index-every',
+                          dest='index_every',
+                          metavar='PAIRS',
+                          type=cliutil.int_at_least(1),
+                          default=constants.INDEX_EVERY,
+                          help='Pairs between index entries [%(default)s]',
+                          required=False)
+    parser_c.add_argument('-o', '--output',
+                          dest='output',
+                          metavar='PREFIX',
+                          default=None,
+                          help='Write the validated records as BGZF fastq, see --shard-pairs, '
+                               '--output-plain (fastq only)',
+                          required=False)
+    parser_c.add_argument('--shard-pairs',
+                          dest='shard_pairs',
+                          metavar='PAIRS',
+                          type=cliutil.int_at_least(0),
+                          default=0,
+                          help='Split --output into files of this many pairs, 0 for no split '
+                               '[%(default)s]',
+                          required=False)
+    parser_c.add_argument('--output-layout',
+                          dest='output_layout',
+                          choices=constants.OUTPUT_LAYOUTS,
+                          default='same',
+                          help='Write --output and --sample-output interleaved or as a pair of '
+                               'files (de-interleave), or the same as the input [%(default)s]',
+                          required=False)
+    parser_c.add_argument('--output-plain',
+                          dest='output_plain',
+                          action='store_true',
+                          help='Write --output and --sample-output uncompressed',
+                          required=False)
+    parser_c.add_argument('-s', '--sample',
+                          dest='sample',
+                          metavar='PAIRS',
+                          type=cliutil.int_at_least(0),
+                          default=0,
+                          help='Write a uniform random sample of this many valid pairs to '
+                               '--sample-output, 0 for no sample (fastq only) [%(default)s]',
+                          required=False)
+    parser_c.add_argument('--sample-output',
+                          dest='sample_output',
+                          metavar='PREFIX',
+                          default=None,
+                          help='Where to write --sample, named as --output',
+                          required=False)
+    parser_c.add_argument('--sample-seed',
+                          dest='sample_seed',
+                          metavar='INT',
+                          type=int,
+                          default=constants.SAMPLE_SEED,
+                          help='Random seed of --sample, the same seed and input give the same '
+                               'sample [%(default)s]',
+                          required=False)
+    parser_c.add_argument('-z', '--decompressor',
+                          dest='decompressor',
+                          metavar='PROG',
+                          default=None,
+                          help="Decompress input with an external program ('PROG -dc file'), "
+                               "'%s' picks the first of pigz/igzip (gzip) or lbzip2/pbzip2 "
+                               "(bzip2) on PATH, falling back to in process [in process]"
+                               % (constants.DECOMPRESSOR_AUTO),
+                          required=False)
+    parser_c.add_argument('--read-size',
+                          dest='read_size',
+                          metavar='BYTES',
+                          type=cliutil.int_at_least(1),
+                          default=None,
+                          help='Read input in requests of this size with sequential read-ahead '
+                               'hints, for network filesystems (4MB when --prefetch or '
+                               '--drop-cache is set) [default buffering]',
+                          required=False)
+    parser_c.add_argument('--prefetch',
+                          dest='prefetch',
+                          metavar='CHUNKS',
+                          type=cliutil.int_at_least(0),
+                          default=0,
+                          help='Read this many --read-size chunks ahead on a thread '
+                               '[%(default)s]',
+                          required=False)
+    parser_c.add_argument('--drop-cache',
+                          dest='drop_cache',
+                          action='store_true',
+                          help='Ask the kernel to drop input from the page cache once read, so '
+                               'other jobs keep their cached data',
+                          required=False)
+    parser_c.add_argument('-f', '--follow',
+                          dest='follow',
+                          action='store_true',
+                          help='Validate files still being written (fastq only), waiting for more '
+                               'data at the end until --follow-marker exists or the file is '
+                               'unchanged for --follow-stable',
+                          required=False)
+    parser_c.add_argument('--follow-marker',
+                          dest='follow_marker',
+                          metavar='FILE',
+                          default=None,
+                          help='File created once the inputs are complete (with --follow)',
+                          required=False)
+    parser_c.add_argument('--follow-stable',
+                          dest='follow_stable',
+                          metavar='SECS',
+                          type=float,
+                          default=reader.default_stable,
+                          help='Seconds since last modified after which an input is '
+                               'complete (with --follow) [%(default)s]',
+                          required=False)
+    parser_c.set_defaults(func=cliutil.command('seq_validator', 'validate_seq_files'))
+
+    # create the parser for the "serve" command
+    parser_d = subparsers.add_parser('serve',
+                                     description='Run as a service accepting man-norm, man-valid '
+                                                 'and seq-valid jobs (newline delimited json).')
+    parser_d.add_argument('-v', '--version',
+                          action=cliutil.VersionAction)
+    listen = parser_d.add_mutually_exclusive_group(required=True)
+    listen.add_argument('-s', '--socket',
+                        dest='socket',
+                        metavar='PATH',
+                        help='Unix socket to listen on')
+    listen.add_argument('-p', '--port',
+                        dest='port',
+                        type=int,
+                        help='TCP port to listen on (localhost only)')
+    parser_d.add_argument('-w', '--workers',
+                          dest='workers',
+                          type=cliutil.int_at_least(1),
+                          default=None,
+                          help='Number of worker processes [cpu count]',
+                          required=False)
+    parser_d.set_defaults(func=cliutil.command('service', 'serve'))
 
     args = parser.parse_args()
     if len(sys.argv) > 1:
@@ -0,0 +1,394 @@
+"""
+Registry of the compression formats sequence files can be read from.  The
+format is detected from the first bytes of a file, not its extension.
+
+Compressed files can optionally be decompressed by an external program (e.g.
+pigz or igzip for gzip) in a subprocess running alongside validation,
+otherwise the python bz2/gzip/lzma modules are used.
+
+Before a file is read its end is checked (check_complete) so a truncated
+BGZF, bzip2 or xz upload is rejected without decompressing the whole file.
+Plain gzip is only checked when its last member starts within
+GZIP_TAIL_BYTES of its end, a large single member file (the usual gzip
+output) can't be checked without inflating all of it, so its truncation is
+only found when the data is read.
+"""
+
+import io
+import os
+import bz2
+import gzip
+import lzma
+import zlib
+import shutil
+import struct
+import subprocess
+
+from cgp_seq_input_val import bgzf, constants
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+# bytes read to identify a format
+SNIFF_BYTES = 18
+# name reported when decompression is in process
+IN_PROCESS = 'python'
+# value of decompressor selecting the first external program found on PATH
+AUTO = constants.DECOMPRESSOR_AUTO
+# end of file searched for the start of the last gzip member, inflated
+GZIP_TAIL_BYTES = 256 * 1024
+# BGZF block headers checked from the start of a file
+BGZF_SPOT_BLOCKS = 16
+# 48-bit magic at the end of every bzip2 stream, not byte aligned
+BZIP2_EOS_MAGIC = 0x177245385090
+
+
+class Codec(object):
+    """
+    A compression format.
+
+    Args:
+        name - reported name
+        match - callable given the first SNIFF_BYTES of a file, True if in
+                this format
+        module - module (or object) with an open() like gzip.open(), None for
+                 plain text
+        external - optional, external decompressors tried in order by 'auto',
+                   each is run as '<program> -dc <file>'
+        check_end - optional, callable given (binary file handle, file size,
+                    filename) raising SeqValidationError when the file is
+                    truncated
+    """
+    def __init__(self, name, match, module, external=(), check_end=None):
+        self.name = name
+        self.match = match
+        self.module = module
+        self.external = external
+        self.check_end = check_end
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def compressed(self):
+        """False for plain text"""
+        return self.module is not None
+
+    def open(self, filename, mode='rt', newline=None):
+        """
+        Opens filename in process, mode is 'rt' or 'rb'
+        """
+        opener = open if self.module is None else self.module.open
+        if mode == 'rb':
+            return opener(filename, 'rb')
+        return opener(filename, mode, newline=newline)
+
+
+def _truncated(filename, reason):
+    return SeqValidationError("%s is truncated, %s" % (filename, reason), 'truncated')
+
+
+def _last_member(tail):
+    """
+    Looks for the start of the last gzip member in the final bytes of a file.
+
+    Returns:
+        True when a member ends exactly at the end of the file, False when
+        one inflates to text but the data ends before the member does and
+        None when no member start is found
+    """
+    pos = tail.find(b'\x1f\x8b\x08')
+    while pos != -1:
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            text = inflater.decompress(tail[pos:])
+        except zlib.error:
+            text = None  # magic within compressed data, not a member start
+        if inflater.eof:
+            if not inflater.unused_data:
+                return True
+            # the member ends before another starts, carry on from there
+            pos = len(tail) - len(inflater.unused_data) - 1
+        elif text and b'\n' in text and max(text) < 0x80:
+            return False
+        pos = tail.find(b'\x1f\x8b\x08', pos + 1)
+    return None
+
+
+def _gzip_end(fh, size, filename):
+    """
+    Checks the last gzip member ends at the end of the file.  When the last
+    member started before GZIP_TAIL_BYTES from the end (e.g. a large single
+    member file) nothing can be concluded, a deflate stream can't be decoded
+    from part way through.  Corrupt (rather than short) data is left to be
+    found when it is read.
+    """
+    if size < 18:
+        raise _truncated(filename, "too short to hold a gzip header and trailer")
+    start = max(0, size - GZIP_TAIL_BYTES)
+    fh.seek(start)
+    tail = fh.read(size - start)
+    complete = _last_member(tail)
+    if complete is False:
+        raise _truncated(filename, "the last gzip member ends early")
+
+
+def _bgzf_end(fh, size, filename):
+    """
+    Checks the first BGZF_SPOT_BLOCKS block headers chain from one to the
+    next, the EOF marker block is present and the last data block finishes
+    where it starts.
+    """
+    coffset = 0
+    for _ in range(BGZF_SPOT_BLOCKS):
+        if coffset == size:
+            break
+        fh.seek(coffset)
+        head = fh.read(18)
+        if len(head) < 18 or not bgzf.is_bgzf(head):
+            raise _truncated(filename, "BGZF block at offset %d is incomplete" % (coffset))
+        block_end = coffset + bgzf.HEADER.unpack_from(head)[-1] + 1
+        if block_end > size:
+            raise _truncated(filename, "BGZF block at offset %d is incomplete" % (coffset))
+        coffset = block_end
+    if not bgzf.has_eof_block(fh):
+        raise _truncated(filename, "the BGZF EOF marker block is missing")
+    if size > len(bgzf.EOF_BLOCK):
+        _gzip_end(fh, size - len(bgzf.EOF_BLOCK), filename)
+
+
+def _bzip2_end(fh, size, filename):
+    """
+    Checks the end of stream marker and combined CRC finish the file, the
+    stream is padded to a whole byte after them.
+    """
+    fh.seek(max(0, size - 11))
+    tail = int.from_bytes(fh.read(11), 'big')
+    for pad in range(8):
+        if (tail >> (32 + pad)) & 0xffffffffffff == BZIP2_EOS_MAGIC:
+            return
+    raise _truncated(filename, "the bzip2 end of stream marker is missing")
+
+
+def _xz_end(fh, size, filename):
+    """
+    Checks the file ends with an intact xz stream footer, allowing for
+    stream padding.
+    """
+    fh.seek(max(0, size - 1024))
+    tail = fh.read()
+    while tail.endswith(b'\x00' * 4):
+        tail = tail[:-4]
+    footer = tail[-12:]
+    if (len(footer) < 12 or not footer.endswith(b'YZ') or
+            struct.unpack('<I', footer[:4])[0] != zlib.crc32(footer[4:10])):
+        raise _truncated(filename, "the xz stream footer is missing")
+
+
+# checked in order, first match wins, PLAIN when none match
+CODECS = [Codec('bgzf', bgzf.is_bgzf, gzip, external=('igzip', 'pigz'),
+                check_end=_bgzf_end),
+          Codec('gzip', lambda head: head.startswith(b'\x1f\x8b'), gzip,
+                external=('igzip', 'pigz'), check_end=_gzip_end),
+          Codec('bzip2', lambda head: head.startswith(b'BZh'), bz2,
+                external=('lbzip2', 'pbzip2'), check_end=_bzip2_end),
+          Codec('xz', lambda head: head.startswith(b'\xfd7zXZ\x00'), lzma, check_end=_xz_end)]
+PLAIN = Codec('plain', lambda head: True, None)
+
+
+def register(codec):
+    """
+    Adds a codec, checked before those already registered
+    """
+    CODECS.insert(0, codec)
+
+
+def sniff(filename, reader=None):
+    """
+    Returns the Codec of a file, reader is an optional reader.InputReader to
+    open it with (e.g. to wait for a file being written)
+    """
+    with open(filename, 'rb') if reader is None else reader.open(filename) as fh:
+        head = fh.read(SNIFF_BYTES)
+    for codec in CODECS:
+        if codec.match(head):
+            return codec
+    return PLAIN
+
+
+def check_complete(filename, codec=None):
+    """
+    Quick check that a compressed file is not truncated, only the start and
+    end of the file are read.  Passing is not a guarantee, see module docs.
+
+    Args:
+        filename - file to check
+        codec - optional, Codec of the file, sniffed when not given
+
+    Raises:
+        SeqValidationError - category 'truncated'
+    """
+    if codec is None:
+        codec = sniff(filename)
+    if codec.check_end is None:
+        return
+    with open(filename, 'rb') as fh:
+        codec.check_end(fh, os.fstat(fh.fileno()).st_size, filename)
+
+
+def summary(files, codecs, decompressor, seconds):
+    """
+    Returns the codec(s) of files, how they were decompressed and the rate
+    they were read (compressed MB/s over seconds)
+
+    Args:
+        files - files read
+        codecs - dict of file to Codec
+        decompressor - as given to find_decompressor()
+        seconds - time taken to read them, None when unknown
+    """
+    codecs = [codecs[filename] for filename in files]
+    programs = set(find_decompressor(codec, decompressor) for codec in codecs)
+    programs.discard(None)
+    input_bytes = sum(os.path.getsize(filename) for filename in files)
+    rate = None
+    if seconds:
+        rate = round(input_bytes / seconds / 1e6, 2)
+    return {'codec': '/'.join(sorted(set(codec.name for codec in codecs))),
+            'decompressor': '/'.join(sorted(programs)) or IN_PROCESS,
+            'input_bytes': input_bytes,
+            'mb_per_sec': rate}
+
+
+def find_decompressor(codec, decompressor):
+    """
+    Resolves the external decompressor to use for codec.
+
+    Args:
+        codec - Codec
+        decompressor - None for in process, AUTO for the first of
+                       codec.external on PATH, otherwise a program name
+
+    Returns:
+        program name, None when decompressing in process
+
+    Raises:
+        SeqValidationError - named program not found
+    """
+    if decompressor is None or not codec.compressed:
+        return None
+    if decompressor == AUTO:
+        for program in codec.external:
+            if shutil.which(program):
+                return program
+        return None
+    if shutil.which(decompressor) is None:
+        raise SeqValidationError("Decompressor '%s' not found on PATH" % (decompressor))
+    return decompressor
+
+
+def open_text(filename, codec=None, decompressor=None, newline=None, reader=None):
+    """
+    Opens a possibly compressed file for reading as text.
+
+    Args:
+        filename - file to open
+        codec - optional, Codec of the file, sniffed when not given
+        decompressor - optional, see find_decompressor()
+        newline - as for open()
+        reader - optional, reader.InputReader used to read the file when
+                 decompressing in process
+
+    Returns:
+        text file handle
+    """
+    if codec is None:
+        codec = sniff(filename)
+    program = find_decompressor(codec, decompressor)
+    if program is not None:
+        return PipeText(filename, program, newline)
+    if reader is not None:
+        return ReaderText(codec, reader.open(filename), newline)
+    return codec.open(filename, 'rt', newline)
+
+
+class ReaderText(io.TextIOWrapper):
+    """
+    Text of an open binary file decoded by a codec, the binary file is
+    closed with this handle.
+    """
+    def __init__(self, codec, source, newline=None):
+        self.source = source
+        binary = source if codec.module is None else codec.module.open(source, 'rb')
+        super().__init__(binary, newline=newline)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self.source.close()
+
+
+def _pipe(filename, program):
+    return subprocess.Popen([program, '-dc', filename],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def _pipe_closed(proc, program, filename, finished):
+    """
+    Waits for a decompressor whose output has been closed, raising its
+    failure when the output was read to the end
+
+    Raises:
+        SeqValidationError
+    """
+    if not finished:
+        proc.kill()  # reading stopped early
+    status = proc.wait()
+    message = proc.stderr.read().decode('utf-8', 'replace').strip()
+    proc.stderr.close()
+    if finished and status != 0:
+        raise SeqValidationError("%s failed to decompress %s (status %d): %s"
+                                 % (program, filename, status, message), 'compression')
+
+
+class PipeText(io.TextIOWrapper):
+    """
+    Text output of '<program> -dc <filename>'.  A failure of the program is
+    raised when the handle is closed, unless reading stopped early.
+    """
+    def __init__(self, filename, program, newline=None):
+        self.filename = filename
+        self.program = program
+        self.proc = _pipe(filename, program)
+        super().__init__(self.proc.stdout, newline=newline)
+
+    def close(self):
+        if self.closed:
+            return
+        # the program has finished writing once its output is exhausted
+        finished = self.buffer.read1(1) == b''
+        super().close()
+        _pipe_closed(self.proc, self.program, self.filename, finished)
+
+
+class PipeBinary(object):
+    """
+    Binary output of '<program> -dc <filename>', see PipeText.
+    """
+    def __init__(self, filename, program):
+        self.filename = filename
+        self.program = program
+        self.proc = _pipe(filename, program)
+
+    def read(self, size):
+        """Returns up to size bytes, fewer only at the end"""
+        return self.proc.stdout.read(size)
+
+    def close(self):
+        """Closes the output, raising a failure of the program"""
+        if self.proc.stdout.closed:
+            return
+        finished = self.proc.stdout.read1(1) == b''
+        self.proc.stdout.close()
+        _pipe_closed(self.proc, self.program, self.filename, finished)
@@ -4,3 +4,24 @@
 MANIFEST_EXTNS = ('xls', 'xlsx', 'csv', 'tsv')
 # start of line denoting change between header and body
 HEADER_BODY_SWITCH = 'Group_ID'
+
+# Defaults shown in the command line help.  They live here so building the
+# parser doesn't import the modules using them.
+# pairs read from each row by a pair check
+PAIR_CHECK_PAIRS = 1000
+# rows pair checked at the same time
+PAIR_CHECK_WORKERS = 4
+# records with longer sequence are validated without holding seq/qual in memory
+RECORD_MEM_CAP = 4 * 1024 * 1024
+# pairs between record index entries
+INDEX_EVERY = 10000
+# extension of a record index beside its input
+INDEX_EXT = '.sqi'
+# values accepted for the layout of validated output
+OUTPUT_LAYOUTS = ('same', 'interleaved', 'paired')
+# value of decompressor selecting the first external program found on PATH
+DECOMPRESSOR_AUTO = 'auto'
+# seed of the reservoir sample of pairs
+SAMPLE_SEED = 1
+# records at the start of each file checked to be 4 line records when counting
+COUNT_SAMPLE_RECORDS = 1000
@@ -0,0 +1,226 @@
+"""
+Memory bounded detection of duplicate read names.
+
+Names are reduced to 64-bit hashes held in an open addressing hash set
+backed by array('Q') (~12 bytes per name).  When that would exceed the
+memory budget the hashes move to a Bloom filter filling the budget (~10
+bits per name at 1% false positives).  Either way a hit only makes the hash
+a candidate, a confirmation pass over the names of candidate hashes reports
+true duplicates with their line numbers.  Candidates are held within the same
+budget, the Bloom filter leaves 1/CANDIDATE_SHARE of it for them.  Hits once
+candidates can't grow are only counted as possible duplicates.
+"""
+
+from array import array
+
+MASK_64 = 0xffffffffffffffff
+# hash set is grown (or abandoned for a Bloom filter) above this load factor
+MAX_LOAD = 0.7
+# hashes per name in Bloom mode, optimal for ~10 bits per name
+BLOOM_HASHES = 7
+# part of the budget the Bloom filter leaves for candidates (1/8th)
+CANDIDATE_SHARE = 8
+# default memory budget for the first pass
+default_mem = 1024 * 1024 * 1024
+
+
+def name_hash(name):
+    """
+    64-bit hash of a read name, never 0 as that marks an empty slot.  Stable
+    within a process only (str hash randomisation), which is all that's
+    needed between the two passes.
+    """
+    value = hash(name) & MASK_64
+    return value or 1
+
+
+class HashSet64(object):
+    """
+    Open addressing (linear probe) set of non-zero 64-bit integers.
+
+    Args:
+        slots - initial number of slots, rounded up to a power of 2
+    """
+    def __init__(self, slots=1 << 16):
+        size = 1
+        while size < slots:
+            size <<= 1
+        self.table = array('Q', bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (value for value in self.table if value)
+
+    @property
+    def nbytes(self):
+        """Memory used by the table"""
+        return len(self.table) * 8
+
+    def full(self):
+        """True when the load factor is exceeded"""
+        return self.count > len(self.table) * MAX_LOAD
+
+    def add(self, value):
+        """
+        Adds value, returns True if it was already present
+        """
+        table = self.table
+        mask = self.mask
+        i = value & mask
+        while True:
+            slot = table[i]
+            if slot == 0:
+                table[i] = value
+                self.count += 1
+                return False
+            if slot == value:
+                return True
+            i = (i + 1) & mask
+
+    def __contains__(self, value):
+        table = self.table
+        mask = self.mask
+        i = value & mask
+        while True:
+            slot = table[i]
+            if slot == 0:
+                return False
+            if slot == value:
+                return True
+            i = (i + 1) & mask
+
+    def grown(self):
+        """
+        Returns a copy with twice the slots
+        """
+        bigger = HashSet64(len(self.table) * 2)
+        for value in self:
+            bigger.add(value)
+        return bigger
+
+
+class BloomFilter(object):
+    """
+    Bloom filter over 64-bit hashes, bit positions by double hashing of the
+    two 32-bit halves.
+
+    Args:
+        nbytes - size of the bit array
+        hashes - bits set per value
+    """
+    def __init__(self, nbytes, hashes=BLOOM_HASHES):
+        self.bits = bytearray(nbytes)
+        self.nbits = nbytes * 8
+        self.hashes = hashes
+
+    @property
+    def nbytes(self):
+        """Memory used by the bit array"""
+        return len(self.bits)
+
+    def add(self, value):
+        """
+        Adds value, returns True if it was (probably) already present
+        """
+        bits = self.bits
+        nbits = self.nbits
+        step = (value >> 32) | 1
+        pos = value & 0xffffffff
+        present = True
+        for _ in range(self.hashes):
+            pos = (pos + step) % nbits
+            byte = pos >> 3
+            bit = 1 << (pos & 7)
+            if not bits[byte] & bit:
+                present = False
+                bits[byte] |= bit
+        return present
+
+
+class DuplicateNames(object):
+    """
+    Two pass duplicate read name detection.  Feed every name to add(), then
+    give confirm() a fresh iterator of (name, line) over the same names.
+
+    Args:
+        max_bytes - memory budget of the first pass, the hash set or Bloom
+                    filter and the candidates found
+    """
+    def __init__(self, max_bytes=default_mem):
+        self.max_bytes = max_bytes
+        self.seen = HashSet64(min(1 << 16, max(max_bytes // 16, 1)))  # can double within budget
+        self.bloom = False
+        self.candidates = HashSet64(16)
+        self.possible = 0  # hits not held as candidates, budget exhausted
+
+    @property
+    def nbytes(self):
+        """Memory used by the hashes and candidates"""
+        return self.seen.nbytes + self.candidates.nbytes
+
+    @property
+    def mode(self):
+        """'exact' while hashes fit the budget, then 'bloom'"""
+        return 'bloom' if self.bloom else 'exact'
+
+    def add(self, name):
+        """
+        Records a name from the first pass
+        """
+        value = name_hash(name)
+        if self.seen.add(value):
+            if self.candidates.full():
+                if value not in self.candidates:
+                    self.possible += 1
+                return
+            self.candidates.add(value)
+            if self.candidates.full() and self.nbytes + self.candidates.nbytes <= self.max_bytes:
+                self.candidates = self.candidates.grown()
+        elif not self.bloom and self.seen.full():
+            self._grow()
+
+    def _grow(self):
+        if self.nbytes + self.seen.nbytes <= self.max_bytes:
+            self.seen = self.seen.grown()
+            return
+        # can't double within budget, switch to a Bloom filter
+        room = self.max_bytes - self.max_bytes // CANDIDATE_SHARE - self.candidates.nbytes
+        bloom = BloomFilter(max(room, self.seen.nbytes))
+        for value in self.seen:
+            bloom.add(value)
+        self.seen = bloom
+        self.bloom = True
+
+    def needs_confirm(self):
+        """True when the first pass found candidates (see also possible)"""
+        return len(self.candidates) > 0
+
+    def confirm(self, names, limit=None):
+        """
+        Second pass, resolves candidates to true duplicates.
+
+        Args:
+            names - iterable of (name, line) in the same order as add()
+            limit - optional, stop once this many duplicated names are known
+                    (lines are then only those seen so far)
+
+        Returns:
+            list of (name, [lines]) in order of the first repeat
+        """
+        candidates = self.candidates
+        lines = {}
+        found = []
+        for (name, line) in names:
+            if name_hash(name) not in candidates:
+                continue
+            seen_at = lines.setdefault(name, [])
+            seen_at.append(line)
+            if len(seen_at) == 2:
+                found.append(name)
+                if limit is not None and len(found) >= limit:
+                    break
+        return [(name, lines[name]) for name in found]
@@ -2,8 +2,22 @@
 
 
 class SeqValidationError(RuntimeError):
-    """Exception for failures to validate data in the manifest."""
-    pass
+    """
+    Exception for failures to validate sequence data.
+
+    Args:
+        message - error message
+        category - optional, type of problem, used to group errors in reports
+        position - optional, dict locating the problem (file, line, byte)
+    """
+    def __init__(self, message, category=None, position=None):
+        super().__init__(message)
+        self.category = category
+        self.position = position
+
+    def __reduce__(self):
+        # keep category/position when passed between processes
+        return (self.__class__, (str(self), self.category, self.position))
 
 
 class ConfigError(RuntimeError):
@@ -25,3 +39,10 @@ class ValidationError(RuntimeError):
     Exception for failures to validate data in the manifest.
     """
     pass
+
+
+class JobCancelledError(RuntimeError):
+    """
+    Exception raised when a running validation is cancelled by its caller.
+    """
+    pass
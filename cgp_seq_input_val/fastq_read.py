@@ -2,82 +2,393 @@
 Models a fastq read
 """
 
-import re
+import os
 
+from cgp_seq_input_val import read_headers
 from cgp_seq_input_val.error_classes import SeqValidationError
 
+# compression extensions accepted after .fastq/.fq
+COMPRESSED_EXTS = ('.gz', '.bz2', '.xz')
+
+# IUPAC nucleotide codes, either case
+SEQ_ALPHABET = b'ACGTUNRYKMSWBDHVacgtunrykmswbdhv'
+# printable phred+33 range, '!' (0) to '~' (93)
+QUAL_CHARS = bytes(range(33, 127))
+# translation table for FastqRead.check_content, allowed bytes map to
+# themselves and any other to 0 (non-ASCII encodes to bytes above 127)
+_SEQ_TABLE = bytes(byte if byte in SEQ_ALPHABET else 0 for byte in range(256))
+# as _SEQ_TABLE for quality, keyed by quality floor
+_QUAL_TABLES = {}
+# deletion tables for FastqRead.min_qual, keyed by threshold
+_DROP_TABLES = {}
+
 
 class FastqRead(object):
     """
     Models and validates a fastq read, calling print will produce a 4 line
     record regardess of original format.
 
+    Strict 4-line records (the vast majority of Illumina output) are consumed
+    by a fast path taking exactly four lines, anything else falls back to the
+    general multi-line parser.  Line numbers and errors are the same for both.
+
+    Multi-line records with a sequence longer than max_bytes are streamed,
+    only lengths and the minimum quality are kept (seq/qual are None).
+
     Inputs:
         fp: open file pointer to get next read from
         line_no_in: current line number
         curr_line: last line read from file
             - None = start of file
+        max_bytes: optional, sequence length above which record is streamed
+            - None = never stream
     """
-    def __init__(self, fq_fh, line_no_in, curr_line):
-        line_no = line_no_in
+    def __init__(self, fq_fh, line_no_in, curr_line, max_bytes=None):
         header = None
-        seq = ''
-        qual = ''
         if curr_line is None:
             header = fq_fh.readline().rstrip()
-            line_no_in = 1
-            line_no += 1
         else:
             header = curr_line
+        line_no = line_no_in + 1
+        line_no_in = line_no
 
-        curr_line = fq_fh.readline().rstrip()
-        line_no += 1
-        while not curr_line.startswith('+'):
-            seq += curr_line
-            curr_line = fq_fh.readline().rstrip()
-            line_no += 1
-
-        seq_len = len(seq)
-        # eat the '+' line
-        curr_line = fq_fh.readline().rstrip()
-
-        while len(qual) < seq_len:
-            qual += curr_line
+        self.header = header
+        self.max_bytes = max_bytes
+        self.q_min = None  # only populated when streamed
+        self.bad_seq = None  # first invalid character, set by validate (or when streamed)
+        self.bad_qual = None
+        self.q_floor = None  # no quality below this, set by validate
+        seq_raw = fq_fh.readline()
+        sep_raw = fq_fh.readline()
+        line_no += 2
+        seq = seq_raw.rstrip()
+        if seq and sep_raw.startswith('+') and not seq.startswith('+'):
+            # strict 4-line layout, no concatenation required
+            self.four_line = True
+            self.streamed = False
+            qual = fq_fh.readline().rstrip()
             curr_line = fq_fh.readline().rstrip()
             line_no += 1
-            if curr_line == '':
-                break
-        self.header = header
+            self.seq_len = len(seq)
+            self.qual_len = len(qual)
+            if self.qual_len < self.seq_len and curr_line != '':
+                # quality wraps even though sequence didn't
+                self.four_line = False
+                (qual, curr_line, line_no) = self._read_qual(fq_fh, line_no, [qual], curr_line)
+        else:
+            self.four_line = False
+            (seq, qual, curr_line, line_no) = self._read_multi_line(fq_fh, line_no - 2,
+                                                                    [seq_raw, sep_raw])
         self.seq = seq
         self.qual = qual
         self.file_pos = (line_no_in, line_no)
         self.last_line = curr_line  # as we need to pass this back
         self.name = None
         self.end = None
+        self.valid = True
+        self.byte_start = None  # set by callers which track offsets
 
     def __str__(self):
+        if self.streamed:
+            raise ValueError("Fastq record at line %d was streamed, sequence not retained"
+                             % (self.file_pos[0]))
         return "%s\n%s\n+\n%s" % (self.header, self.seq, self.qual)
 
-    def validate(self, filename):
+    def min_qual(self, below=None):
+        """
+        Returns the lowest quality value (as ordinal) of this record, None if
+        quality is empty.
+
+        Args:
+            below - optional, only values lower than this are of interest,
+                    None is returned when there are none.  Values at or above
+                    it are dropped in bulk first, much cheaper than min() over
+                    the whole string when the answer is usually None.
+        """
+        if below is not None and self.q_floor is not None and below <= self.q_floor:
+            return None  # already established by validate
+        if self.streamed:
+            q_min = self.q_min
+        elif not self.qual:
+            return None
+        elif below is None:
+            return ord(min(self.qual))
+        else:
+            lower = self.qual.encode('ascii', 'ignore').translate(None, _at_or_above(below))
+            q_min = min(lower) if lower else None
+        if below is not None and q_min is not None and q_min >= below:
+            return None
+        return q_min
+
+    def _read_multi_line(self, fq_fh, line_no, pending):
+        """
+        General parser for records where sequence and/or quality wrap over
+        several lines.
+
+        Args:
+            fq_fh - open file pointer
+            line_no - line number of the header
+            pending - raw lines already consumed from fq_fh by the fast path
+
+        Returns:
+            tuple of (seq, qual, last_line, line_no), seq and qual are None
+            when the record was streamed
+        """
+        def next_line():
+            if pending:
+                return pending.pop(0)
+            return fq_fh.readline()
+
+        max_bytes = self.max_bytes
+        seq = []
+        seq_len = 0
+        raw = next_line()
+        curr_line = raw.rstrip()
+        line_no += 1
+        while not curr_line.startswith('+'):
+            if raw == '':
+                break  # EOF before '+', record is truncated
+            seq_len += len(curr_line)
+            if seq is not None:
+                seq.append(curr_line)
+                if max_bytes is not None and seq_len > max_bytes:
+                    self.bad_seq = first_invalid(''.join(seq), SEQ_ALPHABET)
+                    seq = None  # too long to hold, only count from here
+            elif self.bad_seq is None:
+                self.bad_seq = first_invalid(curr_line, SEQ_ALPHABET)
+            raw = next_line()
+            curr_line = raw.rstrip()
+            line_no += 1
+        self.seq_len = seq_len
+        self.streamed = seq is None
+        if seq is not None:
+            seq = ''.join(seq)
+
+        # eat the '+' line
+        curr_line = next_line().rstrip()
+        self.qual_len = 0
+        (qual, curr_line, line_no) = self._read_qual(next_line, line_no, [], curr_line)
+        return (seq, qual, curr_line, line_no)
+
+    def _read_qual(self, reader, line_no, qual, curr_line):
+        """
+        Consume quality lines until they cover the sequence length, sets
+        qual_len (and q_min when streamed).  A continuation line which looks
+        like the next record's header (see _next_header) is left unconsumed,
+        so a record with short quality doesn't take the following record's
+        header with it.
+
+        Args:
+            reader - open file pointer or callable returning the next raw line
+            line_no - current line number
+            qual - list of quality lines already consumed
+            curr_line - next unconsumed quality line
+
+        Returns:
+            tuple of (qual, last_line, line_no), qual is None when streamed
+        """
+        if not callable(reader):
+            reader = reader.readline
+        seq_len = self.seq_len
+        streamed = self.streamed
+        q_min = self.q_min
+        qual_len = self.qual_len
+        lines = len(qual)  # the first quality line is never a header
+        while qual_len < seq_len:
+            if lines and curr_line.startswith('@') and self._next_header(curr_line,
+                                                                         seq_len - qual_len):
+                break
+            lines += 1
+            qual_len += len(curr_line)
+            if streamed:
+                if curr_line:
+                    line_min = ord(min(curr_line))
+                    if q_min is None or line_min < q_min:
+                        q_min = line_min
+                    if self.bad_qual is None:
+                        self.bad_qual = first_invalid(curr_line, QUAL_CHARS)
+            else:
+                qual.append(curr_line)
+            curr_line = reader().rstrip()
+            line_no += 1
+            if curr_line == '':
+                break
+        self.qual_len = qual_len
+        self.q_min = q_min
+        if streamed:
+            return (None, curr_line, line_no)
+        return (''.join(qual), curr_line, line_no)
+
+    def _next_header(self, line, missing):
+        """
+        True when a quality continuation line starting '@' (also phred 31) is
+        more likely the next header: it is longer than the quality still
+        missing, or it shares the first half of this record's header
+        """
+        if len(line) > missing:
+            return True  # quality would overrun, the record is corrupt either way
+        prefix = max(2, len(self.header) // 2)
+        return line[:prefix] == self.header[:prefix]
+
+    def validate(self, filename, header_format=None, q_floor=None):
         """
         Checks the record read conforms to expected conventions
 
         Args:
             filename - filename read was read from, used in error messages
+            header_format - optional, read_headers.HeaderFormat of the header,
+                            default read_headers.default() ('/1', '/2' suffix)
+            q_floor - optional, see check_content
 
         Raises:
             SeqValidationError - Generic errror with validation
         """
-        match = re.match(r'@(\S+)/([12])', self.header)
+        if header_format is None:
+            header_format = read_headers.default()
+        match = header_format.regex.match(self.header)
         if match is None:
-            raise SeqValidationError("Sequence record header must begin with \
-                                     '@' one non-whitespace character and \
-                                     '/[12]', line %d of %s"
-                                     % (self.file_pos[0], filename))
-        groups = match.groups()
-        self.name = groups[0]
-        self.end = groups[1]
-
-        if len(self.qual) != len(self.seq):
+            raise SeqValidationError("Sequence record header must be %s (%s format), "
+                                     "line %d of %s"
+                                     % (header_format.description, header_format.name,
+                                        self.file_pos[0], filename),
+                                     'header', self.position(filename))
+        self.name = match.group(header_format.name_group)
+        if header_format.end_group:
+            self.end = match.group(header_format.end_group)
+
+        if self.qual_len != self.seq_len:
             raise SeqValidationError("Fastq record at line %d of %s appears to be corrupt"
-                                     % (self.file_pos[0], filename))
+                                     % (self.file_pos[0], filename),
+                                     'corrupt', self.position(filename))
+
+        self.check_content(filename, q_floor)
+
+    def check_content(self, filename, q_floor=None):
+        """
+        Checks sequence is IUPAC nucleotide codes and quality is printable
+        phred+33, called by validate().
+
+        Args:
+            filename - used in error messages
+            q_floor - optional, quality ordinal the caller's min_qual(below)
+                      threshold will be, the same pass confirms no quality is
+                      below it so min_qual() needn't read the quality again
+
+        Raises:
+            SeqValidationError
+        """
+        if not self.streamed:
+            # translate() returns its input object when every byte maps to
+            # itself, one table lookup per byte and no copy to inspect
+            seq = self.seq.encode()
+            qual = self.qual.encode()
+            seq_ok = seq.translate(_SEQ_TABLE) is seq
+            if seq_ok and qual.translate(_qual_table(q_floor or 0)) is qual:
+                self.q_floor = q_floor
+                return
+            # a quality below q_floor, or invalid content
+            if not seq_ok:
+                self.bad_seq = first_invalid(self.seq, SEQ_ALPHABET)
+            self.bad_qual = first_invalid(self.qual, QUAL_CHARS)
+        (bad_seq, bad_qual) = (self.bad_seq, self.bad_qual)
+        if bad_seq is not None:
+            raise SeqValidationError("Fastq record at line %d of %s has invalid sequence "
+                                     "character %r, expected IUPAC nucleotide codes"
+                                     % (self.file_pos[0], filename, bad_seq),
+                                     'alphabet', self.position(filename))
+        if bad_qual is not None:
+            raise SeqValidationError("Fastq record at line %d of %s has quality character %r "
+                                     "outside the printable phred range ('!' to '~')"
+                                     % (self.file_pos[0], filename, bad_qual),
+                                     'quality', self.position(filename))
+
+    def position(self, filename):
+        """
+        Returns location of the record as a dict (file, line and byte offset
+        when known)
+        """
+        return {'file': filename, 'line': self.file_pos[0], 'byte': self.byte_start}
+
+
+def check_filenames(file_a, file_b=None):
+    """
+    Checks fastq file names have a fastq|fq[.gz|.bz2|.xz] extension, the
+    same for both files of a pair.
+
+    Raises:
+        SeqValidationError
+    """
+    full_ext = ''
+    (base, ext) = os.path.splitext(file_a)
+    if ext in COMPRESSED_EXTS:
+        full_ext = ext
+        (base, ext) = os.path.splitext(base)
+
+    if ext not in ('.fastq', '.fq'):
+        raise SeqValidationError("Input files must be fastq|fq[.gz|.bz2|.xz]")
+
+    full_ext = ext + full_ext
+
+    if file_b is not None and not file_b.endswith(full_ext):
+        raise SeqValidationError("Input files be of same type")
+
+
+def _qual_table(floor):
+    table = _QUAL_TABLES.get(floor)
+    if table is None:
+        table = bytes(byte if byte in QUAL_CHARS and byte >= floor else 0
+                      for byte in range(256))
+        _QUAL_TABLES[floor] = table
+    return table
+
+
+def _at_or_above(value):
+    table = _DROP_TABLES.get(value)
+    if table is None:
+        table = bytes(range(min(value, 256), 256))
+        _DROP_TABLES[value] = table
+    return table
+
+
+def first_invalid(text, allowed):
+    """
+    Returns the first character of text not in allowed (bytes of ASCII
+    characters), None when all are valid.  Valid text costs one encode and
+    a bytes.translate() deletion pass, no per-character python loop.
+    """
+    try:
+        if not text.encode('ascii').translate(None, allowed):
+            return None
+    except UnicodeEncodeError:
+        pass
+    for char in text:  # only reached for invalid text
+        if ord(char) > 127 or ord(char) not in allowed:
+            return char
+    return None
+
+
+def resync(fq_fh, curr_line, line_no):
+    """
+    Skips lines until one which looks like a record header, used to recover
+    after a corrupt record.  A line starting '@' is accepted unless the line
+    before it started '+' and it is as long as the line before that, in
+    which case it is probably quality.
+
+    Args:
+        fq_fh - open file pointer
+        curr_line - last line read from file
+        line_no - line number of the line before curr_line
+
+    Returns:
+        tuple of (header line or '' at EOF, line number of the line before it)
+    """
+    (seq_line, prev_line) = ('', '')
+    while not curr_line.startswith('@') or (prev_line.startswith('+') and
+                                            len(curr_line) == len(seq_line)):
+        raw = fq_fh.readline()
+        if raw == '':
+            return ('', line_no)
+        (seq_line, prev_line) = (prev_line, curr_line)
+        curr_line = raw.rstrip()
+        line_no += 1
+    return (curr_line, line_no)
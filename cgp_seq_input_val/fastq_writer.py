@@ -0,0 +1,244 @@
+"""
+Writes validated fastq records, BGZF compressed or plain and optionally
+split into shards of N pairs, so validation, recompression and sharding
+share a single read of the input.
+"""
+
+import os
+import queue
+import hashlib
+import threading
+from contextlib import ExitStack
+
+from cgp_seq_input_val import constants
+from cgp_seq_input_val.bgzf import BgzfWriter
+
+# buffer of plain outputs
+WRITE_BUFFER = 4 * 1024 * 1024
+# records are handed to the writer thread in chunks of about this size
+CHUNK_BYTES = 1024 * 1024
+# chunks queued per output before the validation thread waits
+MAX_PENDING = 8
+# values accepted for the layout of FastqWriter output
+LAYOUTS = constants.OUTPUT_LAYOUTS
+
+
+class PlainWriter(object):
+    """
+    Buffered uncompressed output keeping an md5 of what is written, same
+    interface as BgzfWriter.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.fh = open(filename, 'wb', buffering=WRITE_BUFFER)
+        self.md5 = hashlib.md5()
+
+    def write(self, data):
+        """Write bytes"""
+        self.fh.write(data)
+        self.md5.update(data)
+
+    def hexdigest(self):
+        """md5 of the output"""
+        return self.md5.hexdigest()
+
+    def close(self):
+        """Close the file"""
+        self.fh.close()
+
+
+class ThreadedWriter(object):
+    """
+    Moves writes (and compression when wrapping a BgzfWriter) off the
+    calling thread.  Data is gathered into chunks which a background thread
+    writes, a bounded queue stops memory growing if output falls behind.
+
+    Args:
+        handle - PlainWriter or BgzfWriter, closed by close()
+    """
+    def __init__(self, handle):
+        self.handle = handle
+        self.filename = handle.filename
+        self.chunk = []
+        self.chunk_bytes = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize=MAX_PENDING)
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                return
+            if self.error is None:
+                try:
+                    self.handle.write(data)
+                except Exception as err:  # re-raised in the calling thread
+                    self.error = err
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, data):
+        """Queue bytes for writing"""
+        self.chunk.append(data)
+        self.chunk_bytes += len(data)
+        if self.chunk_bytes >= CHUNK_BYTES:
+            self._check()
+            self.queue.put(b''.join(self.chunk))
+            self.chunk = []
+            self.chunk_bytes = 0
+
+    def hexdigest(self):
+        """md5 of the output, complete once closed"""
+        return self.handle.hexdigest()
+
+    def close(self):
+        """
+        Writes outstanding data, stops the thread and closes the output
+        """
+        if self.thread is None:
+            return
+        if self.chunk:
+            self.queue.put(b''.join(self.chunk))
+            self.chunk = []
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.handle.close()
+        self._check()
+
+
+class FastqWriter(object):
+    """
+    Writes pairs of validated reads.  Outputs are named:
+
+        interleaved: <prefix>[.<shard>].fq[.gz]
+        paired:      <prefix>[.<shard>]_1.fq[.gz] and _2
+
+    where shard is a zero padded count from 0 when shard_pairs is set.
+
+    Output is independent of the input layout, so paired input can be
+    written interleaved and vice versa.  Each output is written (and
+    compressed) on its own thread.
+
+    Args:
+        prefix - output path prefix
+        interleaved - both ends in one file, otherwise a file per end
+        shard_pairs - optional, pairs per output (set), 0 for a single set [0]
+        compress - optional, BGZF compress, otherwise plain fastq [True]
+        threads - optional, compression threads per output file [1]
+    """
+    def __init__(self, prefix, interleaved, shard_pairs=0, compress=True, threads=1):
+        self.prefix = prefix
+        self.interleaved = interleaved
+        self.shard_pairs = shard_pairs
+        self.compress = compress
+        self.threads = threads
+        self.outputs = []  # {'file', 'md5', 'pairs'} of completed outputs
+        self.files = []  # every file opened, for abort()
+        self.shard = -1
+        self.shard_count = 0
+        self.handles = None
+
+    def _path(self, end):
+        name = self.prefix
+        if self.shard_pairs:
+            name += '.%04d' % (self.shard)
+        if end is not None:
+            name += '_%d' % (end)
+        return name + ('.fq.gz' if self.compress else '.fq')
+
+    def _open(self, end):
+        path = self._path(end)
+        self.files.append(path)
+        if self.compress:
+            return ThreadedWriter(BgzfWriter(path, threads=self.threads))
+        return ThreadedWriter(PlainWriter(path))
+
+    def _next_shard(self):
+        self._close_shard()
+        self.shard += 1
+        self.shard_count = 0
+        if self.interleaved:
+            self.handles = (self._open(None),)
+        else:
+            self.handles = (self._open(1), self._open(2))
+
+    def _close_shard(self):
+        if self.handles is None:
+            return
+        (handles, self.handles) = (self.handles, None)
+        # every handle is closed (its thread stopped) even when one raises
+        with ExitStack() as stack:
+            for handle in reversed(handles):
+                stack.callback(self._close_output, handle)
+
+    def _close_output(self, handle):
+        handle.close()
+        self.outputs.append({'file': handle.filename,
+                             'md5': handle.hexdigest(),
+                             'pairs': self.shard_count})
+
+    @staticmethod
+    def format(read):
+        """
+        Returns a read (not streamed) as a fastq record in bytes
+        """
+        return ('%s\n%s\n+\n%s\n' % (read.header, read.seq, read.qual)).encode('ascii')
+
+    def write_pair(self, read_1, read_2):
+        """
+        Writes a pair of reads, they must not have been streamed
+        """
+        self.write_records(self.format(read_1), self.format(read_2))
+
+    def write_records(self, rec_1, rec_2):
+        """
+        Writes a pair of records formatted by format()
+        """
+        if self.handles is None or (self.shard_pairs and self.shard_count == self.shard_pairs):
+            self._next_shard()
+        if self.interleaved:
+            self.handles[0].write(rec_1 + rec_2)
+        else:
+            self.handles[0].write(rec_1)
+            self.handles[1].write(rec_2)
+        self.shard_count += 1
+
+    def close(self):
+        """
+        Completes all outputs, an input with no pairs still gets one (empty)
+        output set.
+        """
+        if self.handles is None and not self.outputs:
+            self._next_shard()
+        self._close_shard()
+
+    def abort(self):
+        """
+        Closes and removes all outputs, used when validation fails
+        """
+        if self.handles is not None:
+            for handle in self.handles:
+                try:
+                    handle.close()
+                except Exception:
+                    pass  # removing it anyway
+            self.handles = None
+        for path in self.files:
+            if os.path.exists(path):
+                os.unlink(path)
+        self.outputs = []
+
+
+def output_interleaved(layout, input_interleaved):
+    """
+    Resolves an output layout (one of LAYOUTS) to the interleaved argument of
+    FastqWriter.
+    """
+    if layout == 'same':
+        return input_interleaved
+    return layout == 'interleaved'
@@ -0,0 +1,267 @@
+"""
+Registry of the files of previously validated manifests, kept in a local
+SQLite database, so data submitted again under another name or in another
+manifest is found before it is processed twice.
+
+Files are matched on size plus a fingerprint of their first and last
+FINGERPRINT_BYTES.  Only files matching on both are read in full to compare
+checksums, which are stored so each registered file is hashed at most once.
+Duplicates are byte identical files, the same reads compressed differently
+are not found.
+
+A manifest's files are registered once it validates, registering the same
+manifest (by path) again replaces its entries.  Checksums are computed
+without holding the database lock, the matches are then checked again and
+the files registered in one short transaction so concurrent validations
+(e.g. man-valid-batch) can't miss each other.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+
+from cgp_seq_input_val.error_classes import ConfigError
+
+VERSION = 1
+# bytes from each end of a file in its fingerprint
+FINGERPRINT_BYTES = 65536
+# bytes read at a time for a full checksum
+CHECKSUM_BLOCK = 4 * 1024 * 1024
+# seconds to wait while another process is updating the registry
+LOCK_TIMEOUT = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    manifest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    checksum TEXT,
+    mtime REAL NOT NULL,
+    registered REAL NOT NULL,
+    PRIMARY KEY (manifest, path)
+);
+CREATE INDEX IF NOT EXISTS files_match ON files (size, fingerprint);
+CREATE TEMP TABLE IF NOT EXISTS candidates (
+    id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+"""
+
+
+def fingerprint(path, size):
+    """
+    md5 of the size, first and last FINGERPRINT_BYTES of a file
+    """
+    digest = hashlib.md5(b'%d\n' % (size))
+    with open(path, 'rb') as ifh:
+        digest.update(ifh.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            ifh.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(ifh.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def checksum(path):
+    """
+    md5 of the whole file
+    """
+    digest = hashlib.md5()
+    with open(path, 'rb') as ifh:
+        for block in iter(lambda: ifh.read(CHECKSUM_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _current_checksum(path, mtime):
+    """
+    Checksum of a registered file, None when it is gone or has changed since
+    it was registered
+    """
+    try:
+        if os.stat(path).st_mtime != mtime:
+            return None
+        return checksum(path)
+    except OSError:
+        return None
+
+
+class RegisteredFile(object):
+    """
+    A file offered to the registry.
+
+    Args:
+        label - identifies the file in messages, e.g. manifest line and column
+        path - the file, must exist
+    """
+    def __init__(self, label, path):
+        self.label = label
+        self.path = os.path.abspath(path)
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.fingerprint = fingerprint(self.path, self.size)
+        self.checksum = None  # only computed when another file matches
+
+    def get_checksum(self):
+        """Full checksum, computed on first use"""
+        if self.checksum is None:
+            self.checksum = checksum(self.path)
+        return self.checksum
+
+
+class FileRegistry(object):
+    """
+    Files of validated manifests, see module docs.
+
+    Args:
+        path - SQLite database, created when missing
+
+    Raises:
+        ConfigError - path is a registry of an unsupported version
+    """
+    def __init__(self, path):
+        self.path = path
+        # transactions are explicit, see submit()
+        self.db = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        self.db.executescript(SCHEMA)
+        (version,) = self.db.execute('PRAGMA user_version').fetchone()
+        if version == 0:
+            self.db.execute('PRAGMA user_version = %d' % (VERSION))
+        elif version != VERSION:
+            raise ConfigError("File registry %s is version %d, expected %d"
+                              % (path, version, VERSION))
+
+    def close(self):
+        """Closes the database"""
+        self.db.close()
+
+    def submit(self, manifest, files):
+        """
+        Finds files with the same content as a file of another manifest or
+        another file in the list, registering the files when none are found.
+
+        Args:
+            manifest - the manifest the files belong to
+            files - list of RegisteredFile
+
+        Returns:
+            tuple of lists (duplicates, unconfirmed), each of
+            (RegisteredFile, manifest, path) of the earlier copy, manifest is
+            None for a copy in the same list.  unconfirmed are matches on
+            size and fingerprint with a copy that is gone or has changed since
+            it was registered, so checksums can't be compared, they don't
+            prevent registering.
+        """
+        manifest = os.path.abspath(manifest)
+        duplicates = self._within_list(files)
+        # (path, mtime) of registered files to their checksum, None when unreadable
+        checked = {}
+        matches = self._matches(manifest, files)
+        while True:
+            # reading files in full is done without holding the lock
+            self._checksums(files, matches, checked)
+            self.db.execute('BEGIN IMMEDIATE')  # held until registered
+            try:
+                matches = self._matches(manifest, files)
+                if not self._pending(files, matches, checked):
+                    (found, unconfirmed) = self._compare(files, matches, checked)
+                    duplicates.extend(found)
+                    self._store_checksums(checked)
+                    if not duplicates:
+                        self._register(manifest, files)
+                    self.db.execute('COMMIT')
+                    return (duplicates, unconfirmed)
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+            # files registered meanwhile need checksums, release the lock for them
+            self.db.execute('ROLLBACK')
+
+    @staticmethod
+    def _within_list(files):
+        """Duplicates within the list, by size and fingerprint then checksum"""
+        duplicates = []
+        seen = {}
+        for reg_file in files:
+            for other in seen.setdefault((reg_file.size, reg_file.fingerprint), []):
+                if (other.path == reg_file.path or
+                        other.get_checksum() == reg_file.get_checksum()):
+                    duplicates.append((reg_file, None, other.path))
+                    break
+            else:
+                seen[(reg_file.size, reg_file.fingerprint)].append(reg_file)
+        return duplicates
+
+    def _matches(self, manifest, files):
+        """
+        Registered files of other manifests matching on size and fingerprint,
+        one query for all files.  Rows of (index in files, manifest, path,
+        checksum, mtime) in order of registration.
+        """
+        self.db.execute('DELETE FROM candidates')
+        self.db.executemany('INSERT INTO candidates (id, size, fingerprint) VALUES (?, ?, ?)',
+                            [(idx, reg_file.size, reg_file.fingerprint)
+                             for (idx, reg_file) in enumerate(files)])
+        return self.db.execute('SELECT c.id, f.manifest, f.path, f.checksum, f.mtime '
+                               'FROM candidates c JOIN files f '
+                               'ON f.size = c.size AND f.fingerprint = c.fingerprint '
+                               'WHERE f.manifest != ? ORDER BY c.id, f.registered',
+                               (manifest,)).fetchall()
+
+    @staticmethod
+    def _pending(files, matches, checked):
+        """True when a match still needs a checksum of the registered file"""
+        for (idx, _, path, other_checksum, mtime) in matches:
+            if (path != files[idx].path and other_checksum is None and
+                    (path, mtime) not in checked):
+                return True
+        return False
+
+    @staticmethod
+    def _checksums(files, matches, checked):
+        """Computes the checksums needed to compare matches"""
+        for (idx, _, path, other_checksum, mtime) in matches:
+            if path == files[idx].path:
+                continue
+            files[idx].get_checksum()
+            if other_checksum is None and (path, mtime) not in checked:
+                checked[(path, mtime)] = _current_checksum(path, mtime)
+
+    @staticmethod
+    def _compare(files, matches, checked):
+        """Splits matches into (duplicates, unconfirmed), the first of each per file"""
+        found = {}
+        unconfirmed = {}
+        for (idx, other_manifest, path, other_checksum, mtime) in matches:
+            reg_file = files[idx]
+            if idx in found:
+                continue
+            if path != reg_file.path:
+                if other_checksum is None:
+                    other_checksum = checked[(path, mtime)]
+                if other_checksum is None:
+                    unconfirmed.setdefault(idx, (reg_file, other_manifest, path))
+                    continue
+                if other_checksum != reg_file.get_checksum():
+                    continue
+            found[idx] = (reg_file, other_manifest, path)
+        return ([found[idx] for idx in sorted(found)],
+                [unconfirmed[idx] for idx in sorted(unconfirmed) if idx not in found])
+
+    def _store_checksums(self, checked):
+        """Keeps checksums of registered files for next time"""
+        self.db.executemany('UPDATE files SET checksum = ? '
+                            'WHERE path = ? AND mtime = ? AND checksum IS NULL',
+                            [(value, path, mtime)
+                             for ((path, mtime), value) in checked.items() if value is not None])
+
+    def _register(self, manifest, files):
+        self.db.execute('DELETE FROM files WHERE manifest = ?', (manifest,))
+        now = time.time()
+        self.db.executemany('INSERT OR REPLACE INTO files (manifest, path, size, fingerprint, '
+                            'checksum, mtime, registered) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            [(manifest, reg_file.path, reg_file.size, reg_file.fingerprint,
+                              reg_file.checksum, reg_file.mtime, now) for reg_file in files])
@@ -0,0 +1,154 @@
+"""
+Breakdown of Illumina read names collected while validating, reads per
+flowcell/lane and tile plus the most frequent index (barcode) sequences,
+e.g. to look for index hopping without a second pass over the data.
+
+Two layouts of name are understood:
+
+    instrument:run:flowcell:lane:tile:x:y  (Casava 1.8+, index is the last
+                                            field of the header comment)
+    instrument:lane:tile:x:y#index         (earlier pipelines, no flowcell so
+                                            the instrument is reported)
+
+Counts are keyed by the name up to the tile, so a tile costs one string and
+one counter however many reads it holds.  Barcodes can have unbounded
+cardinality (sequencing errors) so only the top K are tracked, with the
+Space-Saving algorithm.
+"""
+
+# barcodes tracked by default
+default_top_k = 50
+
+
+class SpaceSaving(object):
+    """
+    Approximate top-K counts of a stream in fixed memory (Metwally et al.,
+    "Efficient Computation of Frequent and Top-k Elements in Data Streams").
+    Any item occurring more than total/k times is tracked, a count can be
+    over-estimated by at most its error.
+
+    Counters are bucketed by count so both incrementing and replacing the
+    least frequent item are constant time.
+
+    Args:
+        k - items tracked, at least 1
+
+    Raises:
+        ValueError - k is less than 1
+    """
+    def __init__(self, k=default_top_k):
+        if k < 1:
+            raise ValueError("Top K must track at least 1 item, got %d" % (k))
+        self.k = k
+        self.total = 0
+        self.min_count = 0
+        self.counts = {}  # item -> count
+        self.errors = {}  # item -> over-estimate
+        self.buckets = {}  # count -> set of items
+
+    def add(self, item, weight=1):
+        """Counts weight occurrences of item"""
+        self.total += weight
+        count = self.counts.get(item)
+        if count is None:
+            if len(self.counts) < self.k:
+                count = 0
+                self.errors[item] = 0
+            else:
+                # replace an item with the lowest count, its count becomes the error
+                count = self.min_count
+                evicted = self.buckets[count].pop()
+                del self.counts[evicted]
+                del self.errors[evicted]
+                self.errors[item] = count
+        else:
+            self.buckets[count].remove(item)
+        if count and not self.buckets[count]:
+            del self.buckets[count]
+        self.counts[item] = count + weight
+        self.buckets.setdefault(count + weight, set()).add(item)
+        if count == 0:
+            self.min_count = weight if len(self.counts) == 1 else min(self.min_count, weight)
+        elif count == self.min_count and count not in self.buckets:
+            self.min_count = min(self.buckets)  # rare, a bucket per distinct count
+
+    def top(self):
+        """
+        Returns:
+            list of (item, count, error), most frequent first
+        """
+        return sorted(((item, count, self.errors[item]) for (item, count) in self.counts.items()),
+                      key=lambda entry: (-entry[1], entry[0]))
+
+
+class HeaderStats(object):
+    """
+    Counts reads by flowcell/lane/tile and index from read names.
+
+    Args:
+        top_k - barcodes tracked, see SpaceSaving
+    """
+    def __init__(self, top_k=default_top_k):
+        self.tiles = {}  # name up to the tile -> reads
+        self.unparsed = 0
+        self.barcodes = SpaceSaving(top_k)
+        # current run of reads from the same tile with the same barcode
+        self.tile = None
+        self.barcode = None
+        self.run = 0
+
+    def add(self, read):
+        """
+        Counts a validated FastqRead (read 1 of each pair)
+        """
+        name = read.name
+        colons = name.count(':')
+        barcode = None
+        if colons == 6:
+            (_, _, comment) = read.header.partition(' ')
+            if comment:
+                barcode = comment.rpartition(':')[2]
+        elif colons == 4:
+            (name, _, barcode) = name.partition('#')
+        else:
+            self.unparsed += 1
+            return
+        tile = name[:name.rfind(':', 0, name.rfind(':'))]
+        # reads come in runs of the same tile and barcode, counted when a run ends
+        if tile != self.tile or barcode != self.barcode:
+            self.flush()
+            self.tile = tile
+            self.barcode = barcode
+        self.run += 1
+
+    def flush(self):
+        """Counts the current run of reads"""
+        if self.run:
+            self.tiles[self.tile] = self.tiles.get(self.tile, 0) + self.run
+            if self.barcode:
+                self.barcodes.add(self.barcode, self.run)
+        self.run = 0
+
+    def summary(self):
+        """
+        Returns:
+            dict of 'lanes' and 'tiles' (reads keyed by 'flowcell:lane' and
+            'flowcell:lane:tile'), 'unparsed' reads and 'barcodes' with the
+            'top' tracked [barcode, reads, error] and 'reads' with a barcode
+        """
+        self.flush()
+        lanes = {}
+        tiles = {}
+        for (key, reads) in self.tiles.items():
+            fields = key.split(':')
+            # the instrument stands in for the flowcell of older names
+            lane = '%s:%s' % (fields[2], fields[3]) if len(fields) == 5 else ':'.join(fields[:2])
+            tile_key = '%s:%s' % (lane, fields[-1])
+            lanes[lane] = lanes.get(lane, 0) + reads
+            tiles[tile_key] = tiles.get(tile_key, 0) + reads
+        return {'lanes': lanes,
+                'tiles': tiles,
+                'unparsed': self.unparsed,
+                'barcodes': {'reads': self.barcodes.total,
+                             'tracked': self.barcodes.k,
+                             'top': [list(entry) for entry in self.barcodes.top()]}}
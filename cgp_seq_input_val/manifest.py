@@ -3,40 +3,79 @@ Functions and classes to support normalisation, reading and validation of
 manifests.
 """
 import os
+import copy
 import json
 import re
 import sys
 import shutil
 import uuid
 from importlib import import_module
-from pkg_resources import resource_string, resource_filename
 
-from cgp_seq_input_val import constants
+from cgp_seq_input_val import constants, resources
 from cgp_seq_input_val.error_classes import (ConfigError,
                                              ParsingError,
                                              ValidationError)
 from cgp_seq_input_val.file_meta import FileMeta
+from cgp_seq_input_val.manifest_writer import JsonWriter, NdjsonWriter, WRITE_BUFFER
+from cgp_seq_input_val.row_store import RowStore, config_hash, store_path
 
 VAL_LIM_ERROR = "Only %d sample(s) with a value of '%s' is allowed in column \
                 '%s' when rows grouped by '%s'"
 VAL_LIM_CONFIG_ERROR = "'limit' and 'limit_by' must both be defined when either \
                        is present, check body.validate."
 
+# parsed bundled configs keyed by (type, version), long running processes
+# (see service.py) only load each once
+_CONFIG_CACHE = {}
+
 
 def wrapped_validate(args):
     """
     Top level entry point for validating a manifest
     """
+    # batch drives Manifest so can't be imported at module level
+    from cgp_seq_input_val import batch
     try:
         manifest = Manifest(args.input)
-        manifest.validate()
+        store = None
+        if args.row_store:
+            store = store_path(args.output, args.input)
+        manifest.validate(args.checkfiles, args.pair_check, args.workers, store, args.registry)
         # output new manifest in tsv and json.
-        (tsv_file, json_file) = manifest.write(args.output)
+        (tsv_file, json_file) = manifest.write(args.output, args.ndjson)
         print("Created files:\n\t%s\n\t%s" % (tsv_file, json_file))
-    except ValidationError as ve:
+    except batch.RESULT_ERRORS as ve:
         sys.exit("ERROR: " + str(ve))
 
 
+def wrapped_batch_validate(args):
+    """
+    Top level entry point for validating many manifests, every manifest is
+    validated before exiting (non-zero if any failed).
+    """
+    # batch drives Manifest so can't be imported at module level
+    from cgp_seq_input_val import batch
+    try:
+        manifests = batch.find_manifests(args.input)
+    except (OSError, IOError) as err:
+        sys.exit("ERROR (%d): %s - %s" % (err.errno, err.strerror, err.filename))
+    if not manifests:
+        sys.exit("ERROR: No manifests (*.tsv) found")
+    os.makedirs(args.output, exist_ok=True)
+    results = []
+    for res in batch.iter_validate(manifests=manifests, outdir=args.output,
+                                   checkfiles=args.checkfiles, workers=args.jobs,
+                                   check_pairs=args.pair_check, registry=args.registry):
+        print(res, file=sys.stderr)
+        results.append(res)
+    report = batch.summarise(results, manifests)
+    json.dump(report, args.report, sort_keys=True, indent=4)
+    print(file=args.report)
+    if report['failed']:
+        sys.exit("ERROR: %d of %d manifests failed validation, see report"
+                 % (report['failed'], report['manifests']))
+
+
 def uuid4_chk(uuid_str):
     """Tests validity of uuid"""
     try:
@@ -77,6 +116,20 @@ def normalise(args):
     manifest.convert_by_extn(args.output)
 
 
+def load_config(form_type, version):
+    """
+    Returns a copy of the bundled config for a manifest type+version along
+    with the location of the resource (for error messages).
+    """
+    key = (form_type, version)
+    if key not in _CONFIG_CACHE:
+        resource = 'config/%s-%s.json' % key
+        resource_as_string = resources.read(resource).decode("utf-8", "strict")
+        _CONFIG_CACHE[key] = (json.loads(resource_as_string), resources.path(resource))
+    (config, cfg_file) = _CONFIG_CACHE[key]
+    return copy.deepcopy(config), cfg_file
+
+
 def evaulate_value_limits(field, chk, limit_chks):
     """
     Handles validation of fields where presence of partiular value has a max
@@ -155,7 +208,8 @@ class Manifest(object):
             convertor = getattr(self, '_' + self.informat + '_to_tsv')
             convertor(ofh)
 
-    def validate(self, checkFiles=False):
+    def validate(self, checkFiles=False, pairCheck=0,
+                 workers=constants.PAIR_CHECK_WORKERS, store=None, registry=None):
         """
         Runs the actual validation of a manifest:
          - Create header object
@@ -163,6 +217,20 @@ class Manifest(object):
          - Validate header
          - Create body object
          - Validate body
+         - Optionally check files exist and/or pre-check the fastq pairs
+         - Optionally check files against those of earlier manifests
+
+        Args:
+            checkFiles - check files exist and are not empty
+            pairCheck - validate this many pairs from the fastq of each row,
+                        0 to skip
+            workers - rows pre-checked at the same time
+            store - optional, RowStore file, rows unchanged since the run
+                    that wrote it are only re-checked by rules they failed
+                    or didn't reach.  Updated even when validation fails.
+            registry - optional, file_registry database, fails when a file
+                       has the same content as one of an earlier manifest,
+                       otherwise the files are registered
         """
         if self.informat != 'tsv':
             raise ValueError('Manifest.validate only accepts files of type \
@@ -173,9 +241,21 @@ class Manifest(object):
         self.header.validate(self.config['header'])
         # process body of document
         self.body = Body(self.infile, self.config['body'])
-        self.body.validate(self.config['body'])
-        if checkFiles:
-            self.body.file_tests()
+        rows = RowStore()
+        if store is not None:
+            rows = RowStore.load(store, config_hash(self.config))
+        try:
+            self.body.validate(self.config['body'], rows)
+            if checkFiles:
+                self.body.file_tests()
+            if pairCheck:
+                self.body.pair_tests(pairCheck, workers)
+            if registry is not None:
+                # last, files are only registered when everything else passed
+                self.body.registry_tests(registry)
+        finally:
+            if store is not None:
+                rows.write(store)
 
     def for_json(self):
         """
@@ -186,22 +266,26 @@ class Manifest(object):
                 'header': self.header.items,
                 'body': self.body.write(None, self.config['body'])}
 
-    def write(self, outdir):
+    def write(self, outdir, ndjson=False):
         """
         Generate the new tsv file with added UUID info and
-        the json representation for use later.
+        the json representation for use later.  Both are written in a single
+        pass over the rows.
+
+        Args:
+            outdir - output directory
+            ndjson - optional, write newline delimited json (*.ndjson) rather
+                     than a single json document [False]
         """
         tsv_file = os.path.join(outdir, self.header.items['Our Ref:'] + '.tsv')
-        for_json = {'type': self.header.type,
-                    'version': self.header.version,
-                    'header': None, 'body': None}
-        with open(tsv_file, 'w') as fp:
-            for_json['header'] = self.header.write(fp)
-            for_json['body'] = self.body.write(fp, self.config['body'])
-
-        js_file = re.sub(r'tsv$', 'json', tsv_file)
-        with open(js_file, 'w') as fp:
-            json.dump(for_json, fp, sort_keys=True, indent=4)
+        json_class = NdjsonWriter if ndjson else JsonWriter
+        js_file = re.sub(r'tsv$', json_class.ext, tsv_file)
+        with open(tsv_file, 'w', buffering=WRITE_BUFFER) as fp, \
+                open(js_file, 'w', buffering=WRITE_BUFFER) as js_fp:
+            header = self.header.write(fp)
+            json_out = json_class(js_fp, self.header.type, self.header.version, header)
+            self.body.write(fp, self.config['body'], json_out)
+            json_out.close()
         return tsv_file, js_file
 
     def get_uuid(self):
@@ -255,13 +339,8 @@ class Header(object):
         """
         config = None
         if cfg_file is None:
-            resource = 'config/%s-%s.json' % (self.type, self.version)
-            resource_as_string = resource_string(__name__,
-                                                 resource).decode("utf-8",
-                                                                  "strict")
-            config = json.loads(resource_as_string)
-            # for error messages
-            cfg_file = resource_filename(__name__, resource)
+            # cfg_file returned for error messages
+            (config, cfg_file) = load_config(self.type, self.version)
         else:
             print('direct from file', cfg_file, file=sys.stderr)
             with open(cfg_file, 'r') as j:
@@ -381,6 +460,8 @@ class Body(object):
         manifest_dir = os.path.dirname(manifest)
         csv = import_module('csv')
         self.file_detail = []
+        self.store = RowStore()  # empty, everything is checked
+        self.keys = None  # store keys of file_detail, see _rows()
         loadRows = False
         with open(self.manifest, 'r') as ifh:
             for row in csv.reader(ifh, delimiter='\t'):
@@ -396,52 +477,133 @@ class Body(object):
                                                  row,
                                                  manifest_dir))
 
-    def write(self, fp, config):
+    def write(self, fp, config, json_out=None):
         """
         Writes the body to a file-pointer in tsv and returns the values
         needed in the json object.
+
+        Args:
+            fp - file pointer for tsv, None to skip
+            config - body section of the config
+            json_out - optional, JsonWriter/NdjsonWriter given each row, the
+                       values are then not collected (None is returned)
         """
-        for_json = []
+        for_json = None if json_out else []
         ordered = config['ordered']
         if fp:
-            print("\t".join(ordered), file=fp)
+            fp.write("\t".join(ordered) + "\n")
         for fd in self.file_detail:
-            row = []
-            for_json.append(fd.attributes)
-            for col in ordered:
-                row.append(fd.attributes[col])
+            if json_out:
+                json_out.row(fd.attributes)
+            else:
+                for_json.append(fd.attributes)
             if fp:
-                print("\t".join(row), file=fp)
+                fp.write("\t".join([fd.attributes[col] for col in ordered]) + "\n")
         return for_json
 
-    def validate(self, rules):
+    def validate(self, rules, store=None):
         """
         Runs the different elements of body validation:
          - validate fields with restricted dict
          - validate file/file_2 do not overlap
-        """
-        self.fields_have_values(rules['required'])
-        self.field_values_valid(rules['validate'])
+
+        Args:
+            rules - body section of the config
+            store - optional RowStore, rows are not re-checked against rules
+                    they passed in a previous run
+        """
+        if store is not None:
+            self.store = store
+            self.keys = None
+        self._checked('required',
+                      lambda rows: self.fields_have_values(rules['required'], rows))
+        self._checked('values',
+                      lambda rows: self.field_values_valid(rules['validate'], rows))
+        self.value_limits_valid(rules['validate'], self.affected_groups(rules['validate']))
+        for (_, _, key) in self._rows():
+            self.store.mark(key, 'limits')
         self.uniq_files()
-        self.file_ext_check(rules['validate_ext'])
+        self._checked('extension',
+                      lambda rows: self.file_ext_check(rules['validate_ext'], rows))
 
-    def field_values_valid(self, validate):
+    def _rows(self):
+        """
+        Yields (line number, FileMeta, store key) of each row
+        """
+        if self.keys is None:
+            self.keys = [self.store.add(fd) for fd in self.file_detail]
+        cnt = self.offset
+        for (fd, key) in zip(self.file_detail, self.keys):
+            cnt += 1
+            yield (cnt, fd, key)
+
+    def _lines(self, rows=None):
+        """
+        (line number, FileMeta) of rows, defaults to all rows
+        """
+        if rows is not None:
+            return rows
+        return [(line, fd) for (line, fd, _) in self._rows()]
+
+    def _checked(self, check, test):
+        """
+        Runs test([(line number, FileMeta)]) on each row that hasn't passed
+        check before, recording passes in the store.
+        """
+        for (line, fd, key) in self._rows():
+            if self.store.passed(key, check):
+                continue
+            test([(line, fd)])
+            self.store.mark(key, check)
+
+    def field_values_valid(self, validate, rows=None):
         """
         Check fields with restriced dict are valid
         Must run after self.fields_have_values()
-        If 'limit' and 'limit_by' are defined will create a counter for each of
-        these entities and error if 'limit' exceeded
         """
         for field, chk in validate.items():
-            cnt = self.offset
-            limit_chks = {}
-            for fd in self.file_detail:
-                cnt += 1
+            allowed = [d['value'] for d in chk]
+            for (cnt, fd) in self._lines(rows):
                 # checks all values are valid
-                if fd.attributes[field] not in [d['value'] for d in chk]:
+                if fd.attributes[field] not in allowed:
                     raise ValidationError("Metadata item '%s' has an invalid \
                                           value of '%s' on line %d"
                                           % (field, fd.attributes[field], cnt))
+
+    def affected_groups(self, validate):
+        """
+        Groups that need value limits re-evaluating, those with rows that
+        haven't passed before or rows that have been removed.
+
+        Returns:
+            dict of limit_by heading to set of values
+        """
+        groups = {}
+        for chk in validate.values():
+            for val_limit in chk:
+                if 'limit_by' in val_limit:
+                    groups[val_limit['limit_by']] = set()
+        removed = self.store.removed()
+        for (limit_by, values) in groups.items():
+            for (_, fd, key) in self._rows():
+                if not self.store.passed(key, 'limits'):
+                    values.add(fd.attributes[limit_by])
+            values.update(row.get(limit_by) for row in removed)
+        return groups
+
+    def value_limits_valid(self, validate, groups=None):
+        """
+        If 'limit' and 'limit_by' are defined will create a counter for each of
+        these entities and error if 'limit' exceeded
+
+        Args:
+            validate - body.validate of the config
+            groups - optional, only count rows in these groups, see
+                     affected_groups()
+        """
+        for field, chk in validate.items():
+            limit_chks = {}
+            for fd in self.file_detail:
                 # Construct value occurence limiting counts
                 for val_limit in chk:
                     if 'limit' not in val_limit and 'limit_by' not in val_limit:
@@ -457,6 +619,8 @@ class Body(object):
 
                     lim_chk_lookup = field + '_' + val_limit['value']
                     limit_by_value = fd.attributes[val_limit['limit_by']]
+                    if groups is not None and limit_by_value not in groups[val_limit['limit_by']]:
+                        continue
 
                     # handled things we've not seen yet
                     if lim_chk_lookup not in limit_chks:
@@ -470,13 +634,11 @@ class Body(object):
 
             evaulate_value_limits(field, chk, limit_chks)
 
-    def fields_have_values(self, rules):
+    def fields_have_values(self, rules, rows=None):
         """
         Check the fields listed as required are populated
         """
-        cnt = self.offset
-        for fd in self.file_detail:
-            cnt += 1
+        for (cnt, fd) in self._lines(rows):
             for req in rules:
                 if (not fd.attributes[req]) or fd.attributes[req] == '.':
                     raise ValidationError("Required metadata value absent for \
@@ -488,7 +650,7 @@ class Body(object):
         Check all filenames are uniq within this manifest
         """
         cnt = self.offset
-        all_files = []
+        all_files = set()
         for fd in self.file_detail:
             cnt += 1
             for f_type in ('File', 'File_2'):
@@ -499,16 +661,14 @@ class Body(object):
                     raise ValidationError("Metadata item '%s' has a duplicate \
                                           value of '%s' on line %d"
                                           % (f_type, item, cnt))
-                all_files.append(item)
+                all_files.add(item)
 
-    def file_ext_check(self, rules):
+    def file_ext_check(self, rules, rows=None):
         """
         Check all files have valid extentions
         - see config/*.json
         """
-        cnt = self.offset
-        for fd in self.file_detail:
-            cnt += 1
+        for (cnt, fd) in self._lines(rows):
             last_ext = None
             for f_type in ('File', 'File_2'):
                 item = fd.attributes[f_type]
@@ -547,7 +707,69 @@ class Body(object):
         """
         Test for file existance and content
         """
-        cnt = self.offset
-        for fd in self.file_detail:
-            cnt += 1
-            fd.test_files(cnt)
+        def test_rows(rows):
+            for (cnt, fd) in rows:
+                fd.test_files(cnt)
+        self._checked('files', test_rows)
+
+    def pair_tests(self, pairs, workers=constants.PAIR_CHECK_WORKERS):
+        """
+        Validates the first pairs of the fastq referenced by each row, see
+        pair_check.  Rows of bam/cram are skipped.  All rows are checked
+        before failing so every bad row is reported.
+        """
+        rows = []
+        keys = {}
+        for (cnt, fd, key) in self._rows():
+            file_a = fd.get_path('File')
+            if file_a is None or file_a.endswith(('.bam', '.cram')):
+                continue
+            if self.store.pairs(key) >= pairs:
+                continue  # passed with at least this many pairs before
+            rows.append((cnt, file_a, fd.get_path('File_2')))
+            keys[cnt] = key
+        # pulls in the sequence validators, only imported when pair checks are run
+        pair_check = import_module('cgp_seq_input_val.pair_check')
+        failed = pair_check.check_rows(rows, pairs, workers)
+        failed_lines = set(cnt for (cnt, _) in failed)
+        for (cnt, key) in keys.items():
+            if cnt not in failed_lines:
+                self.store.mark_pairs(key, pairs)
+        if failed:
+            raise ValidationError("Pair check failed for %d row(s):\n\t" % (len(failed)) +
+                                  "\n\t".join("line %d: %s" % fail for fail in failed))
+
+    def registry_tests(self, registry):
+        """
+        Checks the files of every row against those of earlier manifests in a
+        file_registry.FileRegistry database, registering them when there are
+        no duplicates.  Missing files are skipped, see file_tests.  All
+        duplicates are reported.  Matches with a registered file that is gone
+        or has changed can't be confirmed, they are warnings.
+        """
+        file_registry = import_module('cgp_seq_input_val.file_registry')
+        files = []
+        for (cnt, fd, _) in self._rows():
+            for f_type in ('File', 'File_2'):
+                full_path = fd.get_path(f_type)
+                if full_path is None or not os.path.isfile(full_path):
+                    continue
+                files.append(file_registry.RegisteredFile("'%s' ('%s' - line %d)"
+                                                          % (fd.attributes[f_type], f_type, cnt),
+                                                          full_path))
+        db = file_registry.FileRegistry(registry)
+        try:
+            (duplicates, unconfirmed) = db.submit(self.manifest, files)
+        finally:
+            db.close()
+        for (reg_file, other, path) in unconfirmed:
+            print("WARNING: %s may be the same as %s of %s, which is gone or has changed since "
+                  "it was registered" % (reg_file.label, path, other), file=sys.stderr)
+        if duplicates:
+            found = []
+            for (reg_file, other, path) in duplicates:
+                if other is not None:
+                    path = "%s of %s" % (path, other)
+                found.append("%s is the same as %s" % (reg_file.label, path))
+            raise ValidationError("%d file(s) have already been submitted:\n\t" % (len(found)) +
+                                  "\n\t".join(found))
@@ -0,0 +1,96 @@
+"""
+Streaming writers for the json form of a manifest.  Body rows are written as
+they are produced instead of building the whole document in memory first.
+"""
+
+import json
+
+# buffer of manifest outputs
+WRITE_BUFFER = 1024 * 1024
+INDENT = 4
+
+
+# items are separated by a bare newline, which can't occur inside encoded strings
+_ROW_ENCODER = json.JSONEncoder(sort_keys=True, separators=('\n', ': '))
+
+
+def _nested(obj, depth):
+    """
+    obj as json.dump(..., sort_keys=True, indent=4) writes it at depth
+    within a document
+    """
+    text = json.dumps(obj, sort_keys=True, indent=INDENT)
+    return text.replace('\n', '\n' + ' ' * (INDENT * depth))
+
+
+def _nested_row(row, depth):
+    """
+    As _nested() for a dict of strings (a body row).  The indenting encoder
+    is pure python, this uses the C encoder and indents its output.
+    """
+    if not row:
+        return '{}'
+    pad = ' ' * (INDENT * (depth + 1))
+    text = _ROW_ENCODER.encode(row)
+    return '{\n%s%s\n%s}' % (pad, text[1:-1].replace('\n', ',\n' + pad),
+                              ' ' * (INDENT * depth))
+
+
+class JsonWriter(object):
+    """
+    Writes exactly what json.dump(doc, sort_keys=True, indent=4) gives for
+    {'type', 'version', 'header', 'body': [rows]}, one row at a time.  'body'
+    sorts first so the rest of the document is held until close().
+
+    Args:
+        fh - open text file
+        form_type - 'Form type:' of the manifest
+        version - 'Form version:' of the manifest
+        header - dict of header items
+    """
+    ext = 'json'
+
+    def __init__(self, fh, form_type, version, header):
+        self.fh = fh
+        self.form_type = form_type
+        self.version = version
+        self.header = header
+        self.rows = 0
+        fh.write('{\n%*s"body": [' % (INDENT, ''))
+
+    def row(self, attributes):
+        """Writes a body row, dict of heading to value"""
+        self.fh.write('%s\n%*s%s' % (',' if self.rows else '', INDENT * 2, '',
+                                     _nested_row(attributes, 2)))
+        self.rows += 1
+
+    def close(self):
+        """Completes the document, the file is left open"""
+        if self.rows:
+            self.fh.write('\n%*s' % (INDENT, ''))
+        pad = ' ' * INDENT
+        self.fh.write('],\n%s"header": %s,\n%s"type": %s,\n%s"version": %s\n}'
+                      % (pad, _nested(self.header, 1),
+                         pad, json.dumps(self.form_type),
+                         pad, json.dumps(self.version)))
+
+
+class NdjsonWriter(object):
+    """
+    Newline delimited json, the first line holds 'type', 'version' and
+    'header', followed by a line per body row.  Same arguments as JsonWriter.
+    """
+    ext = 'ndjson'
+
+    def __init__(self, fh, form_type, version, header):
+        self.fh = fh
+        fh.write(json.dumps({'type': form_type, 'version': version, 'header': header},
+                            sort_keys=True) + '\n')
+
+    def row(self, attributes):
+        """Writes a body row, dict of heading to value"""
+        self.fh.write(json.dumps(attributes, sort_keys=True) + '\n')
+
+    def close(self):
+        """Nothing to complete, the file is left open"""
+        pass
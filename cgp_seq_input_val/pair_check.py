@@ -0,0 +1,94 @@
+"""
+Quick pre-check of the fastq files referenced by a manifest.  Only the first
+few pairs of each row are validated (including the pairing rules of
+SeqValidator.check_pair) so swapped or mismatched File/File_2 are found in
+seconds rather than after a full seq-valid of every row.
+"""
+
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from cgp_seq_input_val import constants
+from cgp_seq_input_val.error_classes import SeqValidationError
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+# pairs read from each row by default
+default_pairs = constants.PAIR_CHECK_PAIRS
+# rows checked at the same time
+default_workers = constants.PAIR_CHECK_WORKERS
+GZIP_MAGIC = b'\x1f\x8b'
+# compressed bytes inflated by check_gzip_head, covers a BGZF block
+GZIP_HEAD_BYTES = 65536
+
+
+def check_gzip_head(filename):
+    """
+    Checks a file starts with gzip data that inflates, i.e. the first block
+    (or first 64KB of a plain gzip) is intact.
+
+    Raises:
+        SeqValidationError
+    """
+    with open(filename, 'rb') as fh:
+        head = fh.read(GZIP_HEAD_BYTES)
+    if not head.startswith(GZIP_MAGIC):
+        raise SeqValidationError("%s is not gzip compressed" % (filename), 'gzip')
+    try:
+        zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head)
+    except zlib.error as err:
+        raise SeqValidationError("First gzip block of %s is corrupt: %s"
+                                 % (filename, err), 'gzip')
+
+
+def check_files(file_a, file_b=None, pairs=default_pairs):
+    """
+    Validates the first pairs of an interleaved fastq or pair of fastq files.
+
+    Args:
+        file_a - fastq[.gz]
+        file_b - optional, second end of pair
+        pairs - pairs to validate
+
+    Raises:
+        SeqValidationError, OSError
+    """
+    validator = SeqValidator(file_a, file_b, progress_pairs=0, max_record_bytes=None,
+                             max_pairs=pairs)
+    for filename in set((file_a, validator.file_b)):
+        if filename.endswith('.gz'):
+            check_gzip_head(filename)
+    try:
+        validator.validate()
+    except (EOFError, zlib.error) as err:
+        raise SeqValidationError("%s: %s" % (', '.join(sorted(set((file_a, validator.file_b)))),
+                                             err), 'gzip')
+
+
+def _check_row(row, pairs):
+    (line, file_a, file_b) = row
+    try:
+        check_files(file_a, file_b, pairs)
+    except SeqValidationError as err:
+        return (line, ' '.join(str(err).split()))
+    # have to catch 2 classes works 3.0-3.3, above 3.3 all IO issues are captured under OSError
+    except (OSError, IOError) as err:
+        return (line, "%s - %s" % (err.strerror or err, err.filename or file_a))
+    return None
+
+
+def check_rows(rows, pairs=default_pairs, workers=default_workers):
+    """
+    Checks many rows concurrently.  Threads are used as the work for a few
+    pairs is mostly waiting on storage and inflating, neither holds the GIL.
+
+    Args:
+        rows - iterable of (line number, file_a, file_b or None)
+        pairs - pairs to validate per row
+        workers - rows checked at the same time
+
+    Returns:
+        list of (line number, error message) for the failed rows, in row order
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda row: _check_row(row, pairs), rows)
+        return [result for result in results if result is not None]
@@ -0,0 +1,100 @@
+"""
+Formats of fastq read headers, declared in config/read_headers.json and
+compiled once.  Each pattern is a regular expression matched at the start of
+the header with a 'name' group (the read name shared by both ends of a pair)
+and optionally an 'end' group ('1' or '2').  Formats without an end, or
+headers where it is absent, take the end from the position of the record.
+
+By default the format is detected from the first record, the first format
+in the config that matches is used for every record after it.
+"""
+
+import re
+import json
+
+from cgp_seq_input_val import resources
+from cgp_seq_input_val.error_classes import ConfigError, SeqValidationError
+
+CONFIG = 'config/read_headers.json'
+# value selecting detection from the first record
+AUTO = 'auto'
+# formats from CONFIG, loaded on first use
+_FORMATS = []
+
+
+class HeaderFormat(object):
+    """
+    A compiled header format.
+
+    Args:
+        name - name used to select the format
+        pattern - regular expression, see module docs
+        description - readable form for error messages
+    """
+    def __init__(self, name, pattern, description):
+        self.name = name
+        self.description = description
+        self.regex = re.compile(pattern)
+        groups = self.regex.groupindex
+        # group numbers, cheaper than names on the hot path, 0 for no end group
+        self.name_group = groups['name']
+        self.end_group = groups.get('end', 0)
+
+    def __str__(self):
+        return self.name
+
+
+def formats():
+    """
+    Returns the HeaderFormat list in detection order
+
+    Raises:
+        ConfigError
+    """
+    if not _FORMATS:
+        config = json.loads(resources.read(CONFIG).decode('utf-8', 'strict'))
+        for entry in config['formats']:
+            try:
+                _FORMATS.append(HeaderFormat(entry['name'], entry['pattern'],
+                                             entry['description']))
+            except (KeyError, re.error) as err:
+                raise ConfigError("Read header format %s in %s is invalid: %s"
+                                  % (entry.get('name'), resources.path(CONFIG),
+                                     err))
+    return _FORMATS
+
+
+def names():
+    """Names of the formats, for option choices"""
+    return [fmt.name for fmt in formats()]
+
+
+def default():
+    """The first format, used for records when none is selected"""
+    return formats()[0]
+
+
+def get_format(name):
+    """
+    Returns the HeaderFormat called name, None for AUTO
+
+    Raises:
+        SeqValidationError - unknown name
+    """
+    if name is None or name == AUTO:
+        return None
+    for fmt in formats():
+        if fmt.name == name:
+            return fmt
+    raise SeqValidationError("Unknown read header format '%s', expected one of: %s"
+                             % (name, ', '.join([AUTO] + names())))
+
+
+def detect(header):
+    """
+    Returns the first HeaderFormat matching header, None when none do
+    """
+    for fmt in formats():
+        if fmt.regex.match(header):
+            return fmt
+    return None
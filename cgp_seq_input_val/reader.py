@@ -0,0 +1,284 @@
+"""
+Reading of input files tuned for shared network filesystems (Lustre, NFS).
+Files are read in large requests, the kernel is told the access is
+sequential and asked to read ahead of the cursor, and optionally to drop
+pages behind it so a large input doesn't evict the page cache of other jobs.
+Chunks can also be read ahead on a thread while the previous one is
+validated.
+
+FollowReader reads files that are still being written (e.g. mid-transfer),
+waiting at the end of the data until the file grows or is complete.
+
+posix_fadvise is only a hint and is skipped where the platform lacks it,
+likewise reads fall back from os.preadv (Linux/BSD, python 3.7+) to
+os.pread and then seek and read.
+"""
+
+import io
+import os
+import time
+import queue
+import threading
+
+# bytes per read request
+DEFAULT_READ_SIZE = 4 * 1024 * 1024
+# seconds between checks for close() while a prefetch thread waits
+PREFETCH_POLL = 0.1
+# seconds between checks for growth of a followed file
+FOLLOW_POLL = 1.0
+# seconds a followed file must be unchanged to be complete
+default_stable = 60
+
+
+def _advise(fd, offset, length, advice):
+    """posix_fadvise(), ignored when unsupported"""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, offset, length, getattr(os, advice))
+        except OSError:
+            pass  # e.g. a filesystem without support, the hint is optional
+
+
+def _pread_into(fd, buf, offset):
+    """Fills buf from offset of fd, returns the bytes read"""
+    if hasattr(os, 'preadv'):
+        return os.preadv(fd, [buf], offset)  # straight into buf, no copy
+    if hasattr(os, 'pread'):
+        data = os.pread(fd, len(buf), offset)
+    else:
+        # e.g. Windows, a descriptor is only read by one thread so seeking is safe
+        os.lseek(fd, offset, os.SEEK_SET)
+        data = os.read(fd, len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
+
+def input_reader(read_size=None, prefetch=0, drop_cache=False, follow=False, marker=None,
+                 stable=default_stable):
+    """
+    InputReader (FollowReader when follow is set) for command line style
+    options, None (default buffering) when nothing is requested.  read_size
+    None is DEFAULT_READ_SIZE.
+    """
+    if follow:
+        return FollowReader(marker, stable, read_size or DEFAULT_READ_SIZE, prefetch, drop_cache)
+    if read_size is None and not prefetch and not drop_cache:
+        return None
+    return InputReader(read_size or DEFAULT_READ_SIZE, prefetch, drop_cache)
+
+
+class InputReader(object):
+    """
+    Settings for reading input, open() gives a buffered binary file.
+
+    Args:
+        read_size - optional, bytes per read request [4MB]
+        prefetch - optional, chunks read ahead on a thread [0]
+                 - 0 reads when the data is needed
+        drop_cache - optional, ask the kernel to drop pages once read [False]
+    """
+    # True when files may still be growing
+    follow = False
+
+    def __init__(self, read_size=DEFAULT_READ_SIZE, prefetch=0, drop_cache=False):
+        self.read_size = read_size
+        self.prefetch = prefetch
+        self.drop_cache = drop_cache
+
+    def open(self, filename):
+        """
+        Opens filename for reading as binary
+        """
+        return io.BufferedReader(TunedRaw(filename, self.read_size, self.prefetch,
+                                          self.drop_cache))
+
+
+class TunedRaw(io.RawIOBase):
+    """
+    Unbuffered sequential reader, see InputReader for the arguments.
+    """
+    def __init__(self, filename, read_size=DEFAULT_READ_SIZE, prefetch=0, drop_cache=False):
+        super().__init__()
+        self.name = filename
+        self.read_size = read_size
+        self.drop_cache = drop_cache
+        self.fd = os.open(filename, os.O_RDONLY)
+        self.offset = 0  # bytes handed to the caller
+        self.dropped = 0  # start of pages not yet dropped from the cache
+        self.chunk = memoryview(b'')  # read but not yet returned
+        _advise(self.fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+        _advise(self.fd, 0, read_size, 'POSIX_FADV_WILLNEED')
+        self.chunks = None
+        self.stop = threading.Event()  # set by close()
+        self.buf = bytearray(read_size)  # holds self.chunk
+        if prefetch:
+            # buffers are recycled, allocating each one costs more than reading it
+            self.free = queue.Queue()
+            for _ in range(prefetch):
+                self.free.put(bytearray(read_size))
+            self.chunks = queue.Queue()
+            self.thread = threading.Thread(target=self._prefetch, daemon=True)
+            self.thread.start()
+
+    def readable(self):
+        return True
+
+    def _read(self, offset, buf):
+        """Fills buf from offset, returns the bytes read"""
+        size = _pread_into(self.fd, buf, offset)
+        # hint the following request while this one is being used
+        _advise(self.fd, offset + size, self.read_size, 'POSIX_FADV_WILLNEED')
+        return size
+
+    def _wait(self, action, *args):
+        """
+        Runs a blocking queue method, giving up when close() is called
+
+        Returns:
+            result of action, None when stopped
+        """
+        while not self.stop.is_set():
+            try:
+                return action(*args, timeout=PREFETCH_POLL)
+            except (queue.Full, queue.Empty):
+                pass
+        return None
+
+    def _prefetch(self):
+        offset = 0
+        while True:
+            buf = self._wait(self.free.get)
+            if buf is None:
+                return
+            try:
+                size = self._read(offset, buf)
+                data = (buf, size)
+            except OSError as err:
+                (data, size) = ((err, 0), 0)
+            self._wait(self.chunks.put, data)
+            if not size:
+                return
+            offset += size
+
+    def _next_chunk(self):
+        if self.chunks is None:
+            return memoryview(self.buf)[:self._read(self.offset, self.buf)]
+        if self.buf is not None:
+            self.free.put(self.buf)  # the previous chunk is finished with
+        (self.buf, size) = self.chunks.get()
+        if isinstance(self.buf, OSError):
+            raise self.buf
+        if not size:
+            self.chunks.put((self.buf, size))  # keep reporting the end
+            self.buf = None
+            return memoryview(b'')
+        return memoryview(self.buf)[:size]
+
+    def readinto(self, buf):
+        if not self.chunk:
+            self.chunk = self._next_chunk()
+        size = min(len(buf), len(self.chunk))
+        buf[:size] = self.chunk[:size]
+        self.chunk = self.chunk[size:]
+        self.offset += size
+        if self.drop_cache and self.offset - self.dropped >= self.read_size:
+            self._drop()
+        return size
+
+    def _drop(self):
+        """Drops the pages that have been read from the cache"""
+        _advise(self.fd, self.dropped, self.offset - self.dropped, 'POSIX_FADV_DONTNEED')
+        self.dropped = self.offset
+
+    def close(self):
+        if self.closed:
+            return
+        self.stop.set()
+        if self.chunks is not None:
+            self.thread.join()
+        if self.drop_cache:
+            self._drop()
+        os.close(self.fd)
+        super().close()
+
+
+class FollowReader(InputReader):
+    """
+    Reads files which are still being written.  At the end of the data a
+    read waits for more, a file is complete once the marker exists or it
+    hasn't been modified for stable seconds, judged by its mtime so a file
+    that finished before it was read is complete at once.  In case the file
+    server's clock runs ahead of ours the file is also complete once its
+    size hasn't changed for stable seconds while being waited on.  A file
+    that doesn't exist yet is waited for, for up to stable seconds.
+
+    Files must be written in place, a transfer writing to a temporary name
+    and renaming at the end can't be followed.
+
+    Args:
+        marker - optional, file created once all inputs are complete
+        stable - optional, seconds since last modified after which a file
+                 is complete [60]
+        poll - optional, seconds between checks for growth [1]
+        others as InputReader
+    """
+    follow = True
+
+    def __init__(self, marker=None, stable=default_stable, read_size=DEFAULT_READ_SIZE,
+                 prefetch=0, drop_cache=False, poll=FOLLOW_POLL):
+        super().__init__(read_size, prefetch, drop_cache)
+        self.marker = marker
+        self.stable = stable
+        self.poll = poll
+        self.finished = set()  # files found complete, not waited for when read again
+
+    def open(self, filename):
+        """
+        Opens filename for reading as binary, waiting for it to be created
+        """
+        started = time.monotonic()
+        while (not os.path.exists(filename) and not self.marked() and
+               time.monotonic() - started < self.stable):
+            time.sleep(self.poll)
+        return io.BufferedReader(FollowRaw(filename, self))
+
+    def marked(self):
+        """True when the completion marker exists"""
+        return self.marker is not None and os.path.exists(self.marker)
+
+
+class FollowRaw(TunedRaw):
+    """
+    TunedRaw waiting at the end of the data until the file grows or is
+    complete, see FollowReader.
+    """
+    def __init__(self, filename, follow):
+        self.follow = follow
+        self.size = None  # size when last checked
+        self.changed = None  # when the size was seen to change
+        super().__init__(filename, follow.read_size, follow.prefetch, follow.drop_cache)
+
+    def _read(self, offset, buf):
+        while True:
+            size = super()._read(offset, buf)
+            if size or self.stop.is_set():
+                return size
+            if self._complete():
+                # data may have been written between the read and the check
+                size = super()._read(offset, buf)
+                if not size:
+                    self.follow.finished.add(self.name)
+                return size
+            self.stop.wait(self.follow.poll)
+
+    def _complete(self):
+        if self.name in self.follow.finished or self.follow.marked():
+            return True
+        stat = os.fstat(self.fd)
+        if time.time() - stat.st_mtime >= self.follow.stable:
+            return True
+        now = time.monotonic()
+        if stat.st_size != self.size:
+            (self.size, self.changed) = (stat.st_size, now)
+            return False
+        return now - self.changed >= self.follow.stable
@@ -0,0 +1,201 @@
+"""
+Fast count of the pairs in fastq files, for when all that is needed is how
+many pairs there are and that both ends agree (e.g. billing or checking a
+transfer).  Records are not parsed, newlines are counted in large blocks of
+decompressed data (bytes.count) so throughput is close to that of
+decompression alone.  BGZF blocks can be inflated on threads.
+
+Counting lines only works for 4 line records, the first sample_records of
+each file (at most SAMPLE_BYTES, reached first by long reads) are parsed to
+confirm the layout.  Content past the sample is not validated.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cgp_seq_input_val import compression, constants
+from cgp_seq_input_val.bgzf import BgzfReader
+from cgp_seq_input_val.error_classes import SeqValidationError, JobCancelledError
+from cgp_seq_input_val.fastq_read import check_filenames
+
+# bytes of decompressed data counted at a time
+COUNT_BLOCK = 4 * 1024 * 1024
+# records at the start of each file checked to be 4 line records
+default_sample_records = constants.COUNT_SAMPLE_RECORDS
+# bytes of decompressed data held for that check, whichever limit is reached first
+SAMPLE_BYTES = 16 * 1024 * 1024
+
+
+class RecordCounter(object):
+    """
+    Counts the pairs of an interleaved fastq or pair of fastq files, same
+    interface as SeqValidator (validate, summary, report).
+
+    Args:
+        file_a - fastq[.gz|.bz2|.xz]
+        file_b - optional, second end of pair
+        threads - optional, threads inflating BGZF, a pair of files are also
+                  counted at the same time when >1 [1]
+        decompressor - optional, see SeqValidator [None]
+        reader - optional, see SeqValidator, files being written (follow)
+                 can't be counted [None]
+        cancel - optional, see SeqValidator [None]
+        sample_records - optional, records at the start of each file checked
+                         to be 4 line records [1000]
+
+    Raises:
+        SeqValidationError
+    """
+    def __init__(self, file_a, file_b=None, threads=1, decompressor=None, reader=None,
+                 cancel=None, sample_records=default_sample_records):
+        if reader is not None and reader.follow:
+            raise SeqValidationError("Files being written can't be counted")
+        check_filenames(file_a, file_b)
+        self.file_a = file_a
+        self.file_b = file_a if file_b is None else file_b  # equal when interleaved
+        self.threads = threads
+        self.decompressor = decompressor
+        self.reader = reader
+        self.cancel = cancel
+        self.sample_records = sample_records
+        self.files = [self.file_a] if self.file_a == self.file_b else [self.file_a, self.file_b]
+        self.codecs = dict((filename, compression.sniff(filename)) for filename in self.files)
+        self.records = {}  # file -> records
+        self.pairs = 0
+        self.seconds = None
+
+    def validate(self):
+        """
+        Counts the records of each file and checks the ends agree
+
+        Raises:
+            SeqValidationError
+        """
+        started = time.perf_counter()
+        for filename in self.files:
+            compression.check_complete(filename, self.codecs[filename])
+        try:
+            if self.threads > 1 and len(self.files) == 2:
+                # inflating mostly releases the GIL so the files overlap
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    counts = list(pool.map(self.count_file, self.files))
+            else:
+                counts = [self.count_file(filename) for filename in self.files]
+        except EOFError as err:
+            raise SeqValidationError("%s is truncated, compressed data ended early (%s)"
+                                     % (' or '.join(self.files), err), 'truncated')
+        self.records = dict(zip(self.files, counts))
+        if len(counts) == 1:
+            if counts[0] % 2:
+                raise SeqValidationError("Interleaved file %s has an odd number of records (%d)"
+                                         % (self.file_a, counts[0]), 'pair_count')
+            self.pairs = counts[0] // 2
+        else:
+            if counts[0] != counts[1]:
+                raise SeqValidationError("Read 1 file has %d records, read 2 file %d"
+                                         % (counts[0], counts[1]), 'pair_count')
+            self.pairs = counts[0]
+        self.seconds = time.perf_counter() - started
+
+    def count_file(self, filename):
+        """
+        Returns the records in filename
+
+        Raises:
+            SeqValidationError, JobCancelledError
+        """
+        lines = 0
+        last = b'\n'
+        head = []  # blocks until the sample is complete
+        head_lines = 0
+        head_bytes = 0
+        sample_lines = self.sample_records * 4
+        for block in self._blocks(filename):
+            if not block:
+                continue  # e.g. the BGZF EOF marker
+            block_lines = block.count(b'\n')
+            lines += block_lines
+            last = block[-1:]
+            if head is not None:
+                head.append(block)
+                head_lines += block_lines
+                head_bytes += len(block)
+                if head_lines >= sample_lines or head_bytes >= SAMPLE_BYTES:
+                    self._check_sample(filename, b''.join(head), False)
+                    head = None
+            if self.cancel is not None and self.cancel.is_set():
+                raise JobCancelledError("Count cancelled while reading %s" % (filename))
+        if head is not None:
+            self._check_sample(filename, b''.join(head), True)
+        if last != b'\n':
+            lines += 1  # no newline at the end
+        if lines % 4:
+            raise SeqValidationError("%s has %d lines, fastq records are 4 lines"
+                                     % (filename, lines), 'corrupt')
+        return lines // 4
+
+    def _blocks(self, filename):
+        """Yields blocks of the decompressed content of filename"""
+        codec = self.codecs[filename]
+        program = compression.find_decompressor(codec, self.decompressor)
+        if program is None and codec.name == 'bgzf' and self.threads > 1 and self.reader is None:
+            with BgzfReader(filename, threads=self.threads) as bgzf_reader:
+                for block in bgzf_reader:
+                    yield block
+            return
+        source = None
+        if program is not None:
+            handle = compression.PipeBinary(filename, program)
+        else:
+            source = open(filename, 'rb') if self.reader is None else self.reader.open(filename)
+            handle = source if codec.module is None else codec.module.open(source, 'rb')
+        try:
+            for block in iter(lambda: handle.read(COUNT_BLOCK), b''):
+                yield block
+        finally:
+            handle.close()
+            if source is not None:
+                source.close()
+
+    def _check_sample(self, filename, head, complete):
+        """
+        Checks the records at the start of a file are 4 lines
+
+        Args:
+            filename - for messages
+            head - data from the start of the file
+            complete - head is the whole file
+        """
+        sample_lines = self.sample_records * 4
+        lines = head.split(b'\n', sample_lines)
+        if len(lines) > sample_lines or not complete:
+            lines.pop()  # the rest of the data, or a partial line
+        for start in range(0, len(lines) - len(lines) % 4, 4):
+            (header, seq, plus, qual) = (line.rstrip(b'\r') for line in lines[start:start + 4])
+            if (not header.startswith(b'@') or not plus.startswith(b'+') or
+                    len(seq) != len(qual)):
+                raise SeqValidationError("Record at line %d of %s is not a 4 line fastq record, "
+                                         "counting needs 4 line records (validate without "
+                                         "counting)" % (start + 1, filename), 'corrupt',
+                                         {'file': filename, 'line': start + 1})
+
+    def summary(self):
+        """
+        Returns the content of the report as a dict
+        """
+        return {'pairs': self.pairs,
+                'interleaved': self.file_a == self.file_b,
+                'mode': 'count',
+                'records': self.records,
+                'compression': compression.summary(self.files, self.codecs, self.decompressor,
+                                                   self.seconds)}
+
+    def report(self, fp):
+        """
+        Prints json report to the provided file-pointer
+
+        Args:
+            fp - file pointer
+        """
+        json.dump(self.summary(), fp, sort_keys=True, indent=4)
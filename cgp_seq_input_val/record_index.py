@@ -0,0 +1,188 @@
+"""
+Random access index of fastq records, written as a sidecar during seq-valid
+so downstream tools can split or seek without re-scanning.
+
+An entry is recorded every N pairs giving the pair number (0 based) and the
+offset and line number of both records.  Offsets depend on the file type:
+
+    byte         - plain fastq, byte offset
+    bgzf         - bgzip'd fastq, BGZF virtual offset (coffset << 16 | uoffset)
+    uncompressed - gzip (not BGZF), bzip2 or xz, offset in the decompressed
+                   stream.  These have no restart points so opening here still
+                   decompresses from the start of the file, bgzip the input for
+                   true random access.
+"""
+
+import io
+import json
+import gzip
+
+from cgp_seq_input_val import bgzf, compression, constants
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+FORMAT = 'cgp_seq_input_val-record-index'
+VERSION = 1
+# pairs between index entries
+default_every = constants.INDEX_EVERY
+SIDECAR_EXT = constants.INDEX_EXT
+
+
+def sidecar_path(filename):
+    """
+    Default location of the index for a fastq file
+    """
+    return filename + SIDECAR_EXT
+
+
+def offset_type(filename):
+    """
+    Returns the type of offset used for filename, see module docs
+    """
+    codec = compression.sniff(filename)
+    if codec.name == 'bgzf':
+        return 'bgzf'
+    return 'uncompressed' if codec.compressed else 'byte'
+
+
+class RecordIndex(object):
+    """
+    Record index of an interleaved fastq or pair of fastq files.
+
+    Args:
+        files - list of 1 (interleaved) or 2 (paired) fastq files
+        every - pairs between entries
+    """
+    def __init__(self, files, every=default_every):
+        self.files = list(files)
+        self.every = every
+        self.pairs = 0
+        self.entries = []  # [pair, offset_a, line_a, offset_b, line_b]
+        self.offset_types = ['byte'] * len(self.files)
+
+    def add(self, pair, read_1, read_2):
+        """
+        Records an entry, reads must have byte_start set
+        """
+        self.entries.append([pair, read_1.byte_start, read_1.file_pos[0],
+                             read_2.byte_start, read_2.file_pos[0]])
+
+    def finalise(self, pairs):
+        """
+        Converts offsets to the form needed to seek each file, called once
+        validation is complete.
+
+        Args:
+            pairs - total pairs in the input
+        """
+        self.pairs = pairs
+        for (i, filename) in enumerate(self.files):
+            self.offset_types[i] = offset_type(filename)
+            if self.offset_types[i] != 'bgzf':
+                continue
+            (coffsets, uoffsets) = bgzf.block_offsets(filename)
+            # interleaved has both records in the one file
+            columns = (1, 3) if len(self.files) == 1 else (1 + i * 2,)
+            for entry in self.entries:
+                for col in columns:
+                    entry[col] = bgzf.virtual_offset(coffsets, uoffsets, entry[col])
+
+    def to_dict(self):
+        """
+        Content of the index file as a dict
+        """
+        return {'format': FORMAT,
+                'version': VERSION,
+                'files': self.files,
+                'offset_types': self.offset_types,
+                'every': self.every,
+                'pairs': self.pairs,
+                'entries': self.entries}
+
+    def write(self, path):
+        """
+        Writes the index as json
+        """
+        with open(path, 'w') as ofh:
+            json.dump(self.to_dict(), ofh, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index file
+
+        Raises:
+            SeqValidationError - not an index or unsupported version
+        """
+        with open(path, 'r') as ifh:
+            try:
+                data = json.load(ifh)
+            except ValueError:
+                data = {}
+        if data.get('format') != FORMAT or data.get('version') != VERSION:
+            raise SeqValidationError("%s is not a version %d record index" % (path, VERSION))
+        index = cls(data['files'], data['every'])
+        index.pairs = data['pairs']
+        index.entries = data['entries']
+        index.offset_types = data['offset_types']
+        return index
+
+    def seek(self, pair):
+        """
+        Finds the entry at or before a pair, constant time.
+
+        Args:
+            pair - 0 based pair number
+
+        Returns:
+            tuple of (entry pair, pairs to skip from there, entry as list)
+
+        Raises:
+            IndexError - pair out of range
+        """
+        if pair < 0 or pair >= self.pairs:
+            raise IndexError("Pair %d is outside the index (%d pairs)" % (pair, self.pairs))
+        entry = self.entries[pair // self.every]
+        return (entry[0], pair - entry[0], entry)
+
+    def open_at(self, entry, end=1):
+        """
+        Opens a file positioned at the start of a record of an entry.
+
+        Args:
+            entry - as returned by seek()
+            end - 1 or 2, which record of the pair (also selects the file when paired)
+
+        Returns:
+            text file handle, the caller closes it
+        """
+        file_i = 0 if len(self.files) == 1 else end - 1
+        filename = self.files[file_i]
+        offset = entry[1 + (end - 1) * 2]
+        kind = self.offset_types[file_i]
+        if kind == 'byte':
+            raw = open(filename, 'rb')
+            raw.seek(offset)
+        elif kind == 'bgzf':
+            raw = _MemberReader(filename, offset >> 16)
+            raw.read(offset & 0xffff)
+        else:
+            raw = compression.sniff(filename).open(filename, 'rb')
+            raw.seek(offset)
+        return io.TextIOWrapper(raw, encoding='ascii', newline='')
+
+
+class _MemberReader(gzip.GzipFile):
+    """
+    GzipFile reading from a member boundary part way through a file, each
+    BGZF block is a gzip member so this works from any block offset.
+    """
+    def __init__(self, filename, coffset):
+        self.raw = open(filename, 'rb')
+        self.raw.seek(coffset)
+        super().__init__(fileobj=self.raw, mode='rb')
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.raw.close()
@@ -0,0 +1,43 @@
+"""
+Access to files bundled with the package (config/*.json) and its version
+through the standard library.  pkg_resources scans every installed
+distribution when imported, costing more than most commands take to run.
+"""
+
+import os
+import pkgutil
+
+PACKAGE = 'cgp_seq_input_val'
+
+
+def read(resource):
+    """
+    Returns the content of resource (path relative to the package) as bytes
+    """
+    return pkgutil.get_data(PACKAGE, resource)
+
+
+def path(resource):
+    """
+    Returns the location of resource, for messages
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), resource)
+
+
+def listdir(directory):
+    """
+    Returns the names of the resources in directory
+    """
+    return os.listdir(path(directory))
+
+
+def version():
+    """
+    Returns the installed version of the package
+    """
+    try:
+        from importlib.metadata import version as dist_version
+    except ImportError:  # before 3.8
+        import pkg_resources
+        return pkg_resources.require(PACKAGE)[0].version
+    return dist_version(PACKAGE)
@@ -0,0 +1,131 @@
+"""
+Per-row results of manifest validation, kept between runs so an edited
+manifest only has its changed rows re-checked.
+
+Rows are keyed by a hash of their content (and the directory their file
+paths are relative to).  For each row the store records the checks it has
+passed, so an unchanged row is skipped by every check it passed before, even
+when validation failed elsewhere.  Group level rules (limit/limit_by) are
+re-evaluated for groups containing new rows or rows that were removed.
+
+Files changed on disk without a change to the manifest row are not noticed,
+remove the store to force a full validation.
+"""
+
+import os
+import json
+import hashlib
+
+FORMAT = 'cgp_seq_input_val-row-store'
+VERSION = 1
+STORE_EXT = '.rows.json'
+
+
+def store_path(outdir, manifest):
+    """
+    Default location of the store for a manifest, in the output area
+    """
+    return os.path.join(outdir, os.path.basename(manifest) + STORE_EXT)
+
+
+def config_hash(config):
+    """
+    Hash of a manifest config, a store is discarded when this changes
+    """
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def row_key(file_meta):
+    """
+    Content hash of a manifest row (FileMeta)
+    """
+    content = json.dumps([os.path.abspath(file_meta.rel_path), file_meta.attributes],
+                         sort_keys=True)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class RowStore(object):
+    """
+    Checks passed by each row of a manifest.  An empty store (the default)
+    passes nothing so everything is checked.
+
+    Args:
+        config - optional, hash of the config used, see config_hash()
+        rows - optional, dict of row key to {'values', 'passed', 'pairs'}
+    """
+    def __init__(self, config=None, rows=None):
+        self.config = config
+        self.previous = rows or {}
+        self.rows = {}
+
+    def add(self, file_meta):
+        """
+        Registers a row of the current manifest, carrying over what it passed
+        last time.
+
+        Returns:
+            the row key
+        """
+        key = row_key(file_meta)
+        if key not in self.rows:
+            old = self.previous.get(key, {})
+            self.rows[key] = {'values': file_meta.attributes,
+                              'passed': list(old.get('passed', [])),
+                              'pairs': old.get('pairs', 0)}
+        return key
+
+    def passed(self, key, check):
+        """True when the row has passed check"""
+        return check in self.rows[key]['passed']
+
+    def mark(self, key, check):
+        """Records the row as passing check"""
+        if check not in self.rows[key]['passed']:
+            self.rows[key]['passed'].append(check)
+
+    def pairs(self, key):
+        """Most pairs of the row which have passed the pair check"""
+        return self.rows[key]['pairs']
+
+    def mark_pairs(self, key, pairs):
+        """Records the row as passing the pair check of this many pairs"""
+        self.rows[key]['pairs'] = max(pairs, self.rows[key]['pairs'])
+
+    def removed(self):
+        """
+        Values (dict by heading) of rows in the previous run that are no longer
+        present
+        """
+        return [row['values'] for (key, row) in self.previous.items() if key not in self.rows]
+
+    def write(self, path):
+        """
+        Writes the rows of the current manifest as json
+        """
+        with open(path, 'w') as ofh:
+            json.dump({'format': FORMAT,
+                       'version': VERSION,
+                       'config': self.config,
+                       'rows': self.rows}, ofh, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path, config):
+        """
+        Reads a store, an empty store is returned when the file doesn't exist,
+        isn't a store or was made with a different config.
+
+        Args:
+            path - store file
+            config - hash of the config now in use
+        """
+        data = {}
+        if os.path.exists(path):
+            with open(path, 'r') as ifh:
+                try:
+                    data = json.load(ifh)
+                except ValueError:
+                    data = {}
+        if (data.get('format') != FORMAT or data.get('version') != VERSION or
+                data.get('config') != config):
+            return cls(config)
+        return cls(config, data['rows'])
@@ -0,0 +1,94 @@
+"""
+Uniform random sample of the valid pairs seen during validation, so a QC
+subset is drawn without a second read of the input.
+
+Reservoir sampling with Li's "Algorithm L" (ACM TOMS 20(4), 1994): after the
+reservoir fills, the index of the next pair to keep is drawn directly so the
+pairs in between cost a single comparison, no random number per pair.  Memory
+is bounded by the sample size, only kept pairs are formatted.  The same seed
+and input always give the same sample.
+"""
+
+import math
+import random
+
+from cgp_seq_input_val import constants
+
+# seed used unless one is given
+default_seed = constants.SAMPLE_SEED
+
+
+class ReservoirSampler(object):
+    """
+    Keeps a uniform sample of pairs, written by write() in input order.
+
+    Args:
+        pairs - sample size, at least 1
+        writer - FastqWriter for the sample
+        seed - optional, random seed [1]
+
+    Raises:
+        ValueError - pairs is less than 1
+    """
+    def __init__(self, pairs, writer, seed=default_seed):
+        if pairs < 1:
+            raise ValueError("A sample must be at least 1 pair, got %d" % (pairs))
+        self.size = pairs
+        self.writer = writer
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.sample = []  # (position, record 1, record 2)
+        self.seen = 0
+        self.weight = math.exp(math.log(self._uniform()) / pairs)
+        self.next = pairs + self._skip()  # position of the next pair kept
+
+    def _uniform(self):
+        """Random float in the open interval (0, 1)"""
+        value = self.rng.random()
+        while value == 0.0:
+            value = self.rng.random()
+        return value
+
+    def _skip(self):
+        """Pairs to pass over before the next one is kept"""
+        return int(math.log(self._uniform()) / math.log1p(-self.weight))
+
+    def add(self, read_1, read_2):
+        """
+        Offers a valid pair, they must not have been streamed
+        """
+        seen = self.seen
+        self.seen = seen + 1
+        if seen < self.size:
+            self.sample.append((seen, self.writer.format(read_1), self.writer.format(read_2)))
+        elif seen == self.next:
+            self.sample[self.rng.randrange(self.size)] = (seen, self.writer.format(read_1),
+                                                          self.writer.format(read_2))
+            self.weight *= math.exp(math.log(self._uniform()) / self.size)
+            self.next += self._skip() + 1
+
+    def write(self):
+        """
+        Writes the sample and closes the writer
+        """
+        for (_, rec_1, rec_2) in sorted(self.sample):
+            self.writer.write_records(rec_1, rec_2)
+        self.writer.close()
+
+    def abort(self):
+        """
+        Discards the sample, used when validation fails
+        """
+        self.sample = []
+        self.writer.abort()
+
+    def summary(self):
+        """
+        Returns:
+            dict of 'pairs' sampled, 'of' valid pairs seen, 'seed' and the
+            'outputs' of the writer
+        """
+        return {'pairs': len(self.sample),
+                'of': self.seen,
+                'seed': self.seed,
+                'outputs': self.writer.outputs}
@@ -2,19 +2,47 @@
 FileMeta object to handle file actions and conversion from tsv formats
 """
 
-import os
 import sys
-import gzip
 import json
-
-# progressbar2
-import progressbar
+import time
+from importlib import import_module
 
 # this package:
-from cgp_seq_input_val.error_classes import SeqValidationError
-from cgp_seq_input_val.fastq_read import FastqRead
+from cgp_seq_input_val import compression, constants, read_headers
+from cgp_seq_input_val.bam_validator import BamValidator
+from cgp_seq_input_val.dup_names import DuplicateNames
+from cgp_seq_input_val.error_classes import SeqValidationError, JobCancelledError
+from cgp_seq_input_val.fastq_read import FastqRead, check_filenames, resync
+from cgp_seq_input_val.fastq_writer import FastqWriter, output_interleaved
+from cgp_seq_input_val.header_stats import HeaderStats
+from cgp_seq_input_val.reader import input_reader
+from cgp_seq_input_val.record_count import RecordCounter
+from cgp_seq_input_val.record_index import RecordIndex, sidecar_path
+from cgp_seq_input_val.sampler import ReservoirSampler
 
 prog_records = 100000
+# records with longer sequence are validated without holding seq/qual in memory
+record_mem_cap = constants.RECORD_MEM_CAP
+# how often (pairs) to look for a cancellation request
+cancel_check_pairs = 10000
+# SeqValidator arguments requesting checks or outputs counting doesn't do,
+# with the command line option setting each
+COUNT_EXCLUDES = (('max_errors', '--max-errors'),
+                  ('dup_mem', '--check-duplicates'),
+                  ('index_every', '--index'),
+                  ('writer', '--output'),
+                  ('header_top_k', '--header-stats'),
+                  ('sampler', '--sample'))
+# SeqValidator arguments requesting checks, outputs or reading options BAM
+# validation doesn't have, with the command line option setting each
+BAM_EXCLUDES = (('max_errors', '--max-errors'),
+                ('dup_mem', '--check-duplicates'),
+                ('index_every', '--index'),
+                ('writer', '--output'),
+                ('header_top_k', '--header-stats'),
+                ('sampler', '--sample'),
+                ('decompressor', '--decompressor'),
+                ('reader', '--follow/--read-size/--prefetch/--drop-cache'))
 
 
 def validate_seq_files(args):
@@ -25,9 +53,42 @@ def validate_seq_files(args):
         file_2 = None
         if len(args.input) == 2:
             file_2 = args.input[1]
-        validator = SeqValidator(args.input[0], file_2)
+        interleaved = output_interleaved(args.output_layout, file_2 is None)
+        writer = None
+        if args.output is not None:
+            writer = FastqWriter(args.output, interleaved, shard_pairs=args.shard_pairs,
+                                 compress=not args.output_plain, threads=args.threads)
+        sampler = None
+        if args.sample:
+            if args.sample_output is None:
+                raise SeqValidationError("--sample requires --sample-output")
+            sampler = ReservoirSampler(args.sample,
+                                       FastqWriter(args.sample_output, interleaved,
+                                                   compress=not args.output_plain,
+                                                   threads=args.threads),
+                                       args.sample_seed)
+        validator = get_validator(args.input[0], file_2,
+                                  count=args.count,
+                                  max_record_bytes=args.max_record_mem,
+                                  threads=args.threads,
+                                  max_errors=args.max_errors,
+                                  dup_mem=args.dup_mem if args.check_duplicates else None,
+                                  index_every=args.index_every if args.index else None,
+                                  writer=writer,
+                                  decompressor=args.decompressor,
+                                  reader=input_reader(args.read_size, args.prefetch,
+                                                      args.drop_cache, args.follow,
+                                                      args.follow_marker, args.follow_stable),
+                                  header_top_k=args.top_barcodes if args.header_stats else None,
+                                  header_format=args.header_format,
+                                  sampler=sampler)
         validator.validate()
         validator.report(args.report)
+        if getattr(validator, 'errors', None):
+            sys.exit("ERROR: %d validation errors found, see report"
+                     % (sum(e['count'] for e in validator.errors.values())))
+        if getattr(validator, 'index', None) is not None:
+            validator.index.write(args.index_file or sidecar_path(args.input[0]))
     except SeqValidationError as ve:  # runtime so no functions for message and errno
         sys.exit("ERROR: " + str(ve))
     # have to catch 2 classes works 3.0-3.3, above 3.3 all IO issues are captured under OSError
@@ -35,23 +96,177 @@ def validate_seq_files(args):
         sys.exit("ERROR (%d): %s - %s" % (err.errno, err.strerror, err.filename))
 
 
+def get_validator(file_a, file_b=None, threads=1, count=False, **kwargs):
+    """
+    Returns the validator appropriate for the input file type, BamValidator
+    for bam otherwise SeqValidator.  Keyword arguments are passed to
+    SeqValidator, BamValidator only uses progress_pairs and cancel, the
+    others (BAM_EXCLUDES) can't be requested for bam.  When
+    count is set a RecordCounter is returned (fastq only), it uses
+    decompressor, reader and cancel, other checks and outputs can't be
+    requested.
+
+    Raises:
+        SeqValidationError
+    """
+    if file_a.endswith('.cram'):
+        raise SeqValidationError("CRAM files are not supported, convert to bam or fastq")
+    if count:
+        if file_a.endswith('.bam'):
+            raise SeqValidationError("Counting is only supported for fastq input")
+        requested = [option for (name, option) in COUNT_EXCLUDES if kwargs.get(name)]
+        if requested:
+            raise SeqValidationError("--count can't be combined with: %s"
+                                     % (', '.join(requested)))
+        return RecordCounter(file_a, file_b, threads=threads,
+                             decompressor=kwargs.get('decompressor'),
+                             reader=kwargs.get('reader'), cancel=kwargs.get('cancel'))
+    if file_a.endswith('.bam'):
+        if file_b is not None:
+            raise SeqValidationError("BAM input must be a single file")
+        requested = [option for (name, option) in BAM_EXCLUDES if kwargs.get(name)]
+        if requested:
+            raise SeqValidationError("BAM input can't be combined with: %s"
+                                     % (', '.join(requested)))
+        return BamValidator(file_a, progress_pairs=kwargs.get('progress_pairs', prog_records),
+                            threads=threads, cancel=kwargs.get('cancel'))
+    return SeqValidator(file_a, file_b, **kwargs)
+
+
+class ByteCounter(object):
+    """
+    Wraps an open text file counting the characters returned by readline()
+    so record offsets can be reported.  Offsets are bytes for ASCII data with
+    '\\n' line endings.  Lines read since keep() can be put back with
+    unread() to read them again.
+    """
+    def __init__(self, fh):
+        self.fh = fh
+        self.consumed = 0
+        self.last_len = 0  # length of the last line, i.e. the lookahead
+        self.pending = []  # lines put back by unread(), last is next
+        self.kept = None  # lines read since keep(), None when not keeping
+        self.keep_left = None
+
+    def readline(self):
+        """Read a line, counting its length"""
+        line = self.pending.pop() if self.pending else self.fh.readline()
+        self.last_len = len(line)
+        self.consumed += self.last_len
+        if self.kept is not None:
+            self.kept.append(line)
+            if self.keep_left is not None:
+                self.keep_left -= self.last_len
+                if self.keep_left < 0:
+                    self.kept = None  # too much to hold, see keep()
+        return line
+
+    def keep(self, limit=None):
+        """
+        Starts keeping the lines read, until more than limit characters have
+        been read (None for no limit)
+        """
+        self.kept = []
+        self.keep_left = limit
+
+    def unread(self, lines):
+        """Puts back lines (in the order read), they are returned by readline() next"""
+        self.pending.extend(reversed(lines))
+        self.consumed -= sum(len(line) for line in lines)
+
+    def record_start(self):
+        """Offset of the line most recently read"""
+        return self.consumed - self.last_len
+
+    def close(self):
+        """Close the underlying file"""
+        self.fh.close()
+
+    @property
+    def closed(self):
+        """State of the underlying file"""
+        return self.fh.closed
+
+
 class SeqValidator(object):
     """
     Validate sequence file, currently only does fastq (interleaved or paired)
 
     Args:
-        file_a - File to be validated (fastq[.gz])
-        file_b - optional, second end of pair if paired fastq[.gz]
+        file_a - File to be validated (fastq[.gz|.bz2|.xz], format detected
+                 from content)
+        file_b - optional, second end of pair if paired fastq
         progress_pairs - optional, how often to update progress bar [100,000]
                        - set to 0 to disable
+        max_record_bytes - optional, sequence length above which a record is
+                           streamed rather than held in memory [4MB]
+                         - set to None to always hold records
+        cancel - optional, object with is_set() (e.g. threading.Event), when
+                 set validation stops with JobCancelledError
+        max_errors - optional, 0 stops at the first error [0]
+                   - >0 keeps validating, recording up to this many examples
+                     of each category of error (all are counted)
+        dup_mem - optional, memory budget (bytes) for detecting duplicate read
+                  names, see DuplicateNames [None]
+                - None disables the check
+        index_every - optional, build a RecordIndex with an entry every N
+                      pairs, available as self.index after validate() [None]
+                    - None disables
+        writer - optional, FastqWriter given each valid pair, outputs are
+                 removed if validation fails.  Records are always held in
+                 memory (max_record_bytes is ignored).
+        max_pairs - optional, stop after this many pairs without checking
+                    the rest of the input (e.g. a quick pre-check) [None]
+                  - None validates everything
+        decompressor - optional, external program for compressed input, see
+                       compression.find_decompressor [None]
+                     - None decompresses in process
+        reader - optional, reader.InputReader for large reads and page cache
+                 hints when decompressing in process [None]
+               - reader.FollowReader validates files still being written
+               - None uses default buffering
+        header_top_k - optional, collect HeaderStats of read 1 names tracking
+                       this many barcodes, available as self.header_stats
+                       [None]
+                     - None disables
+        header_format - optional, name of the read header format (see
+                        read_headers) [auto]
+                      - read_headers.AUTO detects it from the first record
+        sampler - optional, sampler.ReservoirSampler given each valid pair,
+                  the sample is written once validation succeeds.  Records
+                  are always held in memory as for writer.
     """
-    def __init__(self, file_a, file_b=None, progress_pairs=prog_records):
+    def __init__(self, file_a, file_b=None, progress_pairs=prog_records,
+                 max_record_bytes=record_mem_cap, cancel=None, max_errors=0,
+                 dup_mem=None, index_every=None, writer=None, max_pairs=None,
+                 decompressor=None, reader=None, header_top_k=None,
+                 header_format=read_headers.AUTO, sampler=None):
         self.progress_pairs = progress_pairs
+        self.max_pairs = max_pairs
+        self.decompressor = decompressor
+        self.reader = reader
+        self.seconds = None  # duration of validate()
+        self.writer = writer
+        self.sampler = sampler
+        if writer is not None or sampler is not None:
+            max_record_bytes = None  # streamed records can't be written
+        self.max_record_bytes = max_record_bytes
+        self.cancel = cancel
+        self.max_errors = max_errors
+        self.errors = {}  # category -> {'count': int, 'examples': [...]}
+        self.dup_names = None if dup_mem is None else DuplicateNames(dup_mem)
+        self.header_stats = None if header_top_k is None else HeaderStats(header_top_k)
+        # None until detected from the first record
+        self.header_format = read_headers.get_format(header_format)
+        self.index_every = index_every
+        self.index = None
+        self.count_bytes = bool(max_errors or index_every)
         self.file_a = file_a
         self.file_b = file_b
         self.pairs = 0
-        # will use this to decide on path
-        self.is_gzip = False  # change open method for fastq
+        # format of each file, detected from content
+        self.codecs = {}
+        self.is_gzip = False
         # sam is not supported
 
         # only the min value is actually needed to determine if scaling
@@ -68,22 +283,20 @@ class SeqValidator(object):
         return '\n'.join(ret)
 
     def _prep(self):
-        full_ext = ''
-        (base, ext) = os.path.splitext(self.file_a)
-        if ext == '.gz':
-            self.is_gzip = True
-            full_ext = ext
-            (base, ext) = os.path.splitext(base)
-
-        if ext not in ('.fastq', '.fq'):
-            raise SeqValidationError("Input files must be fastq|fq[.gz]")
-
-        full_ext = ext + full_ext
-
+        check_filenames(self.file_a, self.file_b)
         if self.file_b is None:
             self.file_b = self.file_a  # use equality to indicate interleaved
-        elif not self.file_b.endswith(full_ext):
-            raise SeqValidationError("Input files be of same type")
+
+        following = self.reader is not None and self.reader.follow
+        if following and self.decompressor is not None:
+            raise SeqValidationError("Files being written can't be read by an external "
+                                     "decompressor")
+
+        # the extension doesn't decide how to read a file, its content does
+        for filename in (self.file_a, self.file_b):
+            self.codecs[filename] = compression.sniff(filename,
+                                                      self.reader if following else None)
+        self.is_gzip = self.codecs[self.file_a].name in ('gzip', 'bgzf')
 
     def validate(self):
         """
@@ -92,10 +305,107 @@ class SeqValidator(object):
         Raises:
             SeqValidationError
         """
-        if self.file_a == self.file_b:
-            self.validate_interleaved()
+        started = time.perf_counter()
+        files = [self.file_a] if self.file_a == self.file_b else [self.file_a, self.file_b]
+        if not self.check_complete(files):
+            self._abort_outputs()
+            return
+        if self.index_every:
+            self.index = RecordIndex(files, self.index_every)
+        try:
+            try:
+                if self.file_a == self.file_b:
+                    self.validate_interleaved()
+                else:
+                    self.validate_paired()
+            except EOFError as err:
+                # only reached when check_complete() can't see the damage
+                raise SeqValidationError("%s is truncated, compressed data ended early (%s)"
+                                         % (' or '.join(files), err), 'truncated')
+            self.check_duplicates()
+        except BaseException:
+            self._abort_outputs()
+            raise
+        if self.errors:
+            self._abort_outputs()
         else:
-            self.validate_paired()
+            try:
+                if self.writer is not None:
+                    self.writer.close()
+                if self.sampler is not None:
+                    self.sampler.write()
+            except BaseException:
+                self._abort_outputs()
+                raise
+        if self.index is not None:
+            self.index.finalise(self.pairs)
+        self.seconds = time.perf_counter() - started
+
+    def _abort_outputs(self):
+        """Removes any output, validation failed"""
+        try:
+            if self.writer is not None:
+                self.writer.abort()
+        finally:
+            if self.sampler is not None:
+                self.sampler.abort()
+
+    def check_complete(self, files):
+        """
+        Rejects truncated compressed input before reading it where its end
+        shows it (not large single member gzip), see
+        compression.check_complete()
+
+        Returns:
+            False when a file is truncated and errors are being collected
+
+        Raises:
+            SeqValidationError
+        """
+        if self.reader is not None and self.reader.follow:
+            return True  # still being written, a short file is found at its end
+        complete = True
+        for filename in files:
+            try:
+                compression.check_complete(filename, self.codecs[filename])
+            except SeqValidationError as err:
+                self.record_error(err)
+                complete = False
+        return complete
+
+    def summary(self):
+        """
+        Returns the content of the report as a dict, 'errors' and 'valid' are
+        only included when collecting errors
+        """
+        summary = {'pairs': self.pairs,
+                   'valid_q': self.q_min == 33,
+                   'interleaved': self.file_a == self.file_b,
+                   'header_format': self.header_format and self.header_format.name}
+        summary['compression'] = self.compression_summary()
+        if self.dup_names is not None:
+            summary['duplicate_check'] = self.dup_names.mode
+            if self.dup_names.possible:
+                # candidates filled --dup-mem, these hits weren't confirmed
+                summary['possible_duplicates'] = self.dup_names.possible
+        if self.header_stats is not None:
+            summary['header_stats'] = self.header_stats.summary()
+        if self.writer is not None:
+            summary['outputs'] = self.writer.outputs
+        if self.sampler is not None:
+            summary['sample'] = self.sampler.summary()
+        if self.max_errors:
+            summary['valid'] = not self.errors
+            summary['errors'] = self.errors
+        return summary
+
+    def compression_summary(self):
+        """
+        Returns the codec(s) of the input, how they were decompressed and the
+        rate input was read (compressed MB/s over the whole validation)
+        """
+        files = [self.file_a] if self.file_a == self.file_b else [self.file_a, self.file_b]
+        return compression.summary(files, self.codecs, self.decompressor, self.seconds)
 
     def report(self, fp):
         """
@@ -104,10 +414,104 @@ class SeqValidator(object):
         Args:
             fp - file pointer
         """
-        report = {'pairs': self.pairs,
-                  'valid_q': self.q_min == 33,
-                  'interleaved': self.file_a == self.file_b}
-        json.dump(report, fp, sort_keys=True, indent=4)
+        json.dump(self.summary(), fp, sort_keys=True, indent=4)
+
+    def record_error(self, error):
+        """
+        Records a validation error, when not collecting errors it is raised
+
+        Raises:
+            SeqValidationError
+        """
+        if not self.max_errors:
+            raise error
+        entry = self.errors.setdefault(error.category or 'format', {'count': 0, 'examples': []})
+        entry['count'] += 1
+        if len(entry['examples']) < self.max_errors:
+            example = {'message': ' '.join(str(error).split())}
+            if error.position:
+                example.update(error.position)
+            entry['examples'].append(example)
+
+    def _open(self, filename):
+        if not self.count_bytes:
+            return compression.open_text(filename, self.codecs[filename], self.decompressor,
+                                         reader=self.reader)
+        # newlines untranslated so offsets count '\r\n' as 2
+        return ByteCounter(compression.open_text(filename, self.codecs[filename],
+                                                 self.decompressor, newline='',
+                                                 reader=self.reader))
+
+    def _next_read(self, fq_fh, line_no, curr_line, filename, q_floor=None):
+        """
+        Reads and validates the next record.  When collecting errors a bad
+        record is returned with valid=False after resyncing the file to the
+        next plausible header, searching from the line after the bad record's
+        header so a header the bad record swallowed is found.  Lines before
+        it which don't start '@' aren't a record, they are reported and the
+        record found is read instead.  q_floor is passed to
+        FastqRead.validate, read 1 of each pair gets the current q_min for
+        check_pair.
+
+        Raises:
+            SeqValidationError - when not collecting errors
+        """
+        byte_start = fq_fh.record_start() if self.count_bytes else None
+        if self.max_errors:
+            # a held record's sequence and quality, and room for its other lines
+            fq_fh.keep(None if self.max_record_bytes is None else 4 * self.max_record_bytes)
+        read = FastqRead(fq_fh, line_no, curr_line, self.max_record_bytes)
+        read.byte_start = byte_start
+        header_format = self.header_format or self.detect_format(read.header)
+        if not self.max_errors:
+            read.validate(filename, header_format, q_floor)
+            return read
+
+        try:
+            read.validate(filename, header_format, q_floor)
+        except SeqValidationError as err:
+            read.valid = False
+            self.record_error(err)
+            lines = fq_fh.kept
+            if lines is None:
+                # a streamed record, too long to search again
+                if read.last_line != '' and not read.last_line.startswith('@'):
+                    (read.last_line, last_line_no) = resync(fq_fh, read.last_line,
+                                                            read.file_pos[1])
+                    read.file_pos = (read.file_pos[0], last_line_no)
+                return read
+            fq_fh.unread(lines[1:] if curr_line is None else lines)
+            (read.last_line, last_line_no) = resync(fq_fh, fq_fh.readline().rstrip(),
+                                                    read.file_pos[0])
+            read.file_pos = (read.file_pos[0], last_line_no)
+            if read.last_line != '' and not read.header.startswith('@'):
+                return self._next_read(fq_fh, last_line_no, read.last_line, filename, q_floor)
+        return read
+
+    def detect_format(self, header):
+        """
+        Selects the header format for all records from the first, when no
+        format matches the default is used for this record only (it fails)
+        and detection is tried again on the next.
+
+        Returns:
+            read_headers.HeaderFormat
+        """
+        detected = read_headers.detect(header)
+        if detected is None:
+            return read_headers.default()
+        self.header_format = detected
+        return detected
+
+    def check_cancel(self, pairs):
+        """
+        Periodically checks for a cancellation request
+
+        Raises:
+            JobCancelledError
+        """
+        if self.cancel is not None and pairs % cancel_check_pairs == 0 and self.cancel.is_set():
+            raise JobCancelledError("Validation cancelled after %d pairs" % (pairs))
 
     def validate_paired(self):
         """
@@ -123,12 +527,8 @@ class SeqValidator(object):
         prog_indic = self.progress_pairs
         pairs = 0
         try:
-            if self.is_gzip:
-                fq_fh_a = gzip.open(self.file_a, 'rt')
-                fq_fh_b = gzip.open(self.file_b, 'rt')
-            else:
-                fq_fh_a = open(self.file_a, 'r')
-                fq_fh_b = open(self.file_b, 'r')
+            fq_fh_a = self._open(self.file_a)
+            fq_fh_b = self._open(self.file_b)
 
             curr_line_a = None
             curr_line_b = None
@@ -136,35 +536,56 @@ class SeqValidator(object):
             fqh_line_b = 0
             bar = self.setup_progress()
             while True:
-                read_1 = FastqRead(fq_fh_a, fqh_line_a, curr_line_a)
-                read_1.validate(file_a)
+                read_1 = self._next_read(fq_fh_a, fqh_line_a, curr_line_a, file_a, self.q_min)
                 curr_line_a = read_1.last_line
                 fqh_line_a = read_1.file_pos[1]
 
-                read_2 = FastqRead(fq_fh_b, fqh_line_b, curr_line_b)
-                read_2.validate(file_b)
+                read_2 = self._next_read(fq_fh_b, fqh_line_b, curr_line_b, file_b)
                 curr_line_b = read_2.last_line
                 fqh_line_b = read_2.file_pos[1]
 
-                self.check_pair(read_1, read_2)
+                if read_1.valid and read_2.valid:
+                    try:
+                        self.check_pair(read_1, read_2)
+                    except SeqValidationError as err:
+                        self.record_error(err)
+                    else:
+                        if self.writer is not None:
+                            self.writer.write_pair(read_1, read_2)
+                        if self.sampler is not None:
+                            self.sampler.add(read_1, read_2)
+                if self.index is not None and pairs % self.index_every == 0:
+                    self.index.add(pairs, read_1, read_2)
                 pairs += 1
+                self.check_cancel(pairs)
 
                 if bar and pairs % prog_indic == 0:
                     bar.update(pairs/prog_indic)
+                if pairs == self.max_pairs:
+                    break
 
                 if curr_line_a == '':
                     if curr_line_b != '':
-                        raise SeqValidationError("Read 1 file finished before read 2")
+                        self.record_error(SeqValidationError("Read 1 file finished before read 2",
+                                                             'pair_count',
+                                                             {'file': file_a,
+                                                              'line': fqh_line_a}))
                     break  # if we get here both files are finished
                 if curr_line_b == '':
-                    raise SeqValidationError("Read 2 file finished before read 1")
+                    self.record_error(SeqValidationError("Read 2 file finished before read 1",
+                                                         'pair_count',
+                                                         {'file': file_b, 'line': fqh_line_b}))
+                    break
             self.pairs = pairs
         finally:
             print(file=sys.stderr)  # make sure we move to next line when progress finishes
-            if fq_fh_a is not None and not fq_fh_a.closed:
-                fq_fh_a.close()
-            if fq_fh_b is not None and not fq_fh_b.closed:
-                fq_fh_b.close()
+            # closing a pipe raises when its decompressor failed, close both regardless
+            try:
+                if fq_fh_a is not None and not fq_fh_a.closed:
+                    fq_fh_a.close()
+            finally:
+                if fq_fh_b is not None and not fq_fh_b.closed:
+                    fq_fh_b.close()
 
     def validate_interleaved(self):
         """
@@ -177,32 +598,45 @@ class SeqValidator(object):
         fq_fh = None
         file_a = self.file_a
         try:
-            if self.is_gzip:
-                fq_fh = gzip.open(self.file_a, 'rt')
-            else:
-                fq_fh = open(self.file_a, 'r')
+            fq_fh = self._open(self.file_a)
 
             curr_line = None
             fqh_line = 0
             bar = self.setup_progress()
             pairs = 0
             while True:
-                read_1 = FastqRead(fq_fh, fqh_line, curr_line)
-                read_1.validate(file_a)
+                read_1 = self._next_read(fq_fh, fqh_line, curr_line, file_a, self.q_min)
                 curr_line = read_1.last_line
+                if curr_line == '' and not read_1.valid:
+                    # the search after a bad record reached the end, there's no read 2
+                    pairs += 1
+                    break
 
-                read_2 = FastqRead(fq_fh, read_1.file_pos[1], curr_line)
-                read_2.validate(file_a)
+                read_2 = self._next_read(fq_fh, read_1.file_pos[1], curr_line, file_a)
                 curr_line = read_2.last_line
 
                 # ensure line increments based on the last line read
                 fqh_line = read_2.file_pos[1]
 
-                self.check_pair(read_1, read_2)
+                if read_1.valid and read_2.valid:
+                    try:
+                        self.check_pair(read_1, read_2)
+                    except SeqValidationError as err:
+                        self.record_error(err)
+                    else:
+                        if self.writer is not None:
+                            self.writer.write_pair(read_1, read_2)
+                        if self.sampler is not None:
+                            self.sampler.add(read_1, read_2)
+                if self.index is not None and pairs % self.index_every == 0:
+                    self.index.add(pairs, read_1, read_2)
                 pairs += 1
+                self.check_cancel(pairs)
 
                 if bar and pairs % prog_indic == 0:
                     bar.update(pairs/prog_indic)
+                if pairs == self.max_pairs:
+                    break
                 if curr_line == '':
                     break
             self.pairs = pairs
@@ -221,8 +655,8 @@ class SeqValidator(object):
         if self.q_min > 33:
             # once a min of 33 is achieved it must be sanger/Illumina 1.8+
             # may need occasional review.
-            q_min = min(map(ord, read_1.qual))
-            if self.q_min > q_min:
+            q_min = read_1.min_qual(below=self.q_min)
+            if q_min is not None:
                 self.q_min = q_min
 
         if read_1.name != read_2.name:
@@ -231,16 +665,72 @@ class SeqValidator(object):
                                      \n\t%s (%s)\n\t%s (%s)"
                                      % (read_1.file_pos[0], read_2.file_pos[0],
                                         read_1.name, self.file_a,
-                                        read_2.name, self.file_b))
-        if read_1.end != '1':
+                                        read_2.name, self.file_b),
+                                     'pair_name', read_1.position(self.file_a))
+        # a header without an end (e.g. SRA) is placed by its position
+        if read_1.end not in ('1', None):
             raise SeqValidationError("Fastq record at line %d of %s should be \
                                      for first in pair, got '%s'"
-                                     % (read_1.file_pos[0], self.file_a, read_1.end))
+                                     % (read_1.file_pos[0], self.file_a, read_1.end),
+                                     'pair_end', read_1.position(self.file_a))
 
-        if read_2.end != '2':
+        if read_2.end not in ('2', None):
             raise SeqValidationError("Fastq record at line %d of %s should be \
                                      for second in pair, got '%s'"
-                                     % (read_2.file_pos[0], self.file_b, read_2.end))
+                                     % (read_2.file_pos[0], self.file_b, read_2.end),
+                                     'pair_end', read_2.position(self.file_b))
+
+        if self.dup_names is not None:
+            self.dup_names.add(read_1.name)
+        if self.header_stats is not None:
+            self.header_stats.add(read_1)
+
+    def check_duplicates(self):
+        """
+        Confirms any duplicate read names found by the first pass, this
+        re-reads the first file.  Only read 1 names are checked as pairing
+        is already enforced.
+
+        Raises:
+            SeqValidationError
+        """
+        if self.dup_names is None or not self.dup_names.needs_confirm():
+            return
+        limit = None if self.max_errors else 1
+        for (name, lines) in self.dup_names.confirm(self._read_1_names(), limit):
+            self.record_error(SeqValidationError("Read name '%s' occurs more than once in %s, "
+                                                 "records at lines %s"
+                                                 % (name, self.file_a,
+                                                    ', '.join(str(line) for line in lines)),
+                                                 'duplicate_name',
+                                                 {'file': self.file_a, 'line': lines[1]}))
+
+    def _read_1_names(self):
+        """
+        Yields (name, line) of each read 1 record in the first file
+        """
+        fq_fh = self._open(self.file_a)
+        interleaved = self.file_a == self.file_b
+        record = 0
+        try:
+            curr_line = None
+            line_no = 0
+            while curr_line != '':
+                read = FastqRead(fq_fh, line_no, curr_line, self.max_record_bytes)
+                (curr_line, line_no) = (read.last_line, read.file_pos[1])
+                if curr_line != '' and not curr_line.startswith('@'):
+                    (curr_line, line_no) = resync(fq_fh, curr_line, line_no)
+                record += 1
+                header_format = self.header_format or read_headers.default()
+                match = header_format.regex.match(read.header)
+                if match is None:
+                    continue
+                end = match.group(header_format.end_group) if header_format.end_group else None
+                # without an end, read 1 is every other record of interleaved input
+                if end == '1' or (end is None and (not interleaved or record % 2)):
+                    yield (match.group(header_format.name_group), read.file_pos[0])
+        finally:
+            fq_fh.close()
 
     def setup_progress(self):
         """
@@ -248,6 +738,7 @@ class SeqValidator(object):
         """
         if self.progress_pairs == 0:
             return None
+        progressbar = import_module('progressbar')  # progressbar2, only needed here
         bar = progressbar.ProgressBar(max_value=progressbar.UnknownLength)
         print("Progress is %d's of record pairs" % (self.progress_pairs), file=sys.stderr)
         bar.update(0)
@@ -0,0 +1,361 @@
+"""
+Long running validation service.  Accepts man-norm, man-valid and seq-valid
+jobs over a Unix socket (or localhost TCP port) and runs them on a pool of
+worker processes that keep configs loaded between jobs.
+
+The protocol is newline delimited json, one object per line:
+
+    request:  {"id": "j1", "command": "seq-valid", "options": {"input": ["a_1.fq", "a_2.fq"]}}
+    cancel:   {"id": "j1", "cancel": true}
+
+    response: {"id": "j1", "status": "queued"}
+              {"id": "j1", "status": "done", "result": {...}}
+              {"id": "j1", "status": "error", "error": "..."}
+              {"id": "j1", "status": "cancelled"}
+
+Options mirror the long form of the command line arguments.  A connection can
+have many jobs in flight, responses are written as each job finishes.  Job ids
+(a string or number) belong to the connection, so only that connection can
+cancel its jobs.
+"""
+
+import os
+import sys
+import json
+import signal
+import asyncio
+import multiprocessing
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+
+from cgp_seq_input_val import (batch, constants, dup_names, header_stats, manifest, pair_check,
+                               read_headers, record_index, resources, row_store, sampler)
+from cgp_seq_input_val.error_classes import JobCancelledError, ValidationError
+from cgp_seq_input_val.reader import default_stable, input_reader
+from cgp_seq_input_val.seq_validator import record_mem_cap
+
+
+def serve(args):
+    """
+    Top level entry point for running the validation service.
+    """
+    service = ValidationService(workers=args.workers)
+    service.run(socket_path=args.socket, port=args.port)
+
+
+def _warm_worker():
+    """
+    Worker initialiser, loads all bundled configs so the first job of each
+    worker doesn't pay for it.
+    """
+    for resource in resources.listdir('config'):
+        if '-' not in resource:
+            continue  # not a manifest config, e.g. read_headers.json
+        (form_type, version) = os.path.splitext(resource)[0].split('-', 1)
+        manifest.load_config(form_type, version)
+
+
+def _man_norm(options, cancel):
+    infile = options['input']
+    if os.path.splitext(infile)[1][1:] not in constants.MANIFEST_EXTNS:
+        raise ValidationError("File doesn't end with %s" % (constants.MANIFEST_EXTNS,))
+    args = Namespace(input=infile, output=options.get('output'))
+    manifest.normalise(args)
+    return {'output': args.output or args.input}
+
+
+def _man_valid(options, cancel):
+    store = None
+    if options.get('row_store', False):
+        store = row_store.store_path(options['output'], options['input'])
+    return batch.validate_manifest(options['input'], options['output'],
+                                   options.get('checkfiles', False),
+                                   options.get('pair_check', 0),
+                                   options.get('workers', pair_check.default_workers),
+                                   store, options.get('ndjson', False),
+                                   options.get('registry'))
+
+
+def _seq_valid(options, cancel):
+    inputs = options['input']
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dup_mem = None
+    if options.get('check_duplicates', False):
+        dup_mem = options.get('dup_mem', dup_names.default_mem)
+    header_top_k = None
+    if options.get('header_stats', False):
+        header_top_k = options.get('top_barcodes', header_stats.default_top_k)
+    index_file = None
+    if options.get('index', False):
+        index_file = options.get('index_file') or record_index.sidecar_path(inputs[0])
+    return batch.validate_seq(*inputs,
+                              max_record_bytes=options.get('max_record_mem', record_mem_cap),
+                              threads=options.get('threads', 1),
+                              cancel=cancel,
+                              max_errors=options.get('max_errors', 0),
+                              dup_mem=dup_mem,
+                              index_file=index_file,
+                              index_every=options.get('index_every',
+                                                      record_index.default_every),
+                              output=options.get('output'),
+                              shard_pairs=options.get('shard_pairs', 0),
+                              compress=not options.get('output_plain', False),
+                              output_layout=options.get('output_layout', 'same'),
+                              decompressor=options.get('decompressor'),
+                              reader=input_reader(options.get('read_size'),
+                                                  options.get('prefetch', 0),
+                                                  options.get('drop_cache', False),
+                                                  options.get('follow', False),
+                                                  options.get('follow_marker'),
+                                                  options.get('follow_stable',
+                                                              default_stable)),
+                              header_top_k=header_top_k,
+                              header_format=options.get('header_format', read_headers.AUTO),
+                              sample=options.get('sample', 0),
+                              sample_output=options.get('sample_output'),
+                              sample_seed=options.get('sample_seed', sampler.default_seed),
+                              count=options.get('count', False))
+
+
+JOB_TYPES = {'man-norm': _man_norm,
+             'man-valid': _man_valid,
+             'seq-valid': _seq_valid}
+# options each command can't run without, as the command line's required arguments
+REQUIRED_OPTIONS = {'man-norm': ('input',),
+                    'man-valid': ('input', 'output'),
+                    'seq-valid': ('input',)}
+
+
+def run_job(command, options, cancel=None):
+    """
+    Runs a single job, this is what executes in the worker processes.
+
+    Args:
+        command - one of JOB_TYPES
+        options - dict of options for the command
+        cancel - optional, object with is_set(), checked by long running jobs
+
+    Returns:
+        dict with 'status' and 'result' or 'error'
+    """
+    try:
+        result = JOB_TYPES[command](options, cancel)
+    except JobCancelledError:
+        return {'status': 'cancelled'}
+    except batch.RESULT_ERRORS as err:
+        return {'status': 'error', 'error': str(err)}
+    return {'status': 'done', 'result': result}
+
+
+def _run_until_complete(coro):
+    """
+    As asyncio.run (python 3.7+), runs coro on a new event loop then cancels
+    the tasks left behind, e.g. handlers of connections still open.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+        pending = [task for task in all_tasks(loop) if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class ValidationService(object):
+    """
+    Serves validation jobs from a managed pool of worker processes.
+
+    Args:
+        workers - optional, number of worker processes [cpu count]
+    """
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.manager = None
+        self.jobs = {}  # id -> (future, cancel event)
+        self.job_count = 0
+
+    def start(self):
+        """
+        Starts the worker pool
+        """
+        self.manager = multiprocessing.Manager()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def shutdown(self):
+        """
+        Cancels any outstanding jobs and stops the worker pool
+        """
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+
+    def cancel(self, job_id):
+        """
+        Cancels a job, queued jobs are dropped, running jobs are asked to stop.
+
+        Returns:
+            False if the job is unknown (or already finished)
+        """
+        if job_id not in self.jobs:
+            return False
+        (future, event) = self.jobs[job_id]
+        if not future.cancel():
+            event.set()
+        return True
+
+    def submit(self, command, options, job_id=None):
+        """
+        Queues a job on the worker pool.
+
+        Returns:
+            tuple of (job_id, concurrent.futures.Future)
+
+        Raises:
+            ValidationError - unknown command, missing required options or
+                              duplicate job id
+        """
+        if command not in JOB_TYPES:
+            raise ValidationError("Unknown command '%s', expected one of: %s"
+                                  % (command, ', '.join(sorted(JOB_TYPES))))
+        if not isinstance(options, dict):
+            raise ValidationError("Options of command '%s' must be an object" % (command))
+        missing = [name for name in REQUIRED_OPTIONS[command] if options.get(name) is None]
+        if missing:
+            raise ValidationError("Command '%s' requires option(s): %s"
+                                  % (command, ', '.join(missing)))
+        if job_id is None:
+            self.job_count += 1
+            job_id = 'job-%d' % (self.job_count)
+        if job_id in self.jobs:
+            raise ValidationError("Job id '%s' is already in use" % (job_id))
+        event = self.manager.Event()
+        future = self.pool.submit(run_job, command, options, event)
+        self.jobs[job_id] = (future, event)
+        return job_id, future
+
+    async def _await_job(self, job_id, future):
+        """Response of a job once it finishes"""
+        try:
+            response = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise  # the service is shutting down
+            response = {'status': 'cancelled'}
+        except Exception as err:  # e.g. a worker process died
+            response = {'status': 'error', 'error': str(err)}
+        finally:
+            self.jobs.pop(job_id, None)
+        return response
+
+    async def handle_client(self, reader, writer):
+        """
+        Reads requests from a connection until it closes, jobs still running
+        when the client disconnects are cancelled.
+        """
+        lock = asyncio.Lock()
+
+        async def send(message):
+            async with lock:
+                writer.write((json.dumps(message, sort_keys=True) + '\n').encode('utf-8'))
+                await writer.drain()
+
+        client_jobs = {}  # id given by the client -> (job_id, task)
+
+        async def reply(client_id, job_id, future):
+            try:
+                response = await self._await_job(job_id, future)
+            finally:
+                client_jobs.pop(client_id, None)
+            response['id'] = client_id
+            await send(response)
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            client_id = None  # echoed in errors once the request is parsed
+            try:
+                request = json.loads(line.decode('utf-8'))
+                client_id = request.get('id')
+                if client_id is not None and (not isinstance(client_id, (str, int, float)) or
+                                              isinstance(client_id, bool)):
+                    raise ValidationError("Job id must be a string or number")
+                if request.get('cancel'):
+                    if client_id not in client_jobs:
+                        raise ValidationError("Unknown job id '%s'" % (client_id))
+                    self.cancel(client_jobs[client_id][0])
+                    continue
+                if client_id in client_jobs:
+                    raise ValidationError("Job id '%s' is already in use" % (client_id))
+                (job_id, future) = self.submit(request.get('command'),
+                                               request.get('options', {}))
+            except (ValueError, AttributeError, ValidationError) as err:
+                await send({'id': client_id, 'status': 'error', 'error': str(err)})
+                continue
+            if client_id is None:
+                client_id = job_id
+            await send({'id': client_id, 'status': 'queued'})
+            client_jobs[client_id] = (job_id, asyncio.ensure_future(reply(client_id, job_id,
+                                                                          future)))
+
+        tasks = []
+        for (job_id, task) in list(client_jobs.values()):
+            self.cancel(job_id)
+            tasks.append(task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+    async def start_server(self, socket_path=None, host='127.0.0.1', port=None):
+        """
+        Starts the worker pool and begins listening, on socket_path when
+        given otherwise host:port.
+
+        Returns:
+            asyncio server
+        """
+        if self.pool is None:
+            self.start()
+        if socket_path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path=socket_path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def _serve(self, socket_path, port):
+        stop = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            server = await self.start_server(socket_path=socket_path, port=port)
+            print("Listening on %s with %d workers"
+                  % (socket_path or 'localhost:%d' % (port), self.workers), file=sys.stderr)
+            try:
+                await stop.wait()
+            finally:
+                server.close()
+                await server.wait_closed()
+        finally:
+            self.shutdown()
+            if socket_path is not None and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    def run(self, socket_path=None, port=None):
+        """
+        Runs the service until SIGINT/SIGTERM
+        """
+        _run_until_complete(self._serve(socket_path, port))
@@ -0,0 +1,87 @@
+import pytest
+import os, sys, tempfile
+
+from cgp_seq_input_val.bam_validator import BamValidator
+from cgp_seq_input_val.reader import input_reader
+from cgp_seq_input_val.seq_validator import get_validator
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'bam')
+
+def setup():
+    pass
+
+def teardown():
+    pass
+
+def test_bam_good():
+    bv = BamValidator(os.path.join(test_dir, 'good.bam'), progress_pairs=1)
+    bv.validate()
+    # secondary record is ignored
+    summary = bv.summary()
+    assert (summary['pairs'], summary['valid_q'], summary['interleaved']) == (2, True, True)
+    # same keys as a fastq report
+    assert summary['header_format'] is None
+    assert (summary['compression']['codec'], summary['compression']['decompressor']) == \
+        ('bgzf', 'python')
+    t = str(bv)
+    bv.report(sys.stdout)
+
+def test_bam_valid_q_as_fastq():
+    # valid_q means a phred 0 quality was seen, as for fastq, the lowest here is 2
+    bv = BamValidator(os.path.join(test_dir, 'min_q2.bam'), progress_pairs=0)
+    bv.validate()
+    assert bv.q_min == 2
+    assert bv.summary()['valid_q'] is False
+
+def test_bam_good_threaded():
+    bv = BamValidator(os.path.join(test_dir, 'good.bam'), progress_pairs=0, threads=3)
+    bv.validate()
+    assert bv.pairs == 2
+
+def test_bam_bad_ext():
+    with pytest.raises(SeqValidationError) as e_info:
+        BamValidator(os.path.join(test_dir, 'good.sam'))
+
+@pytest.mark.parametrize('bam, message', [('no_eof.bam', 'EOF marker absent'),
+                                          ('unpaired.bam', 'flagged as paired'),
+                                          ('missing_mate.bam', '1 second in pair'),
+                                          ('bad_qual.bam', 'phred range'),
+                                          ('bad_header.bam', 'header line 1'),
+                                          ('bad_ref.bam', 'unknown sequence')])
+def test_bam_bad(bam, message):
+    with pytest.raises(SeqValidationError) as e_info:
+        bv = BamValidator(os.path.join(test_dir, bam), progress_pairs=0)
+        bv.validate()
+    assert message in str(e_info.value)
+
+def test_bam_truncated_block():
+    with tempfile.TemporaryDirectory() as tmpd:
+        bam = os.path.join(tmpd, 'trunc.bam')
+        with open(os.path.join(test_dir, 'good.bam'), 'rb') as ifh:
+            data = ifh.read()
+        with open(bam, 'wb') as ofh:
+            ofh.write(data[:50] + data[-28:])  # keep EOF block so block parsing fails
+        with pytest.raises(SeqValidationError) as e_info:
+            BamValidator(bam, progress_pairs=0).validate()
+
+def test_get_validator_bam():
+    assert isinstance(get_validator(os.path.join(test_dir, 'good.bam')), BamValidator)
+
+def test_get_validator_bam_pair():
+    with pytest.raises(SeqValidationError) as e_info:
+        get_validator(os.path.join(test_dir, 'good.bam'), os.path.join(test_dir, 'good.bam'))
+
+def test_get_validator_cram():
+    with pytest.raises(SeqValidationError) as e_info:
+        get_validator(os.path.join(test_dir, 'good.cram'))
+
+def test_get_validator_bam_options():
+    with pytest.raises(SeqValidationError) as e_info:
+        get_validator(os.path.join(test_dir, 'good.bam'), max_errors=5, dup_mem=1024,
+                      index_every=10)
+    assert str(e_info.value) == \
+        "BAM input can't be combined with: --max-errors, --check-duplicates, --index"
+    with pytest.raises(SeqValidationError) as e_info:
+        get_validator(os.path.join(test_dir, 'good.bam'), reader=input_reader(prefetch=2))
+    assert '--follow' in str(e_info.value)
@@ -0,0 +1,115 @@
+import pytest
+import os, sys, tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import json
+from argparse import Namespace
+
+from cgp_seq_input_val.batch import (find_manifests, iter_validate, summarise, validate_all,
+                                     validate_manifest, validate_seq, ValidationResult)
+from cgp_seq_input_val.manifest import wrapped_batch_validate, wrapped_validate
+from cgp_seq_input_val.error_classes import SeqValidationError, ValidationError
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'fastq_read')
+test_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+def setup():
+    pass
+
+def teardown():
+    pass
+
+def test_validate_seq_pair():
+    res = validate_seq(os.path.join(test_dir, 'good_read_1.fq'),
+                       os.path.join(test_dir, 'good_read_2.fq'))
+    assert res['pairs'] == 1
+
+def test_validate_seq_raises():
+    with pytest.raises(SeqValidationError) as e_info:
+        validate_seq(os.path.join(test_dir, 'good_read_1.fq'),
+                     os.path.join(test_dir, 'diff_2.fq'))
+
+def test_validate_manifest_no_write():
+    res = validate_manifest(os.path.join(test_data, 'with_uuid.tsv'))
+    assert res == {'uuid': '05218fd0-79e5-4214-92d5-e133cd16a798'}
+
+def test_validate_manifest_raises():
+    with pytest.raises(ValidationError) as e_info:
+        validate_manifest(os.path.join(test_data, 'extraHeader.tsv'))
+
+def test_iter_validate_mixed():
+    seq = [(os.path.join(test_dir, 'good_read_1.fq'), os.path.join(test_dir, 'good_read_2.fq')),
+           os.path.join(test_dir, 'good_read_i.fq.gz'),
+           (os.path.join(test_dir, 'good_read_1.fq'), os.path.join(test_dir, 'diff_2.fq'))]
+    mans = [os.path.join(test_data, 'file_set_good', 'files_good.tsv'),
+            os.path.join(test_data, 'missingHeader.tsv')]
+    with tempfile.TemporaryDirectory() as tmpd:
+        results = list(iter_validate(seq, mans, outdir=tmpd, workers=2))
+        assert len(results) == 5
+        by_input = {r.inputs: r for r in results}
+        assert by_input[(os.path.join(test_dir, 'good_read_i.fq.gz'),)].result['interleaved']
+        bad = by_input[(os.path.join(test_dir, 'good_read_1.fq'), os.path.join(test_dir, 'diff_2.fq'))]
+        assert bad.ok is False
+        assert isinstance(bad.error, SeqValidationError)
+        with pytest.raises(SeqValidationError) as e_info:
+            bad.raise_for_error()
+        man = by_input[(mans[0],)]
+        assert man.ok and os.path.isfile(man.result['json'])
+        assert by_input[(mans[1],)].ok is False
+
+def test_validate_all_shared_executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = validate_all([os.path.join(test_dir, 'good_read_i.fq')], executor=pool)
+        results += validate_all([os.path.join(test_dir, 'good_read_i.fq.gz')], executor=pool)
+    assert [r.ok for r in results] == [True, True]
+    assert 'ok' in str(results[0])
+
+def test_find_manifests():
+    with tempfile.TemporaryDirectory() as tmpd:
+        os.makedirs(os.path.join(tmpd, 'b'))
+        for name in ('b/2.tsv', '1.tsv', 'notes.txt'):
+            with open(os.path.join(tmpd, name), 'w') as ofh:
+                ofh.write('x')
+        listing = os.path.join(tmpd, 'list.txt')
+        with open(listing, 'w') as ofh:
+            ofh.write('other.tsv\n\n1.tsv\n')
+        found = find_manifests([tmpd, listing, os.path.join(tmpd, '1.tsv')])
+        assert found == [os.path.join(tmpd, '1.tsv'), os.path.join(tmpd, 'b', '2.tsv'),
+                         os.path.join(tmpd, 'other.tsv')]
+
+def test_summarise():
+    results = [ValidationResult('man-valid', ('b.tsv',), error=ValidationError('bad   value')),
+               ValidationResult('man-valid', ('a.tsv',), result={'uuid': 'x'})]
+    report = summarise(results, ['a.tsv', 'b.tsv'])
+    assert (report['manifests'], report['ok'], report['failed']) == (2, 1, 1)
+    assert report['results'] == [{'manifest': 'a.tsv', 'ok': True, 'uuid': 'x'},
+                                 {'manifest': 'b.tsv', 'ok': False, 'error': 'bad value'}]
+
+def test_wrapped_batch_validate():
+    mans = [os.path.join(test_data, 'file_set_good', 'files_good.tsv'),
+            os.path.join(test_data, 'missingHeader.tsv')]
+    with tempfile.TemporaryDirectory() as tmpd:
+        report = os.path.join(tmpd, 'report.json')
+        args = Namespace(input=mans, output=os.path.join(tmpd, 'out'), checkfiles=True,
+                         jobs=2, pair_check=0, registry=None, report=open(report, 'w'))
+        with pytest.raises(SystemExit) as e_info:
+            wrapped_batch_validate(args)
+        args.report.close()
+        assert '1 of 2 manifests failed' in str(e_info.value)
+        with open(report) as ifh:
+            summary = json.load(ifh)
+        assert [r['ok'] for r in summary['results']] == [True, False]
+        assert os.path.isfile(summary['results'][0]['json'])
+
+def test_registry_error_per_manifest():
+    # a corrupt registry fails each manifest rather than the batch
+    mans = [os.path.join(test_data, 'file_set_good', 'files_good.tsv')]
+    registry = os.path.join(test_data, 'file_registry', 'not_a_registry.db')
+    (res,) = validate_all(manifests=mans, checkfiles=True, registry=registry, workers=1)
+    assert not res.ok
+    assert 'not a database' in str(res.error)
+    args = Namespace(input=mans[0], output=None, checkfiles=True, pair_check=0, workers=1,
+                     row_store=False, registry=registry, ndjson=False)
+    with pytest.raises(SystemExit) as e_info:
+        wrapped_validate(args)
+    assert 'not a database' in str(e_info.value)
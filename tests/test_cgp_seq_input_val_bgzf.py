@@ -0,0 +1,77 @@
+import pytest
+import os, sys, tempfile, gzip, hashlib
+
+from cgp_seq_input_val import bgzf
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+def setup():
+    pass
+
+def teardown():
+    pass
+
+def _write(path, chunks, eof=True):
+    with open(path, 'wb') as ofh:
+        for chunk in chunks:
+            ofh.write(bgzf.compress_block(chunk))
+        if eof:
+            ofh.write(bgzf.EOF_BLOCK)
+
+def test_eof_block_matches_spec():
+    assert bgzf.compress_block(b'') == bgzf.EOF_BLOCK
+
+def test_is_bgzf():
+    assert bgzf.is_bgzf(bgzf.EOF_BLOCK)
+    assert not bgzf.is_bgzf(gzip.compress(b'plain gzip'))
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_reader_round_trip(threads):
+    chunks = [(b'%d' % i) * 5000 for i in range(30)]
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, 'x.gz')
+        _write(path, chunks)
+        # gzip module can read it as multi-member gzip
+        with gzip.open(path, 'rb') as fh:
+            assert fh.read() == b''.join(chunks)
+        with open(path, 'rb') as fh:
+            assert bgzf.has_eof_block(fh)
+        with bgzf.BgzfReader(path, threads=threads) as reader:
+            got = []
+            while True:
+                data = reader.read(7777)
+                if not data:
+                    break
+                got.append(data)
+        assert b''.join(got) == b''.join(chunks)
+
+def test_reader_bad_crc():
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, 'x.gz')
+        block = bytearray(bgzf.compress_block(b'some data'))
+        block[-8] ^= 0xff
+        with open(path, 'wb') as ofh:
+            ofh.write(block)
+        with pytest.raises(SeqValidationError) as e_info:
+            with bgzf.BgzfReader(path) as reader:
+                reader.read(10)
+
+def test_no_eof_block():
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, 'x.gz')
+        _write(path, [b'abc'], eof=False)
+        with open(path, 'rb') as fh:
+            assert not bgzf.has_eof_block(fh)
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_writer_round_trip(threads):
+    data = b''.join(b'%d\n' % i for i in range(100000))
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, 'out.gz')
+        with bgzf.BgzfWriter(path, threads=threads) as writer:
+            for start in range(0, len(data), 1000):
+                writer.write(data[start:start + 1000])
+        with open(path, 'rb') as fh:
+            assert bgzf.has_eof_block(fh)
+            assert writer.hexdigest() == hashlib.md5(fh.read()).hexdigest()
+        with bgzf.BgzfReader(path) as reader:
+            assert reader.read(len(data) + 1) == data
@@ -1,10 +1,11 @@
 import pytest
 import os, sys, tempfile
 import glob
+import subprocess
 #from argparse import Namespace
 
-from cgp_seq_input_val.cliutil import extn_check
-from cgp_seq_input_val import constants
+from cgp_seq_input_val.cliutil import extn_check, command, int_at_least, VersionAction
+from cgp_seq_input_val import constants, resources
 
 import argparse
 
@@ -30,3 +31,55 @@ def test_extn_check_bad_extn():
     with pytest.raises(SystemExit) as e_info:
         parser = argparse.ArgumentParser()
         extn_check(parser, constants.MANIFEST_EXTNS, os.path.join(test_dir, 'bad.extn'), readable=True)
+
+def test_version_action(capsys):
+    parser = argparse.ArgumentParser(prog='prog')
+    parser.add_argument('-v', '--version', action=VersionAction)
+    with pytest.raises(SystemExit) as e_info:
+        parser.parse_args(['-v'])
+    assert e_info.value.code == 0
+    assert capsys.readouterr().out == 'prog %s\n' % (resources.version())
+
+def test_command():
+    run = command('resources', 'path')
+    assert run('config') == resources.path('config')
+
+def test_command_line_imports():
+    # building the parser and --help stay clear of the sub-command modules
+    code = ('import sys; sys.argv = ["cgpSeqInputVal", "--help"]\n'
+            'from cgp_seq_input_val.command_line import main\n'
+            'try:\n    main()\nexcept SystemExit:\n    pass\n'
+            'print(" ".join(sys.modules))')
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                         universal_newlines=True, check=True).stdout
+    loaded = out.split()
+    for module in ('pkg_resources', 'progressbar', 'cgp_seq_input_val.manifest',
+                   'cgp_seq_input_val.seq_validator', 'cgp_seq_input_val.service'):
+        assert module not in loaded
+
+def test_int_at_least(capsys):
+    parser = argparse.ArgumentParser(prog='prog')
+    parser.add_argument('-k', type=int_at_least(1))
+    assert parser.parse_args(['-k', '3']).k == 3
+    for bad in ('0', 'x'):
+        with pytest.raises(SystemExit):
+            parser.parse_args(['-k', bad])
+    assert 'must be at least 1, got 0' in capsys.readouterr().err
+
+@pytest.mark.parametrize('argv', [['man-valid', '-w', '0'],
+                                  ['man-valid-batch', '-j', '0'],
+                                  ['seq-valid', '-t', '0'],
+                                  ['seq-valid', '--dup-mem', '0'],
+                                  ['seq-valid', '--index-every', '0'],
+                                  ['seq-valid', '--shard-pairs', '-1'],
+                                  ['seq-valid', '--prefetch', '-1'],
+                                  ['seq-valid', '--read-size', '0'],
+                                  ['seq-valid', '-m', '0'],
+                                  ['serve', '-w', '0']])
+def test_command_line_counts(argv, monkeypatch, capsys):
+    from cgp_seq_input_val.command_line import main
+    monkeypatch.setattr(sys, 'argv', ['cgpSeqInputVal'] + argv)
+    with pytest.raises(SystemExit) as e_info:
+        main()
+    assert e_info.value.code == 2
+    assert 'must be at least' in capsys.readouterr().err
@@ -0,0 +1,185 @@
+import pytest
+import os, shutil, tempfile
+
+from cgp_seq_input_val import compression
+from cgp_seq_input_val.seq_validator import SeqValidator
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'fastq_read')
+
+def _fq(name):
+    return os.path.join(test_dir, name)
+
+@pytest.mark.parametrize('name,codec', [('good_read_i.fq', 'plain'),
+                                        ('good_read_i.fq.gz', 'gzip'),
+                                        ('good_read_i.fq.bz2', 'bzip2'),
+                                        ('good_read_i.fq.xz', 'xz')])
+def test_sniff_and_validate(name, codec):
+    assert compression.sniff(_fq(name)).name == codec
+    sv = SeqValidator(_fq(name), progress_pairs=0)
+    sv.validate()
+    summary = sv.summary()
+    assert summary['pairs'] == 1
+    assert summary['compression']['codec'] == codec
+    assert summary['compression']['decompressor'] == compression.IN_PROCESS
+
+def test_sniff_ignores_extension():
+    with tempfile.TemporaryDirectory() as tmpd:
+        # gzip content named as plain fastq and vice versa
+        shutil.copy(_fq('good_read_i.fq.gz'), os.path.join(tmpd, 'i.fq'))
+        shutil.copy(_fq('good_read_i.fq'), os.path.join(tmpd, 'i.fq.gz'))
+        for name in ('i.fq', 'i.fq.gz'):
+            sv = SeqValidator(os.path.join(tmpd, name), progress_pairs=0)
+            sv.validate()
+            assert sv.pairs == 1
+
+def test_sniff_bgzf():
+    from cgp_seq_input_val.bgzf import BgzfWriter
+    with tempfile.TemporaryDirectory() as tmpd:
+        out = os.path.join(tmpd, 'i.fq.gz')
+        writer = BgzfWriter(out)
+        with open(_fq('good_read_i.fq'), 'rb') as ifh:
+            writer.write(ifh.read())
+        writer.close()
+        assert compression.sniff(out).name == 'bgzf'
+
+def test_external_decompressor():
+    sv = SeqValidator(_fq('good_read_1.fq.gz'), _fq('good_read_2.fq.gz'), progress_pairs=0,
+                      decompressor='gzip')
+    sv.validate()
+    summary = sv.summary()
+    assert summary['pairs'] == 1
+    assert summary['compression']['decompressor'] == 'gzip'
+    assert summary['compression']['mb_per_sec'] is not None
+
+def test_external_decompressor_failure():
+    with open(_fq('good_read_i.fq.gz'), 'rb') as ifh:
+        data = ifh.read()
+    with tempfile.TemporaryDirectory() as tmpd:
+        bad = os.path.join(tmpd, 'bad.fq.gz')
+        with open(bad, 'wb') as ofh:
+            ofh.write(data[:-8] + bytes(8))  # damage the crc/size trailer
+        with pytest.raises(SeqValidationError) as e_info:
+            SeqValidator(bad, progress_pairs=0, decompressor='gzip').validate()
+        assert e_info.value.category == 'compression'
+
+def test_external_decompressor_missing():
+    with pytest.raises(SeqValidationError):
+        compression.find_decompressor(compression.sniff(_fq('good_read_i.fq.gz')),
+                                      'no-such-decompressor')
+
+def test_auto_decompressor():
+    codec = compression.sniff(_fq('good_read_i.fq.gz'))
+    expected = None
+    for program in codec.external:
+        if shutil.which(program):
+            expected = program
+            break
+    assert compression.find_decompressor(codec, compression.AUTO) == expected
+    # plain input never uses one
+    assert compression.find_decompressor(compression.PLAIN, 'gzip') is None
+
+def test_external_stop_early():
+    # closing before the end must not report a failure
+    handle = compression.open_text(_fq('good_read_i.fq.gz'), decompressor='gzip')
+    assert handle.readline().startswith('@')
+    handle.close()
+
+def _truncate(tmpd, name, drop):
+    with open(_fq(name), 'rb') as ifh:
+        data = ifh.read()
+    out = os.path.join(tmpd, name)
+    with open(out, 'wb') as ofh:
+        ofh.write(data[:-drop])
+    return out
+
+def _bgzf(tmpd):
+    from cgp_seq_input_val.bgzf import BgzfWriter
+    out = os.path.join(tmpd, 'bgzf.fq.gz')
+    writer = BgzfWriter(out)
+    with open(_fq('good_read_i.fq'), 'rb') as ifh:
+        writer.write(ifh.read())
+    writer.close()
+    return out
+
+@pytest.mark.parametrize('name', ['good_read_i.fq.gz', 'good_read_i.fq.bz2',
+                                  'good_read_i.fq.xz'])
+def test_check_complete(name):
+    compression.check_complete(_fq(name))
+    compression.check_complete(_fq('good_read_i.fq'))
+    with tempfile.TemporaryDirectory() as tmpd:
+        for drop in (1, 12, 30):
+            with pytest.raises(SeqValidationError) as e_info:
+                compression.check_complete(_truncate(tmpd, name, drop))
+            assert e_info.value.category == 'truncated'
+
+def test_check_complete_bgzf():
+    with tempfile.TemporaryDirectory() as tmpd:
+        good = _bgzf(tmpd)
+        compression.check_complete(good)
+        with open(good, 'rb') as ifh:
+            data = ifh.read()
+        trunc = os.path.join(tmpd, 'trunc.fq.gz')
+        # EOF marker missing, last data block cut short before the marker
+        for damaged in (data[:-28], data[:-40] + data[-28:]):
+            with open(trunc, 'wb') as ofh:
+                ofh.write(damaged)
+            with pytest.raises(SeqValidationError) as e_info:
+                compression.check_complete(trunc)
+            assert 'truncated' in str(e_info.value)
+
+def test_check_complete_multi_member():
+    with open(_fq('good_read_i.fq.gz'), 'rb') as ifh:
+        member = ifh.read()
+    with tempfile.TemporaryDirectory() as tmpd:
+        multi = os.path.join(tmpd, 'multi.fq.gz')
+        with open(multi, 'wb') as ofh:
+            ofh.write(member + member)
+        compression.check_complete(multi)
+        with open(multi, 'wb') as ofh:
+            ofh.write(member + member[:-10])
+        with pytest.raises(SeqValidationError):
+            compression.check_complete(multi)
+
+def test_validate_truncated():
+    with tempfile.TemporaryDirectory() as tmpd:
+        trunc = _truncate(tmpd, 'good_read_i.fq.gz', 12)
+        with pytest.raises(SeqValidationError) as e_info:
+            SeqValidator(trunc, progress_pairs=0).validate()
+        assert e_info.value.category == 'truncated'
+        # collected, the file isn't read
+        sv = SeqValidator(trunc, progress_pairs=0, max_errors=5)
+        sv.validate()
+        assert list(sv.errors) == ['truncated']
+        assert sv.pairs == 0
+
+def test_validate_truncated_during_scan(monkeypatch):
+    # damage the pre-check can't see is still reported as truncated
+    monkeypatch.setattr(SeqValidator, 'check_complete', lambda self, files: True)
+    with tempfile.TemporaryDirectory() as tmpd:
+        trunc = _truncate(tmpd, 'good_read_i.fq.bz2', 12)
+        with pytest.raises(SeqValidationError) as e_info:
+            SeqValidator(trunc, progress_pairs=0).validate()
+        assert e_info.value.category == 'truncated'
+        assert 'truncated' in str(e_info.value)
+
+def test_validate_truncated_large_member():
+    # a single member bigger than the tail searched can't be pre-checked
+    import gzip, random
+    rng = random.Random(1)
+    records = []
+    for i in range(4000):
+        seq = ''.join(rng.choices('ACGT', k=150))
+        qual = ''.join(rng.choices('!#5?AEFGHIJ', k=150))
+        for end in ('1', '2'):
+            records.append('@r%d/%s\n%s\n+\n%s\n' % (i, end, seq, qual))
+    data = gzip.compress(''.join(records).encode())
+    assert len(data) > compression.GZIP_TAIL_BYTES
+    with tempfile.TemporaryDirectory() as tmpd:
+        trunc = os.path.join(tmpd, 'large_i.fq.gz')
+        with open(trunc, 'wb') as ofh:
+            ofh.write(data[:-1000])
+        compression.check_complete(trunc)
+        with pytest.raises(SeqValidationError) as e_info:
+            SeqValidator(trunc, progress_pairs=0).validate()
+        assert e_info.value.category == 'truncated'
@@ -0,0 +1,76 @@
+import pytest
+import os
+
+from cgp_seq_input_val.dup_names import (BloomFilter, DuplicateNames, HashSet64,
+                                         name_hash)
+
+
+def test_hash_set_add():
+    hs = HashSet64(4)
+    assert hs.add(5) is False
+    assert hs.add(5) is True
+    assert 5 in hs
+    assert 6 not in hs
+    assert len(hs) == 1
+
+
+def test_hash_set_grown():
+    hs = HashSet64(4)
+    for value in range(1, 4):
+        hs.add(value)
+    assert hs.full()
+    bigger = hs.grown()
+    assert bigger.nbytes == hs.nbytes * 2
+    assert sorted(bigger) == [1, 2, 3]
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1024)
+    values = [name_hash('read_%d' % (i)) for i in range(100)]
+    assert not any(bloom.add(value) for value in values)
+    assert all(bloom.add(value) for value in values)
+
+
+def _names(count):
+    return [('read_%d' % (i), i * 4 + 1) for i in range(count)]
+
+
+def test_duplicate_names_exact():
+    names = _names(1000) + [('read_10', 4001), ('read_20', 4005)]
+    dups = DuplicateNames(1024 * 1024)
+    for (name, _) in names:
+        dups.add(name)
+    assert dups.mode == 'exact'
+    assert dups.needs_confirm()
+    assert dups.confirm(iter(names)) == [('read_10', [41, 4001]), ('read_20', [81, 4005])]
+    assert dups.confirm(iter(names), limit=1) == [('read_10', [41, 4001])]
+
+
+def test_duplicate_names_bloom():
+    names = _names(20000) + [('read_10', 80001)]
+    dups = DuplicateNames(64 * 1024)
+    for (name, _) in names:
+        dups.add(name)
+    assert dups.mode == 'bloom'
+    assert dups.confirm(iter(names)) == [('read_10', [41, 80001])]
+
+
+def test_duplicate_names_unique():
+    dups = DuplicateNames(1024 * 1024)
+    for (name, _) in _names(1000):
+        dups.add(name)
+    assert not dups.needs_confirm()
+
+
+def test_duplicate_names_candidates_bounded():
+    # every name repeated, candidates fill the budget then are only counted
+    names = _names(20000)
+    dups = DuplicateNames(64 * 1024)
+    for (name, _) in names + names:
+        dups.add(name)
+    assert dups.mode == 'bloom'
+    assert dups.nbytes <= 64 * 1024
+    assert dups.possible > 0
+    assert len(dups.candidates) + dups.possible == 20000
+    found = dups.confirm(iter(names + names))
+    assert len(found) == len(dups.candidates)
@@ -1,7 +1,7 @@
 import pytest
 import os, sys, tempfile
 
-from cgp_seq_input_val.fastq_read import FastqRead
+from cgp_seq_input_val.fastq_read import FastqRead, resync
 from cgp_seq_input_val.error_classes import SeqValidationError
 
 test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'fastq_read')
@@ -49,3 +49,125 @@ def test_fastq_string_print():
     with open(fqi, 'r') as fp:
         fr = FastqRead(fp, 0, None)
         t = str(fr)
+
+
+def test_fastq_four_line_fast_path():
+    fqi = os.path.join(test_dir, 'good_read_1.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+        fr.validate('x')
+        assert fr.four_line is True
+        assert fr.file_pos == (1, 4)
+        assert fr.last_line == ''
+
+
+def test_fastq_multi_line_fallback():
+    fqi = os.path.join(test_dir, 'multi_line_1.fq')
+    with open(fqi, 'r') as fp:
+        reads = []
+        curr_line = None
+        line_no = 0
+        while curr_line != '':
+            fr = FastqRead(fp, line_no, curr_line)
+            fr.validate('x')
+            reads.append(fr)
+            curr_line = fr.last_line
+            line_no = fr.file_pos[1]
+    assert [r.four_line for r in reads] == [True, False, True]
+    assert [r.file_pos for r in reads] == [(1, 4), (5, 10), (11, 14)]
+    assert reads[1].seq == reads[0].seq
+    assert reads[1].qual == reads[0].qual
+    assert reads[1].name.endswith('93085#6')
+
+
+def test_fastq_multi_line_streamed():
+    fqi = os.path.join(test_dir, 'multi_line_1.fq')
+    with open(fqi, 'r') as fp:
+        first = FastqRead(fp, 0, None, max_bytes=10)
+        fr = FastqRead(fp, first.file_pos[1], first.last_line, max_bytes=10)
+        fr.validate('x')
+    # 4-line records are already in memory, only wrapped ones are streamed
+    assert first.streamed is False
+    assert fr.streamed is True
+    assert fr.seq is None and fr.qual is None
+    assert fr.seq_len == fr.qual_len == len(first.seq)
+    assert fr.min_qual() == first.min_qual()
+    with pytest.raises(ValueError) as e_info:
+        str(fr)
+
+
+def test_fastq_error_position():
+    fqi = os.path.join(test_dir, 'bad_header_1.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+        with pytest.raises(SeqValidationError) as e_info:
+            fr.validate('x')
+    assert e_info.value.category == 'header'
+    assert e_info.value.position == {'file': 'x', 'line': 1, 'byte': None}
+
+
+def test_fastq_resync():
+    fqi = os.path.join(test_dir, 'resync.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+        assert fr.last_line == 'ACGT'
+        (header, line_no) = resync(fp, fr.last_line, fr.file_pos[1])
+        assert (header, line_no) == ('@r2/1', 6)
+        fr = FastqRead(fp, line_no, header)
+        fr.validate('x')
+    assert fr.file_pos == (7, 10)
+
+
+def test_fastq_bad_seq_char():
+    fqi = os.path.join(test_dir, 'bad_seq_1.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+        with pytest.raises(SeqValidationError) as e_info:
+            fr.validate('x')
+    assert e_info.value.category == 'alphabet'
+    assert "'X'" in str(e_info.value)
+
+
+def test_fastq_bad_qual_char():
+    fqi = os.path.join(test_dir, 'bad_qual_1.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+        with pytest.raises(SeqValidationError) as e_info:
+            fr.validate('x')
+    assert e_info.value.category == 'quality'
+
+
+def test_fastq_bad_seq_char_streamed():
+    fqi = os.path.join(test_dir, 'bad_seq_wrapped_1.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None, max_bytes=5)
+        with pytest.raises(SeqValidationError) as e_info:
+            fr.validate('x')
+    assert fr.streamed is True
+    assert e_info.value.category == 'alphabet'
+
+
+def test_fastq_min_qual_below():
+    fqi = os.path.join(test_dir, 'good_read_1.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+    q_min = fr.min_qual()
+    assert fr.min_qual(below=1000) == q_min
+    assert fr.min_qual(below=q_min + 1) == q_min
+    assert fr.min_qual(below=q_min) is None
+
+
+def test_fastq_validate_q_floor():
+    fqi = os.path.join(test_dir, 'good_read_1.fq')
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+    q_min = fr.min_qual()
+    fr.validate('x', q_floor=q_min)
+    assert fr.q_floor == q_min
+    assert fr.min_qual(below=q_min) is None
+    with open(fqi, 'r') as fp:
+        fr = FastqRead(fp, 0, None)
+    # a quality below the floor is valid, min_qual still finds it
+    fr.validate('x', q_floor=q_min + 1)
+    assert fr.q_floor is None
+    assert fr.min_qual(below=q_min + 1) == q_min
@@ -0,0 +1,113 @@
+import pytest
+import os, sys, tempfile, gzip, hashlib
+
+from cgp_seq_input_val import bgzf
+from cgp_seq_input_val.fastq_writer import FastqWriter, output_interleaved
+from cgp_seq_input_val.seq_validator import SeqValidator
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'fastq_read')
+
+def _md5(path):
+    with open(path, 'rb') as fh:
+        return hashlib.md5(fh.read()).hexdigest()
+
+def test_writer_paired_bgzf():
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, 'good_read_2.fq')
+    with tempfile.TemporaryDirectory() as tmpd:
+        writer = FastqWriter(os.path.join(tmpd, 'out'), False)
+        sv = SeqValidator(fq1, fq2, progress_pairs=0, writer=writer)
+        sv.validate()
+        outputs = sv.summary()['outputs']
+        assert [os.path.basename(o['file']) for o in outputs] == ['out_1.fq.gz', 'out_2.fq.gz']
+        for (output, original) in zip(outputs, (fq1, fq2)):
+            assert output['pairs'] == 1
+            assert output['md5'] == _md5(output['file'])
+            with open(output['file'], 'rb') as fh:
+                assert bgzf.has_eof_block(fh)
+            with gzip.open(output['file'], 'rt') as fh, open(original, 'r') as orig:
+                assert fh.read() == orig.read()
+
+def test_writer_interleaved_shards():
+    records = ''.join('@r%d/%d\nACGTACGTAC\n+\nIIIIIIIIII\n' % (i, end)
+                      for i in range(25) for end in (1, 2))
+    with tempfile.TemporaryDirectory() as tmpd:
+        fqi = os.path.join(tmpd, 'in.fq')
+        with open(fqi, 'w') as ofh:
+            ofh.write(records)
+        writer = FastqWriter(os.path.join(tmpd, 'out'), True, shard_pairs=10, compress=False)
+        sv = SeqValidator(fqi, None, progress_pairs=0, writer=writer)
+        sv.validate()
+        outputs = sv.summary()['outputs']
+        assert [os.path.basename(o['file']) for o in outputs] == ['out.0000.fq', 'out.0001.fq',
+                                                                  'out.0002.fq']
+        assert [o['pairs'] for o in outputs] == [10, 10, 5]
+        content = ''
+        for output in outputs:
+            assert output['md5'] == _md5(output['file'])
+            with open(output['file'], 'r') as fh:
+                content += fh.read()
+        assert content == records
+
+def test_writer_removed_on_failure():
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, 'diff_2.fq')
+    with tempfile.TemporaryDirectory() as tmpd:
+        writer = FastqWriter(os.path.join(tmpd, 'out'), False)
+        sv = SeqValidator(fq1, fq2, progress_pairs=0, writer=writer)
+        with pytest.raises(SeqValidationError):
+            sv.validate()
+        assert os.listdir(tmpd) == []
+
+def test_writer_interleave_paired_input():
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, 'good_read_2.fq')
+    fqi = os.path.join(test_dir, 'good_read_i.fq')
+    with tempfile.TemporaryDirectory() as tmpd:
+        writer = FastqWriter(os.path.join(tmpd, 'out'), output_interleaved('interleaved', False))
+        SeqValidator(fq1, fq2, progress_pairs=0, writer=writer).validate()
+        assert [os.path.basename(o['file']) for o in writer.outputs] == ['out.fq.gz']
+        with gzip.open(writer.outputs[0]['file'], 'rt') as fh, open(fqi, 'r') as orig:
+            assert fh.read() == orig.read()
+
+def test_writer_deinterleave():
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, 'good_read_2.fq')
+    fqi = os.path.join(test_dir, 'good_read_i.fq')
+    with tempfile.TemporaryDirectory() as tmpd:
+        writer = FastqWriter(os.path.join(tmpd, 'out'), output_interleaved('paired', True),
+                             compress=False)
+        SeqValidator(fqi, None, progress_pairs=0, writer=writer).validate()
+        for (output, original) in zip(writer.outputs, (fq1, fq2)):
+            with open(output['file'], 'r') as fh, open(original, 'r') as orig:
+                assert fh.read() == orig.read()
+
+def test_output_interleaved():
+    assert output_interleaved('same', True) is True
+    assert output_interleaved('same', False) is False
+    assert output_interleaved('interleaved', False) is True
+    assert output_interleaved('paired', True) is False
+
+def test_writer_close_failure():
+    # a failing output doesn't leave the other's thread running, and the
+    # validation's outputs are removed
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, 'good_read_2.fq')
+    with tempfile.TemporaryDirectory() as tmpd:
+        writer = FastqWriter(os.path.join(tmpd, 'out'), False, compress=False)
+        real_open = writer._open
+        handles = []
+        def failing_open(end):
+            handles.append(real_open(end))
+            if end == 1:
+                def fail():
+                    raise OSError(28, 'No space left on device')
+                handles[-1].handle.close = fail
+            return handles[-1]
+        writer._open = failing_open
+        sv = SeqValidator(fq1, fq2, progress_pairs=0, writer=writer)
+        with pytest.raises(OSError):
+            sv.validate()
+        assert [handle.thread for handle in handles] == [None, None]
+        assert os.listdir(tmpd) == []
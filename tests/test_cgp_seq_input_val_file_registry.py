@@ -0,0 +1,102 @@
+import pytest
+import os, shutil, tempfile
+
+from cgp_seq_input_val import file_registry
+from cgp_seq_input_val.error_classes import ValidationError
+from cgp_seq_input_val.file_registry import FileRegistry, RegisteredFile
+from cgp_seq_input_val.manifest import Manifest
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'file_registry')
+
+def _data(name):
+    return os.path.join(test_dir, name)
+
+@pytest.fixture
+def small_fingerprint(monkeypatch):
+    # fixtures are 48 bytes, 'middle.txt' differs from 'ends.txt' at byte 24
+    monkeypatch.setattr(file_registry, 'FINGERPRINT_BYTES', 16)
+
+def test_fingerprint_ends_only(small_fingerprint):
+    (ends, middle) = (_data('ends.txt'), _data('middle.txt'))
+    assert file_registry.fingerprint(ends, 48) == file_registry.fingerprint(middle, 48)
+    assert file_registry.checksum(ends) != file_registry.checksum(middle)
+
+def test_submit(small_fingerprint):
+    (first, renamed, middle) = (_data('ends.txt'), _data('ends_copy.txt'), _data('middle.txt'))
+    with tempfile.TemporaryDirectory() as tmpd:
+        registry = FileRegistry(os.path.join(tmpd, 'registry.db'))
+        assert registry.submit('m1.tsv', [RegisteredFile('first', first)]) == ([], [])
+        # the registered file is only hashed once a candidate matches it
+        assert registry.db.execute('SELECT checksum FROM files').fetchone() == (None,)
+        # middle has the same size and fingerprint, but differs in the middle
+        (dups, unconfirmed) = registry.submit('m2.tsv', [RegisteredFile('middle', middle),
+                                                         RegisteredFile('renamed', renamed)])
+        assert unconfirmed == []
+        assert [(reg.label, other, path) for (reg, other, path) in dups] == \
+            [('renamed', os.path.abspath('m1.tsv'), first)]
+        assert registry.db.execute('SELECT checksum FROM files').fetchone()[0] is not None
+        # nothing registered for a manifest with duplicates
+        assert registry.db.execute("SELECT count(*) FROM files").fetchone() == (1,)
+        # resubmitting the same manifest replaces its files
+        assert registry.submit('m1.tsv', [RegisteredFile('middle', middle)]) == ([], [])
+        assert registry.submit('m2.tsv', [RegisteredFile('first', first)]) == ([], [])
+        registry.close()
+
+def test_submit_within_list():
+    (file_a, file_b) = (_data('read.fq'), _data('read_copy.fq'))
+    with tempfile.TemporaryDirectory() as tmpd:
+        registry = FileRegistry(os.path.join(tmpd, 'registry.db'))
+        (dups, _) = registry.submit('m.tsv', [RegisteredFile('a', file_a),
+                                              RegisteredFile('b', file_b)])
+        assert [(reg.label, other, path) for (reg, other, path) in dups] == [('b', None, file_a)]
+        registry.close()
+
+def test_unconfirmed_when_gone():
+    with tempfile.TemporaryDirectory() as tmpd:
+        first = os.path.join(tmpd, 'first.fq')
+        shutil.copy(_data('read.fq'), first)
+        registry = FileRegistry(os.path.join(tmpd, 'registry.db'))
+        registry.submit('m1.tsv', [RegisteredFile('first', first)])
+        copy = os.path.join(tmpd, 'copy.fq')
+        shutil.move(first, copy)
+        (dups, unconfirmed) = registry.submit('m2.tsv', [RegisteredFile('copy', copy)])
+        # only a warning, the files are registered
+        assert dups == []
+        assert [(reg.label, path) for (reg, _, path) in unconfirmed] == [('copy', first)]
+        assert registry.db.execute("SELECT count(*) FROM files").fetchone() == (2,)
+        registry.close()
+
+def test_checksum_without_lock(small_fingerprint, monkeypatch):
+    (first, renamed) = (_data('ends.txt'), _data('ends_copy.txt'))
+    with tempfile.TemporaryDirectory() as tmpd:
+        db_path = os.path.join(tmpd, 'registry.db')
+        registry = FileRegistry(db_path)
+        registry.submit('m1.tsv', [RegisteredFile('first', first)])
+        real_checksum = file_registry.checksum
+        def locked_checksum(path):
+            # another connection can write, so the lock isn't held
+            other = FileRegistry(db_path)
+            other.db.execute('BEGIN IMMEDIATE')
+            other.db.execute('ROLLBACK')
+            other.close()
+            return real_checksum(path)
+        monkeypatch.setattr(file_registry, 'checksum', locked_checksum)
+        monkeypatch.setattr(file_registry, 'LOCK_TIMEOUT', 0)
+        (dups, _) = registry.submit('m2.tsv', [RegisteredFile('renamed', renamed)])
+        assert [(reg.label, path) for (reg, _, path) in dups] == [('renamed', first)]
+        registry.close()
+
+def test_manifest_registry():
+    # second/b_1.fq is first/a_1.fq under a new name
+    (man_1, man_2) = (_data('first/manifest.tsv'), _data('second/manifest.tsv'))
+    with tempfile.TemporaryDirectory() as tmpd:
+        registry = os.path.join(tmpd, 'registry.db')
+        Manifest(man_1).validate(checkFiles=True, registry=registry)
+        with pytest.raises(ValidationError) as e_info:
+            Manifest(man_2).validate(checkFiles=True, registry=registry)
+        message = str(e_info.value)
+        assert "1 file(s) have already been submitted" in message
+        assert "'b_1.fq' ('File' - line 10) is the same as %s of %s" % (
+            _data('first/a_1.fq'), man_1) in message
+        # validating the first again is not a duplicate of itself
+        Manifest(man_1).validate(checkFiles=True, registry=registry)
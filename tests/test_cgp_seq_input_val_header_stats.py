@@ -0,0 +1,77 @@
+import pytest
+import os, tempfile
+from collections import Counter
+
+from cgp_seq_input_val.header_stats import HeaderStats, SpaceSaving
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+class Read(object):
+    def __init__(self, header):
+        self.header = header
+        self.name = header[1:].split(None, 1)[0].rsplit('/', 1)[0]
+
+def test_space_saving_exact_within_k():
+    sketch = SpaceSaving(4)
+    for item in 'AABACCAB':
+        sketch.add(item)
+    sketch.add('C', 3)
+    assert sketch.top() == [('C', 5, 0), ('A', 4, 0), ('B', 2, 0)]
+    assert sketch.total == 11
+
+def test_space_saving_bounds():
+    items = ['hop%d' % (i) for i in range(500)] + ['ACGT'] * 400 + ['TTGA'] * 300
+    items.sort(key=lambda item: hash(item) % 97)
+    sketch = SpaceSaving(10)
+    for item in items:
+        sketch.add(item)
+    truth = Counter(items)
+    top = sketch.top()
+    assert len(top) == 10
+    # frequent items are always tracked, counts are within their error
+    assert [entry[0] for entry in top[:2]] == ['ACGT', 'TTGA']
+    for (item, count, error) in top:
+        assert count - error <= truth[item] <= count
+
+def test_space_saving_k_below_one():
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+
+def test_casava_names():
+    stats = HeaderStats()
+    for (tile, barcode) in ((1101, 'ACGT+TTGA'), (1101, 'ACGT+TTGA'), (1102, 'ACGT+TTGA'),
+                            (1101, 'ACGA+TTGA')):
+        stats.add(Read('@M1:7:FC1:2:%d:10:20/1 1:N:0:%s' % (tile, barcode)))
+    stats.add(Read('@M1:7:FC2:1:1101:10:20/1 1:N:0:ACGT+TTGA'))
+    stats.add(Read('@readname/1'))
+    summary = stats.summary()
+    assert summary['lanes'] == {'FC1:2': 4, 'FC2:1': 1}
+    assert summary['tiles'] == {'FC1:2:1101': 3, 'FC1:2:1102': 1, 'FC2:1:1101': 1}
+    assert summary['unparsed'] == 1
+    assert summary['barcodes']['reads'] == 5
+    assert summary['barcodes']['top'] == [['ACGT+TTGA', 4, 0], ['ACGA+TTGA', 1, 0]]
+
+def test_older_names():
+    stats = HeaderStats()
+    stats.add(Read('@HS27_17643:2:2110:8108:93084#6/1'))
+    stats.add(Read('@HS27_17643:2:2110:8109:93084#ACGTAC/1'))
+    stats.add(Read('@HS27_17643:3:1101:8109:93084/1'))
+    summary = stats.summary()
+    assert summary['lanes'] == {'HS27_17643:2': 2, 'HS27_17643:3': 1}
+    assert summary['tiles'] == {'HS27_17643:2:2110': 2, 'HS27_17643:3:1101': 1}
+    assert summary['barcodes']['top'] == [['6', 1, 0], ['ACGTAC', 1, 0]]
+    assert summary['barcodes']['reads'] == 2
+
+def test_validator_header_stats():
+    with tempfile.TemporaryDirectory() as tmpd:
+        fastq = os.path.join(tmpd, 'i.fq')
+        with open(fastq, 'w') as ofh:
+            for i in range(6):
+                for end in ('1', '2'):
+                    ofh.write('@M1:7:FC1:%d:1101:%d:20/%s %s:N:0:ACGT\nACGT\n+\nIIII\n'
+                              % (1 + i % 2, i, end, end))
+        validator = SeqValidator(fastq, progress_pairs=0, header_top_k=5)
+        validator.validate()
+        summary = validator.summary()
+        assert summary['header_stats']['lanes'] == {'FC1:1': 3, 'FC1:2': 3}
+        assert summary['header_stats']['barcodes']['top'] == [['ACGT', 6, 0]]
+        assert 'header_stats' not in SeqValidator(fastq, progress_pairs=0).summary()
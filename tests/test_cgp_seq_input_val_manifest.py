@@ -40,6 +40,39 @@ def test_manifest_write():
         manifest.validate()
         (tsv_file, json_file) = manifest.write(tmpd) # output new manifest in tsv and json.
 
+def test_manifest_write_legacy_json():
+    # streamed output must match json.dump of the whole document
+    with tempfile.TemporaryDirectory() as tmpd:
+        manifest = Manifest(os.path.join(test_data, 'file_set_good', 'files_good.tsv'))
+        manifest.validate()
+        (tsv_file, json_file) = manifest.write(tmpd)
+        with open(json_file) as ifh:
+            written = ifh.read()
+        assert written == json.dumps(manifest.for_json(), sort_keys=True, indent=4)
+
+def test_manifest_write_legacy_json_no_rows():
+    with tempfile.TemporaryDirectory() as tmpd:
+        infile = os.path.join(tmpd, 'manifest.tsv')
+        _write_manifest(infile, [])
+        manifest = Manifest(infile)
+        manifest.validate()
+        (tsv_file, json_file) = manifest.write(tmpd)
+        with open(json_file) as ifh:
+            assert ifh.read() == json.dumps(manifest.for_json(), sort_keys=True, indent=4)
+
+def test_manifest_write_ndjson():
+    with tempfile.TemporaryDirectory() as tmpd:
+        manifest = Manifest(os.path.join(test_data, 'file_set_good', 'files_good.tsv'))
+        manifest.validate()
+        (tsv_file, json_file) = manifest.write(tmpd, ndjson=True)
+        assert json_file.endswith('.ndjson')
+        with open(json_file) as ifh:
+            lines = [json.loads(line) for line in ifh]
+        expected = manifest.for_json()
+        assert lines[0] == {'type': expected['type'], 'version': expected['version'],
+                            'header': expected['header']}
+        assert lines[1:] == expected['body']
+
 def test_manifest_uuid():
     with tempfile.TemporaryDirectory() as tmpd:
         manifest = Manifest(os.path.join(test_data, 'file_set_good', 'files_good.tsv'))
@@ -226,3 +259,109 @@ def test_manifest_file_set_good():
     manifest = Manifest(infile)
     manifest.validate(True)
     as_json = json.dumps(manifest.for_json())
+
+def test_manifest_pair_check_good():
+    manifest = Manifest(os.path.join(test_data, 'pair_check', 'good.tsv'))
+    manifest.validate(pairCheck=10)
+
+def test_manifest_pair_check_bad_rows():
+    manifest = Manifest(os.path.join(test_data, 'pair_check', 'bad.tsv'))
+    with pytest.raises(ValidationError) as e_info:
+        manifest.validate(pairCheck=10, workers=2)
+    message = str(e_info.value)
+    assert message.startswith('Pair check failed for 4 row(s)')
+    for line in (11, 12, 13, 14):
+        assert 'line %d:' % (line) in message
+    assert 'line 10:' not in message
+
+### Incremental (row store) tests
+
+ROWS_HEADER = ('Our Ref:\nForm type:\tIMPORT\nForm version:\t1.0\nYour Ref:\tWibble\n'
+               'Species - Build:\tHUMAN - GRCh37d5\nSeq Protocol:\tWGS\nData Type:\tDNA\n'
+               'Mark Duplicates:\tY\n'
+               'Group_ID\tSample\tNormal_Tissue\tGroup_Control\tLibrary\tFile\tFile_2\n')
+
+def _write_manifest(path, rows):
+    with open(path, 'w') as ofh:
+        ofh.write(ROWS_HEADER)
+        for row in rows:
+            ofh.write('\t'.join(row) + '\n')
+
+def _spy_lines(monkeypatch, method):
+    checked = []
+    original = getattr(Body, method)
+    def spy(self, rules, rows=None):
+        checked.extend(line for (line, _) in self._lines(rows))
+        return original(self, rules, rows)
+    monkeypatch.setattr(Body, method, spy)
+    return checked
+
+def test_manifest_row_store_changed_rows(monkeypatch):
+    rows = [['1', 'Bob', 'N', 'N', '1', 'a_1.fq', 'a_2.fq'],
+            ['1', 'Stuart', 'Y', 'Y', '1', 'b_1.fq', 'b_2.fq'],
+            ['2', 'Kevin', 'Y', 'N', '1', 'c_1.fq', 'c_2.fq']]
+    with tempfile.TemporaryDirectory() as tmpd:
+        infile = os.path.join(tmpd, 'manifest.tsv')
+        store = os.path.join(tmpd, 'manifest.tsv.rows.json')
+        _write_manifest(infile, rows)
+        Manifest(infile).validate(store=store)
+        with open(store) as ifh:
+            assert len(json.load(ifh)['rows']) == 3
+        checked = _spy_lines(monkeypatch, 'fields_have_values')
+        rows[1][1] = 'Dave'
+        _write_manifest(infile, rows)
+        Manifest(infile).validate(store=store)
+        assert checked == [11]
+
+def test_manifest_row_store_after_failure(monkeypatch):
+    rows = [['1', 'Bob', 'N', 'N', '1', 'a_1.fq', 'a_2.fq'],
+            ['1', 'Stuart', 'X', 'N', '1', 'b_1.fq', 'b_2.fq'],
+            ['2', 'Kevin', 'Y', 'N', '1', 'c_1.fq', 'c_2.fq']]
+    with tempfile.TemporaryDirectory() as tmpd:
+        infile = os.path.join(tmpd, 'manifest.tsv')
+        store = os.path.join(tmpd, 'manifest.tsv.rows.json')
+        _write_manifest(infile, rows)
+        with pytest.raises(ValidationError):
+            Manifest(infile).validate(store=store)
+        checked = _spy_lines(monkeypatch, 'field_values_valid')
+        rows[1][2] = 'Y'
+        _write_manifest(infile, rows)
+        Manifest(infile).validate(store=store)
+        # row 1 passed before the failure, row 3 was never reached
+        assert checked == [11, 12]
+
+def test_manifest_row_store_group_limits():
+    rows = [['1', 'Bob', 'N', 'Y', '1', 'a_1.fq', 'a_2.fq'],
+            ['1', 'Stuart', 'Y', 'N', '1', 'b_1.fq', 'b_2.fq'],
+            ['2', 'Kevin', 'Y', 'Y', '1', 'c_1.fq', 'c_2.fq']]
+    with tempfile.TemporaryDirectory() as tmpd:
+        infile = os.path.join(tmpd, 'manifest.tsv')
+        store = os.path.join(tmpd, 'manifest.tsv.rows.json')
+        _write_manifest(infile, rows)
+        Manifest(infile).validate(store=store)
+        # second control in group 1
+        rows[1][3] = 'Y'
+        _write_manifest(infile, rows)
+        manifest = Manifest(infile)
+        with pytest.raises(ValidationError) as e_info:
+            manifest.validate(store=store)
+        assert 'Group_Control' in str(e_info.value)
+        assert manifest.body.affected_groups(manifest.config['body']['validate']) == \
+            {'Group_ID': {'1'}}
+
+def test_manifest_row_store_removed_row_group():
+    rows = [['1', 'Bob', 'N', 'Y', '1', 'a_1.fq', 'a_2.fq'],
+            ['2', 'Kevin', 'Y', 'Y', '1', 'c_1.fq', 'c_2.fq']]
+    with tempfile.TemporaryDirectory() as tmpd:
+        infile = os.path.join(tmpd, 'manifest.tsv')
+        store = os.path.join(tmpd, 'manifest.tsv.rows.json')
+        _write_manifest(infile, rows)
+        Manifest(infile).validate(store=store)
+        _write_manifest(infile, rows[:1])
+        manifest = Manifest(infile)
+        manifest.validate(store=store)
+        with open(store) as ifh:
+            assert len(json.load(ifh)['rows']) == 1
+        # only the group of the removed row needed its limits re-evaluating
+        assert manifest.body.affected_groups(manifest.config['body']['validate']) == \
+            {'Group_ID': {'2'}}
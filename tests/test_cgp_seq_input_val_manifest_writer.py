@@ -0,0 +1,32 @@
+import pytest
+import io, json
+
+from cgp_seq_input_val.manifest_writer import JsonWriter, NdjsonWriter
+
+HEADER = {'Your Ref:': 'Wib"ble', 'Our Ref:': 'x'}
+ROWS = [{'Sample': 'Bob', 'File': 'a.fq'},
+        {'Sample': 'quote " back \\ slash\nnewline\ttab', 'File': 'café.fq'},
+        {'Sample': 'x\\', 'File': '", "'}]
+
+def _doc(rows):
+    return {'type': 'IMPORT', 'version': '1.0', 'header': HEADER, 'body': rows}
+
+@pytest.mark.parametrize('rows', [[], ROWS[:1], ROWS])
+def test_json_writer_matches_json_dump(rows):
+    out = io.StringIO()
+    writer = JsonWriter(out, 'IMPORT', '1.0', HEADER)
+    for row in rows:
+        writer.row(row)
+    writer.close()
+    assert out.getvalue() == json.dumps(_doc(rows), sort_keys=True, indent=4)
+
+def test_ndjson_writer():
+    out = io.StringIO()
+    writer = NdjsonWriter(out, 'IMPORT', '1.0', HEADER)
+    for row in ROWS:
+        writer.row(row)
+    writer.close()
+    lines = out.getvalue().split('\n')
+    assert lines[-1] == ''
+    assert json.loads(lines[0]) == {'type': 'IMPORT', 'version': '1.0', 'header': HEADER}
+    assert [json.loads(line) for line in lines[1:-1]] == ROWS
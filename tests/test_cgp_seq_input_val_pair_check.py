@@ -0,0 +1,52 @@
+import pytest
+import os, tempfile
+
+from cgp_seq_input_val import pair_check
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'fastq_read')
+pc_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'pair_check')
+
+def test_pair_check_good_paired_gz():
+    pair_check.check_files(os.path.join(test_dir, 'good_read_1.fq.gz'),
+                           os.path.join(test_dir, 'good_read_2.fq.gz'))
+
+def test_pair_check_good_interleaved():
+    pair_check.check_files(os.path.join(test_dir, 'good_read_i.fq.gz'))
+
+def test_pair_check_swapped():
+    with pytest.raises(SeqValidationError) as e_info:
+        pair_check.check_files(os.path.join(test_dir, 'good_read_2.fq'),
+                               os.path.join(test_dir, 'good_read_1.fq'))
+    assert e_info.value.category == 'pair_end'
+
+def test_pair_check_mixed_extensions():
+    with pytest.raises(SeqValidationError):
+        pair_check.check_files(os.path.join(test_dir, 'good_read_1.fq.gz'),
+                               os.path.join(test_dir, 'good_read_2.fq'))
+
+def test_pair_check_not_gzip():
+    with pytest.raises(SeqValidationError) as e_info:
+        pair_check.check_gzip_head(os.path.join(pc_dir, 'not_gzip.fq.gz'))
+    assert e_info.value.category == 'gzip'
+
+def test_pair_check_corrupt_gzip():
+    with open(os.path.join(test_dir, 'good_read_i.fq.gz'), 'rb') as fh:
+        data = bytearray(fh.read())
+    data[26:34] = b'\xff' * 8  # damage the deflate stream, after the header
+    with tempfile.TemporaryDirectory() as tmpd:
+        bad = os.path.join(tmpd, 'bad.fq.gz')
+        with open(bad, 'wb') as ofh:
+            ofh.write(data)
+        with pytest.raises(SeqValidationError) as e_info:
+            pair_check.check_files(bad)
+        assert e_info.value.category == 'gzip'
+
+def test_pair_check_rows():
+    rows = [(10, os.path.join(test_dir, 'good_read_1.fq'), os.path.join(test_dir, 'good_read_2.fq')),
+            (11, os.path.join(test_dir, '2_reads_1.fq'), os.path.join(test_dir, 'diff_2.fq')),
+            (12, os.path.join(pc_dir, 'missing.fq'), None)]
+    failed = pair_check.check_rows(rows, pairs=10, workers=2)
+    assert [line for (line, _) in failed] == [11, 12]
+    assert 'should be a match' in failed[0][1]
+    assert 'missing.fq' in failed[1][1]
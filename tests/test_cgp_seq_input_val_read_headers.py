@@ -0,0 +1,50 @@
+import pytest
+import os
+
+from cgp_seq_input_val import read_headers
+from cgp_seq_input_val.error_classes import SeqValidationError
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'read_headers')
+
+def _fq(name):
+    return os.path.join(test_dir, name)
+
+def test_detect():
+    assert read_headers.detect('@HS27_17643:2:2110:1:1#6/1').name == 'suffix'
+    assert read_headers.detect('@M1:7:FC1:2:1101:10:20 1:N:0:ACGT+TTGA').name == 'casava'
+    assert read_headers.detect('@SRR000001.1 length=4').name == 'sra'
+    assert read_headers.detect('@SRR000001.1.2').name == 'sra'
+    assert read_headers.detect('read_without_at') is None
+
+def test_get_format():
+    assert read_headers.get_format(read_headers.AUTO) is None
+    assert read_headers.get_format('casava').name == 'casava'
+    with pytest.raises(SeqValidationError) as e_info:
+        read_headers.get_format('nope')
+    assert 'nope' in str(e_info.value)
+
+def test_casava_pair():
+    validator = SeqValidator(_fq('casava_1.fq'), _fq('casava_2.fq'), progress_pairs=0)
+    validator.validate()
+    assert validator.summary()['header_format'] == 'casava'
+    assert validator.pairs == 3
+
+def test_casava_swapped_ends():
+    with pytest.raises(SeqValidationError):
+        SeqValidator(_fq('casava_swapped_1.fq'), _fq('casava_swapped_2.fq'),
+                     progress_pairs=0).validate()
+
+def test_sra_interleaved_without_end():
+    validator = SeqValidator(_fq('sra_i.fq'), progress_pairs=0, header_format='sra')
+    validator.validate()
+    assert validator.pairs == 2
+    assert validator.summary()['header_format'] == 'sra'
+    # pair names must still match by position
+    with pytest.raises(SeqValidationError):
+        SeqValidator(_fq('sra_unpaired_i.fq'), progress_pairs=0).validate()
+
+def test_forced_format_mismatch():
+    with pytest.raises(SeqValidationError) as e_info:
+        SeqValidator(_fq('suffix_i.fq'), progress_pairs=0, header_format='casava').validate()
+    assert 'casava format' in str(e_info.value)
@@ -0,0 +1,144 @@
+import pytest
+import os, io, gzip, shutil, tempfile, threading, time
+
+from cgp_seq_input_val import compression
+from cgp_seq_input_val.error_classes import SeqValidationError
+from cgp_seq_input_val.reader import InputReader, FollowReader, input_reader, DEFAULT_READ_SIZE
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'fastq_read')
+
+def _fq(name):
+    return os.path.join(test_dir, name)
+
+READERS = [InputReader(read_size=7),
+           InputReader(read_size=7, prefetch=2),
+           InputReader(read_size=64, drop_cache=True),
+           InputReader(prefetch=1, drop_cache=True)]
+
+@pytest.mark.parametrize('reader', READERS)
+def test_read_matches(reader):
+    with open(_fq('multi_line_1.fq'), 'rb') as ifh:
+        expected = ifh.read()
+    with reader.open(_fq('multi_line_1.fq')) as fh:
+        assert fh.read() == expected
+        assert fh.read() == b''
+
+@pytest.mark.parametrize('missing', [('preadv',), ('preadv', 'pread')])
+def test_read_without_preadv(monkeypatch, missing):
+    for name in missing:
+        monkeypatch.delattr(os, name, raising=False)
+    with open(_fq('multi_line_1.fq'), 'rb') as ifh:
+        expected = ifh.read()
+    for reader in READERS:
+        with reader.open(_fq('multi_line_1.fq')) as fh:
+            assert fh.read() == expected
+
+@pytest.mark.parametrize('reader', READERS)
+def test_validate_with_reader(reader):
+    paired = SeqValidator(_fq('good_read_1.fq.gz'), _fq('good_read_2.fq.gz'), progress_pairs=0,
+                          reader=reader)
+    paired.validate()
+    assert paired.pairs == 1
+    interleaved = SeqValidator(_fq('good_read_i.fq.bz2'), progress_pairs=0, reader=reader)
+    interleaved.validate()
+    assert interleaved.pairs == 1
+
+def test_open_text_with_reader():
+    with compression.open_text(_fq('good_read_i.fq'), reader=InputReader(read_size=5)) as fh:
+        with open(_fq('good_read_i.fq')) as expected:
+            assert fh.read() == expected.read()
+
+def test_prefetch_stops_on_close():
+    with tempfile.TemporaryDirectory() as tmpd:
+        big = os.path.join(tmpd, 'big.fq')
+        with open(big, 'wb') as ofh:
+            ofh.write(b'@r\nACGT\n+\nIIII\n' * 10000)
+        before = threading.active_count()
+        fh = InputReader(read_size=16, prefetch=2).open(big)
+        assert fh.read(15) == b'@r\nACGT\n+\nIIII\n'
+        fh.close()  # stopped early, the thread must not be left waiting
+        assert threading.active_count() == before
+
+def test_input_reader_options():
+    assert input_reader() is None
+    reader = input_reader(prefetch=2)
+    assert reader.read_size == DEFAULT_READ_SIZE
+    assert reader.prefetch == 2
+    assert input_reader(read_size=1024).read_size == 1024
+    assert input_reader(drop_cache=True).drop_cache
+
+def _transfer(path, pairs, compress=False, marker=None, complete=True, delay=0.1, ends='12'):
+    """Writes an interleaved fastq slowly on a thread, as a transfer would"""
+    def write():
+        time.sleep(delay)  # validation starts before the file exists
+        raw = open(path, 'wb')
+        ofh = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+        for i in range(pairs):
+            for end in ends:
+                ofh.write(b'@r%d/%s\nACGT\n+\nIIII\n' % (i, end.encode()))
+            ofh.flush()  # a sync flush, so far can be inflated
+            raw.flush()
+            time.sleep(0.01)
+        if complete:
+            ofh.close()
+        raw.close()
+        if marker:
+            open(marker, 'w').close()
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+def test_follow_marker():
+    with tempfile.TemporaryDirectory() as tmpd:
+        fastq = os.path.join(tmpd, 'i.fq.gz')
+        marker = os.path.join(tmpd, 'done')
+        thread = _transfer(fastq, 30, compress=True, marker=marker)
+        # stable is long, only the marker can end validation in time
+        follow = FollowReader(marker=marker, stable=30, poll=0.01)
+        validator = SeqValidator(fastq, progress_pairs=0, reader=follow)
+        validator.validate()
+        thread.join()
+        assert validator.pairs == 30
+        assert validator.summary()['compression']['codec'] == 'gzip'
+
+def test_follow_stable_paired():
+    with tempfile.TemporaryDirectory() as tmpd:
+        file_1 = os.path.join(tmpd, 'p_1.fq')
+        file_2 = os.path.join(tmpd, 'p_2.fq')
+        threads = [_transfer(file_1, 20, ends='1'), _transfer(file_2, 20, ends='2')]
+        follow = input_reader(follow=True, stable=0.3)
+        follow.poll = 0.01
+        validator = SeqValidator(file_1, file_2, progress_pairs=0, reader=follow)
+        validator.validate()
+        for thread in threads:
+            thread.join()
+        assert validator.pairs == 20
+
+def test_follow_finished_file():
+    # already complete, not waited on for stable seconds
+    with tempfile.TemporaryDirectory() as tmpd:
+        fastq = os.path.join(tmpd, 'i.fq')
+        shutil.copy(_fq('good_read_i.fq'), fastq)
+        past = time.time() - 120
+        os.utime(fastq, (past, past))
+        started = time.monotonic()
+        validator = SeqValidator(fastq, progress_pairs=0, reader=FollowReader(stable=60))
+        validator.validate()
+        assert validator.pairs == 1
+        assert time.monotonic() - started < 30
+
+def test_follow_truncated():
+    with tempfile.TemporaryDirectory() as tmpd:
+        fastq = os.path.join(tmpd, 'i.fq.gz')
+        thread = _transfer(fastq, 5, compress=True, complete=False, delay=0)
+        follow = FollowReader(stable=0.3, poll=0.01)
+        with pytest.raises(SeqValidationError) as e_info:
+            SeqValidator(fastq, progress_pairs=0, reader=follow).validate()
+        thread.join()
+        assert e_info.value.category == 'truncated'
+
+def test_follow_no_decompressor():
+    with pytest.raises(SeqValidationError):
+        SeqValidator(_fq('good_read_i.fq.gz'), progress_pairs=0, decompressor='gzip',
+                     reader=FollowReader(stable=0))
@@ -0,0 +1,91 @@
+import pytest
+import os, shutil
+
+from cgp_seq_input_val import record_count
+from cgp_seq_input_val.error_classes import SeqValidationError
+from cgp_seq_input_val.record_count import RecordCounter
+from cgp_seq_input_val.seq_validator import get_validator
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'record_count')
+
+def _fq(name):
+    return os.path.join(test_dir, name)
+
+# 5000 pairs of each, the BGZF files are more than one block
+@pytest.mark.parametrize('names,threads', [(('plain_1.fq', 'plain_2.fq'), 1),
+                                           (('gzip_1.fq.gz', 'gzip_2.fq.gz'), 1),
+                                           (('bgzf_1.fq.gz', 'bgzf_2.fq.gz'), 1),
+                                           (('bgzf_1.fq.gz', 'bgzf_2.fq.gz'), 3)])
+def test_count_paired(names, threads):
+    (file_a, file_b) = (_fq(names[0]), _fq(names[1]))
+    counter = RecordCounter(file_a, file_b, threads=threads)
+    counter.validate()
+    summary = counter.summary()
+    assert summary['pairs'] == 5000
+    assert summary['records'] == {file_a: 5000, file_b: 5000}
+    assert summary['mode'] == 'count'
+
+def test_count_interleaved_no_final_newline():
+    counter = RecordCounter(_fq('no_final_newline_i.fq'))
+    counter.validate()
+    assert counter.pairs == 1
+
+def test_count_mismatch():
+    with pytest.raises(SeqValidationError) as e_info:
+        RecordCounter(_fq('ten_1.fq'), _fq('nine_2.fq')).validate()
+    assert e_info.value.category == 'pair_count'
+    with pytest.raises(SeqValidationError) as e_info:
+        RecordCounter(_fq('odd_i.fq')).validate()
+    assert e_info.value.category == 'pair_count'
+
+def test_count_multi_line_rejected():
+    with pytest.raises(SeqValidationError) as e_info:
+        RecordCounter(_fq('multi_line_i.fq')).validate()
+    assert 'not a 4 line fastq record' in str(e_info.value)
+
+def test_count_partial_record():
+    with pytest.raises(SeqValidationError) as e_info:
+        RecordCounter(_fq('partial_i.fq'), sample_records=1).validate()
+    assert e_info.value.category == 'corrupt'
+
+def test_count_truncated_gzip():
+    with pytest.raises(SeqValidationError) as e_info:
+        RecordCounter(_fq('truncated_1.fq.gz')).validate()
+    assert e_info.value.category == 'truncated'
+
+def test_count_get_validator():
+    path = _fq('odd_i.fq')
+    assert isinstance(get_validator(path, count=True, max_errors=0), RecordCounter)
+    with pytest.raises(SeqValidationError) as e_info:
+        get_validator(path, count=True, dup_mem=1024)
+    assert str(e_info.value) == "--count can't be combined with: --check-duplicates"
+    with pytest.raises(SeqValidationError):
+        get_validator(_fq('x.bam'), count=True)
+
+def test_count_extension_checked():
+    # the same names seq-valid accepts
+    with pytest.raises(SeqValidationError) as e_info:
+        RecordCounter(_fq('i.txt'))
+    assert 'fastq|fq' in str(e_info.value)
+
+@pytest.mark.skipif(shutil.which('gzip') is None, reason='gzip not on PATH')
+def test_count_external_decompressor():
+    counter = RecordCounter(_fq('gzip_1.fq.gz'), _fq('gzip_2.fq.gz'), decompressor='gzip')
+    counter.validate()
+    assert counter.summary()['compression']['decompressor'] == 'gzip'
+    assert counter.pairs == 5000
+
+def test_count_sample_bytes(monkeypatch):
+    # long reads reach the byte limit before sample_records
+    monkeypatch.setattr(record_count, 'COUNT_BLOCK', 4096)
+    monkeypatch.setattr(record_count, 'SAMPLE_BYTES', 10000)
+    sampled = []
+    check_sample = RecordCounter._check_sample
+    def spy(self, filename, head, complete):
+        sampled.append(len(head))
+        check_sample(self, filename, head, complete)
+    monkeypatch.setattr(RecordCounter, '_check_sample', spy)
+    counter = RecordCounter(_fq('plain_1.fq'), _fq('plain_2.fq'))
+    counter.validate()
+    assert counter.pairs == 5000
+    assert sampled == [12288, 12288]
@@ -0,0 +1,87 @@
+import pytest
+import os, sys, tempfile, gzip
+
+from cgp_seq_input_val import bgzf
+from cgp_seq_input_val.record_index import RecordIndex, offset_type
+from cgp_seq_input_val.seq_validator import SeqValidator
+from cgp_seq_input_val.error_classes import SeqValidationError
+
+PAIRS = 25
+
+def _fastq(ends=('1', '2')):
+    records = []
+    for i in range(PAIRS):
+        for end in ends:
+            records.append('@r%d/%s\nACGTACGTAC\n+\nIIIIIIIIII\n' % (i, end))
+    return ''.join(records).encode('ascii')
+
+def _write(path, data, kind):
+    if kind == 'plain':
+        with open(path, 'wb') as ofh:
+            ofh.write(data)
+    elif kind == 'gzip':
+        with gzip.open(path, 'wb') as ofh:
+            ofh.write(data)
+    else:
+        # small blocks so records span block boundaries
+        with open(path, 'wb') as ofh:
+            for i in range(0, len(data), 100):
+                ofh.write(bgzf.compress_block(data[i:i + 100]))
+            ofh.write(bgzf.EOF_BLOCK)
+
+@pytest.mark.parametrize('kind,expected', [('plain', 'byte'),
+                                           ('gzip', 'uncompressed'),
+                                           ('bgzf', 'bgzf')])
+def test_index_interleaved(kind, expected):
+    with tempfile.TemporaryDirectory() as tmpd:
+        fqi = os.path.join(tmpd, 'in_i.fq' + ('' if kind == 'plain' else '.gz'))
+        _write(fqi, _fastq(), kind)
+        sv = SeqValidator(fqi, None, progress_pairs=0, index_every=1)
+        sv.validate()
+        idx_file = os.path.join(tmpd, 'in.sqi')
+        sv.index.write(idx_file)
+        index = RecordIndex.load(idx_file)
+        assert index.pairs == PAIRS
+        assert index.offset_types == [expected]
+        for pair in (0, 7, PAIRS - 1):
+            (entry_pair, skip, entry) = index.seek(pair)
+            assert (entry_pair, skip) == (pair, 0)
+            assert entry[2] == pair * 8 + 1
+            for end in (1, 2):
+                with index.open_at(entry, end) as fh:
+                    assert fh.readline() == '@r%d/%d\n' % (pair, end)
+
+def test_index_paired_every():
+    with tempfile.TemporaryDirectory() as tmpd:
+        fq1 = os.path.join(tmpd, 'in_1.fq.gz')
+        fq2 = os.path.join(tmpd, 'in_2.fq.gz')
+        _write(fq1, _fastq(('1',)), 'bgzf')
+        _write(fq2, _fastq(('2',)), 'bgzf')
+        sv = SeqValidator(fq1, fq2, progress_pairs=0, index_every=10)
+        sv.validate()
+        index = sv.index
+        assert len(index.entries) == 3
+        (entry_pair, skip, entry) = index.seek(17)
+        assert (entry_pair, skip) == (10, 7)
+        assert entry[2] == entry[4] == 41
+        with index.open_at(entry, 2) as fh:
+            assert fh.readline() == '@r10/2\n'
+        with pytest.raises(IndexError):
+            index.seek(PAIRS)
+
+def test_index_load_bad():
+    with tempfile.TemporaryDirectory() as tmpd:
+        bad = os.path.join(tmpd, 'bad.sqi')
+        with open(bad, 'w') as ofh:
+            ofh.write('{"format": "other"}')
+        with pytest.raises(SeqValidationError):
+            RecordIndex.load(bad)
+
+def test_block_offsets():
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, 'x.gz')
+        _write(path, b'a' * 250, 'bgzf')
+        (coffsets, uoffsets) = bgzf.block_offsets(path)
+        assert uoffsets == [0, 100, 200, 250]
+        assert bgzf.virtual_offset(coffsets, uoffsets, 150) == (coffsets[1] << 16) | 50
+        assert offset_type(path) == 'bgzf'
@@ -0,0 +1,50 @@
+import pytest
+import os, tempfile
+
+from cgp_seq_input_val.file_meta import FileMeta
+from cgp_seq_input_val.row_store import RowStore, config_hash, row_key, store_path
+
+HEADINGS = ['Group_ID', 'Sample', 'File', 'File_2']
+
+def _row(sample, rel_path='/data'):
+    return FileMeta(HEADINGS, ['1', sample, sample + '.bam'], rel_path)
+
+def test_row_store_key():
+    assert row_key(_row('Bob')) == row_key(_row('Bob'))
+    assert row_key(_row('Bob')) != row_key(_row('Kevin'))
+    # paths are relative to the manifest so its location matters
+    assert row_key(_row('Bob')) != row_key(_row('Bob', '/other'))
+
+def test_row_store_path():
+    assert store_path('/out', '/in/manifest.tsv') == '/out/manifest.tsv.rows.json'
+
+def test_row_store_round_trip():
+    cfg = config_hash({'type': 'IMPORT'})
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, 'store.json')
+        store = RowStore(cfg)
+        key = store.add(_row('Bob'))
+        store.mark(key, 'required')
+        store.mark_pairs(key, 100)
+        store.add(_row('Stuart'))
+        store.write(path)
+
+        loaded = RowStore.load(path, cfg)
+        key = loaded.add(_row('Bob'))
+        assert loaded.passed(key, 'required')
+        assert not loaded.passed(key, 'files')
+        assert loaded.pairs(key) == 100
+        assert [row['Sample'] for row in loaded.removed()] == ['Stuart']
+
+        # different config, nothing carried over
+        loaded = RowStore.load(path, config_hash({'type': 'OTHER'}))
+        key = loaded.add(_row('Bob'))
+        assert not loaded.passed(key, 'required')
+
+def test_row_store_load_missing_or_bad():
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, 'store.json')
+        assert RowStore.load(path, 'x').previous == {}
+        with open(path, 'w') as ofh:
+            ofh.write('not json')
+        assert RowStore.load(path, 'x').previous == {}
@@ -0,0 +1,99 @@
+import pytest
+import os, tempfile
+
+from cgp_seq_input_val.fastq_writer import FastqWriter
+from cgp_seq_input_val.sampler import ReservoirSampler
+from cgp_seq_input_val.seq_validator import SeqValidator
+
+class Read(object):
+    def __init__(self, name, end):
+        self.header = '@%s/%s' % (name, end)
+        self.seq = 'ACGT'
+        self.qual = 'IIII'
+
+class Writer(object):
+    """Collects records in memory"""
+    format = staticmethod(FastqWriter.format)
+
+    def __init__(self):
+        self.records = []
+        self.outputs = []
+        self.closed = False
+
+    def write_records(self, rec_1, rec_2):
+        self.records.append((rec_1, rec_2))
+
+    def close(self):
+        self.closed = True
+
+def _sample(pairs, size, seed=1):
+    writer = Writer()
+    sampler = ReservoirSampler(size, writer, seed)
+    for i in range(pairs):
+        sampler.add(Read('r%d' % (i), 1), Read('r%d' % (i), 2))
+    sampler.write()
+    return [int(rec_1.split(b'/')[0][2:]) for (rec_1, _) in writer.records]
+
+def test_sample_below_one():
+    for pairs in (0, -5):
+        with pytest.raises(ValueError):
+            ReservoirSampler(pairs, None)
+
+def test_fewer_pairs_than_sample():
+    assert _sample(5, 10) == [0, 1, 2, 3, 4]
+
+def test_sample_size_and_order():
+    positions = _sample(10000, 100)
+    assert len(positions) == 100
+    assert positions == sorted(set(positions))
+
+def test_reproducible():
+    assert _sample(5000, 50, seed=7) == _sample(5000, 50, seed=7)
+    assert _sample(5000, 50, seed=7) != _sample(5000, 50, seed=8)
+
+def test_uniform():
+    # each of 200 pairs should be kept in about 10/200 of samples
+    kept = [0] * 200
+    for seed in range(2000):
+        for position in _sample(200, 10, seed):
+            kept[position] += 1
+    # expected 100 per position, binomial sd ~9.7
+    assert all(50 < count < 150 for count in kept)
+    assert sum(kept[:100]) == pytest.approx(sum(kept[100:]), rel=0.1)
+
+def _write(path, pairs):
+    with open(path, 'w') as ofh:
+        for i in range(pairs):
+            for end in (1, 2):
+                ofh.write('@r%d/%d\nACGT\n+\nIIII\n' % (i, end))
+
+def test_validator_sample():
+    with tempfile.TemporaryDirectory() as tmpd:
+        infile = os.path.join(tmpd, 'in.fq')
+        _write(infile, 1000)
+        prefix = os.path.join(tmpd, 'sample')
+        sampler = ReservoirSampler(20, FastqWriter(prefix, False, compress=False))
+        validator = SeqValidator(infile, progress_pairs=0, sampler=sampler)
+        validator.validate()
+        summary = validator.summary()['sample']
+        assert summary['pairs'] == 20
+        assert summary['of'] == 1000
+        assert [out['pairs'] for out in summary['outputs']] == [20, 20]
+        with open(prefix + '_1.fq') as fh_1, open(prefix + '_2.fq') as fh_2:
+            lines_1 = fh_1.read().splitlines()
+            lines_2 = fh_2.read().splitlines()
+        assert len(lines_1) == 80
+        assert [line[:-2] for line in lines_1[::4]] == [line[:-2] for line in lines_2[::4]]
+
+def test_validator_sample_removed_on_error():
+    with tempfile.TemporaryDirectory() as tmpd:
+        infile = os.path.join(tmpd, 'in.fq')
+        _write(infile, 10)
+        with open(infile, 'a') as ofh:
+            ofh.write('@r10/1\nACGT\n+\nIIII\n@r11/2\nACGT\n+\nIIII\n')
+        prefix = os.path.join(tmpd, 'sample')
+        sampler = ReservoirSampler(5, FastqWriter(prefix, True, compress=False))
+        validator = SeqValidator(infile, progress_pairs=0, sampler=sampler, max_errors=5)
+        validator.validate()
+        assert validator.errors
+        assert not os.path.exists(prefix + '.fq')
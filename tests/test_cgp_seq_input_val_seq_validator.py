@@ -1,5 +1,5 @@
 import pytest
-import os, sys, tempfile
+import os, sys, shutil, tempfile
 
 from cgp_seq_input_val.seq_validator import SeqValidator
 from cgp_seq_input_val.error_classes import SeqValidationError
@@ -81,3 +81,135 @@ def test_seq_val_fq_name():
         fq2 = os.path.join(test_dir, 'diff_2.fq')
         sv = SeqValidator(fq1, fq2, progress_pairs=0)
         sv.validate()
+
+def test_seq_val_collect_errors():
+    fq1 = os.path.join(test_dir, 'collect_1.fq')
+    fq2 = os.path.join(test_dir, 'collect_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_errors=5)
+    sv.validate()
+    summary = sv.summary()
+    assert summary['pairs'] == 4
+    assert summary['valid'] is False
+    assert sorted(summary['errors']) == ['corrupt', 'header', 'pair_end']
+    corrupt = summary['errors']['corrupt']
+    assert corrupt['count'] == 1
+    assert corrupt['examples'][0]['file'] == fq1
+    assert corrupt['examples'][0]['line'] == 5
+    assert corrupt['examples'][0]['byte'] == 30
+    assert summary['errors']['header']['examples'][0]['line'] == 9
+    assert summary['errors']['pair_end']['examples'][0]['file'] == fq2
+
+def test_seq_val_collect_errors_limit():
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, 'diff_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_errors=1)
+    sv.validate()
+    summary = sv.summary()
+    assert summary['valid'] is False
+    assert summary['errors']['pair_name']['count'] == len(summary['errors']['pair_name']['examples'])
+
+def test_seq_val_collect_clean():
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, 'good_read_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_errors=1)
+    sv.validate()
+    assert sv.summary()['valid'] is True
+    assert sv.summary()['errors'] == {}
+
+def test_seq_val_collect_pair_count():
+    fq1 = os.path.join(test_dir, 'good_read_1.fq')
+    fq2 = os.path.join(test_dir, '2_reads_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_errors=1)
+    sv.validate()
+    assert sv.summary()['errors']['pair_count']['count'] == 1
+
+def test_seq_val_duplicate_names():
+    fq1 = os.path.join(test_dir, 'dup_names_1.fq')
+    fq2 = os.path.join(test_dir, 'dup_names_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0)
+    sv.validate()  # not checked by default
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, dup_mem=1024 * 1024)
+    with pytest.raises(SeqValidationError) as e_info:
+        sv.validate()
+    assert e_info.value.category == 'duplicate_name'
+    assert 'lines 1, 9' in str(e_info.value)
+
+def test_seq_val_duplicate_names_collect():
+    fq1 = os.path.join(test_dir, 'dup_names_1.fq')
+    fq2 = os.path.join(test_dir, 'dup_names_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_errors=5, dup_mem=1024 * 1024)
+    sv.validate()
+    summary = sv.summary()
+    assert summary['duplicate_check'] == 'exact'
+    assert summary['errors']['duplicate_name']['count'] == 2
+    assert [e['line'] for e in summary['errors']['duplicate_name']['examples']] == [9, 17]
+
+def test_seq_val_duplicate_names_clean():
+    fqi = os.path.join(test_dir, 'good_read_i.fq')
+    sv = SeqValidator(fqi, None, progress_pairs=0, dup_mem=1024 * 1024)
+    sv.validate()
+    assert sv.summary()['duplicate_check'] == 'exact'
+
+def test_seq_val_max_pairs():
+    # 2 pairs vs 1, the count mismatch is never reached
+    fq1 = os.path.join(test_dir, '2_reads_1.fq')
+    fq2 = os.path.join(test_dir, '2_reads_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_pairs=1)
+    sv.validate()
+    assert sv.pairs == 1
+    sv = SeqValidator(fq1, os.path.join(test_dir, 'good_read_2.fq'), progress_pairs=0,
+                      max_pairs=1)
+    sv.validate()
+    assert sv.pairs == 1
+
+def test_seq_val_collect_short_qual():
+    # the next header isn't taken as quality, the following records still pair
+    fq1 = os.path.join(test_dir, 'short_qual_1.fq')
+    fq2 = os.path.join(test_dir, 'short_qual_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_errors=5)
+    sv.validate()
+    summary = sv.summary()
+    assert summary['pairs'] == 3
+    assert list(summary['errors']) == ['corrupt']
+    corrupt = summary['errors']['corrupt']
+    assert corrupt['count'] == 2
+    assert [(e['file'], e['line']) for e in corrupt['examples']] == [(fq1, 1), (fq2, 5)]
+
+def test_seq_val_collect_junk_lines():
+    # lines between records 3 and 4 aren't a record, record 4 still pairs
+    fq1 = os.path.join(test_dir, 'junk_1.fq')
+    fq2 = os.path.join(test_dir, 'junk_2.fq')
+    sv = SeqValidator(fq1, fq2, progress_pairs=0, max_errors=5)
+    sv.validate()
+    summary = sv.summary()
+    assert summary['pairs'] == 5
+    assert list(summary['errors']) == ['header']
+    assert [(e['line'], e['byte']) for e in summary['errors']['header']['examples']] == [(13, 90)]
+
+def test_seq_val_collect_missing_qual():
+    # the next header, taken as quality, is found again and no error at EOF
+    fqi = os.path.join(test_dir, 'missing_qual_i.fq')
+    sv = SeqValidator(fqi, progress_pairs=0, max_errors=5)
+    sv.validate()
+    summary = sv.summary()
+    assert summary['pairs'] == 3
+    assert list(summary['errors']) == ['corrupt']
+    assert summary['errors']['corrupt']['examples'][0]['line'] == 9
+
+@pytest.mark.skipif(shutil.which('false') is None, reason='false not on PATH')
+def test_seq_val_close_both_on_pipe_failure(monkeypatch):
+    # closing read 1's failed decompressor raises, read 2 is still closed
+    opened = []
+    real_open = SeqValidator._open
+    def spy(self, filename):
+        opened.append(real_open(self, filename))
+        return opened[-1]
+    monkeypatch.setattr(SeqValidator, '_open', spy)
+    sv = SeqValidator(os.path.join(test_dir, 'good_read_1.fq.gz'),
+                      os.path.join(test_dir, 'good_read_2.fq.gz'), progress_pairs=0,
+                      decompressor='false')
+    with pytest.raises(SeqValidationError) as e_info:
+        sv.validate()
+    assert e_info.value.category == 'compression'
+    assert len(opened) == 2
+    assert all(handle.closed for handle in opened)
@@ -0,0 +1,146 @@
+import pytest
+import os, sys, tempfile, json, asyncio
+
+from cgp_seq_input_val.service import ValidationService, _run_until_complete, run_job
+from cgp_seq_input_val.error_classes import ValidationError
+
+test_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'fastq_read')
+test_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+def setup():
+    pass
+
+def teardown():
+    pass
+
+class Cancelled(object):
+    def is_set(self):
+        return True
+
+def test_run_job_seq_valid():
+    res = run_job('seq-valid', {'input': [os.path.join(test_dir, 'good_read_1.fq'),
+                                          os.path.join(test_dir, 'good_read_2.fq')]})
+    assert res['status'] == 'done'
+    assert res['result']['pairs'] == 1
+    assert res['result']['interleaved'] is False
+
+def test_run_job_seq_valid_error():
+    res = run_job('seq-valid', {'input': [os.path.join(test_dir, 'good_read_1.fq'),
+                                          os.path.join(test_dir, 'diff_2.fq')]})
+    assert res['status'] == 'error'
+
+def test_run_job_seq_valid_missing_file():
+    res = run_job('seq-valid', {'input': [os.path.join(test_dir, 'absent.fq')]})
+    assert res['status'] == 'error'
+
+def test_run_job_cancelled():
+    # the check runs every cancel_check_pairs, so only seen on big files
+    import cgp_seq_input_val.seq_validator as sv
+    orig = sv.cancel_check_pairs
+    sv.cancel_check_pairs = 1
+    try:
+        res = run_job('seq-valid', {'input': [os.path.join(test_dir, 'good_read_i.fq')]},
+                      Cancelled())
+    finally:
+        sv.cancel_check_pairs = orig
+    assert res['status'] == 'cancelled'
+
+def test_run_job_man_valid():
+    with tempfile.TemporaryDirectory() as tmpd:
+        res = run_job('man-valid', {'input': os.path.join(test_data, 'file_set_good', 'files_good.tsv'),
+                                    'output': tmpd})
+        assert res['status'] == 'done'
+        assert os.path.isfile(res['result']['json'])
+
+def test_run_job_man_valid_error():
+    res = run_job('man-valid', {'input': os.path.join(test_data, 'extraHeader.tsv'),
+                                'output': '/tmp'})
+    assert res['status'] == 'error'
+
+def test_run_job_man_norm_bad_ext():
+    res = run_job('man-norm', {'input': os.path.join(test_data, 'cliutil', 'bad.extn')})
+    assert res['status'] == 'error'
+
+def test_service_unknown_command():
+    with pytest.raises(ValidationError) as e_info:
+        ValidationService(workers=1).submit('bad-cmd', {})
+
+def test_service_missing_option():
+    with pytest.raises(ValidationError) as e_info:
+        ValidationService(workers=1).submit('man-valid', {'input': 'x.tsv'})
+    assert 'requires option(s): output' in str(e_info.value)
+
+def test_service_socket():
+    async def client(socket_path):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        jobs = [{'id': 'p', 'command': 'seq-valid',
+                 'options': {'input': [os.path.join(test_dir, 'good_read_1.fq'),
+                                       os.path.join(test_dir, 'good_read_2.fq')]}},
+                {'id': 'i', 'command': 'seq-valid',
+                 'options': {'input': [os.path.join(test_dir, 'good_read_i.fq')]}},
+                {'id': 'nope', 'cancel': True},
+                {'id': 'bogus', 'command': 'bogus'},
+                {'id': 'no-input', 'command': 'seq-valid', 'options': {}}]
+        for job in jobs:
+            writer.write((json.dumps(job) + '\n').encode('utf-8'))
+        await writer.drain()
+        responses = []
+        while len(responses) < 7:
+            responses.append(json.loads((await reader.readline()).decode('utf-8')))
+        writer.close()
+        return responses
+
+    async def run(socket_path):
+        service = ValidationService(workers=2)
+        server = await service.start_server(socket_path=socket_path)
+        try:
+            return await client(socket_path)
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        responses = _run_until_complete(run(os.path.join(tmpd, 'val.sock')))
+    by_status = {}
+    for r in responses:
+        by_status.setdefault(r['status'], []).append(r['id'])
+    assert sorted(by_status['queued']) == ['i', 'p']
+    assert sorted(by_status['done']) == ['i', 'p']
+    assert by_status['error'] == ['nope', 'bogus', 'no-input']
+    errors = dict((r['id'], r['error']) for r in responses if r['status'] == 'error')
+    assert errors['no-input'] == "Command 'seq-valid' requires option(s): input"
+
+def test_service_ids_per_connection():
+    async def request(socket_path, jobs, count):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        for job in jobs:
+            writer.write((json.dumps(job) + '\n').encode('utf-8'))
+        await writer.drain()
+        responses = []
+        while len(responses) < count:
+            responses.append(json.loads((await reader.readline()).decode('utf-8')))
+        writer.close()
+        return responses
+
+    async def run(socket_path):
+        service = ValidationService(workers=1)
+        server = await service.start_server(socket_path=socket_path)
+        try:
+            job = {'id': 'x', 'command': 'seq-valid',
+                   'options': {'input': [os.path.join(test_dir, 'good_read_i.fq')]}}
+            owner = asyncio.ensure_future(request(socket_path, [job], 2))
+            # another connection can't cancel 'x', and ids must be hashable
+            other = await request(socket_path, [{'id': 'x', 'cancel': True},
+                                                {'id': {'a': 1}, 'command': 'seq-valid'}], 2)
+            return (await owner, other)
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        (owner, other) = _run_until_complete(run(os.path.join(tmpd, 'val.sock')))
+    assert [(r['id'], r['status']) for r in owner] == [('x', 'queued'), ('x', 'done')]
+    assert [(r['id'], r['status']) for r in other] == [('x', 'error'), ({'a': 1}, 'error')]
+    assert other[1]['error'] == 'Job id must be a string or number'